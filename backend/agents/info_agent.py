@@ -2,6 +2,8 @@ import os
 from typing import List
 from pathlib import Path
 from services.openai_service import run_openai_prompt
+from services.cache_service import build_cache_key
+from services import semantic_cache_service
 import logging
 
 PROMPT_PATH = Path(__file__).parent.parent / "prompts/info_prompt.txt"
@@ -22,4 +24,14 @@ async def run_info_agent(user_message: str, context_chunks: List[str]) -> str:
         f"User: {user_message}\n"
         f"Answer:"
     )
-    return await run_openai_prompt(prompt, max_tokens=120, temperature=0.4)
+    scope = (
+        f"info@{build_cache_key('info', prompt_template, user_message).version}"
+        f"|{semantic_cache_service.context_fingerprint(context_chunks)}"
+    )
+    question_vector = await semantic_cache_service.embed_question(user_message)
+    cached = await semantic_cache_service.lookup(user_message, scope, question_vector)
+    if cached is not None:
+        return cached
+    answer = await run_openai_prompt(prompt, max_tokens=120, temperature=0.4)
+    await semantic_cache_service.store(user_message, scope, answer, question_vector)
+    return answer
@@ -1,11 +1,17 @@
 from services.openai_service import run_openai_prompt
 from pathlib import Path
-from services.cache_service import async_cache_workflow
+from services.cache_service import async_cache_workflow, build_cache_key, keyword_bucket
 import logging
 from config.settings import OPENAI_MODEL
 
 PROMPT_PATH = Path(__file__).parent.parent / "prompts/intent_prompt.txt"
 
+# History terms that can change the label for the same message ("yes" after a demo offer …)
+HISTORY_BUCKET_TERMS = (
+    "securetrack", "bizradar", "receptionist", "cloud", "security", "data",
+    "demo", "call", "price", "pricing", "cost",
+)
+
 async def run_intent_agent(user_message: str, history: str) -> str:
     # with open(PROMPT_PATH, "r") as file:
     #     prompt_template = file.read()
@@ -18,9 +24,14 @@ async def run_intent_agent(user_message: str, history: str) -> str:
         f"User: {user_message}\n"
         f"History: {history}\n→"
     )
+    # Cache-relevant: template, normalized message, bucketed history
+    cache_key = build_cache_key(
+        "intent", prompt_template, user_message,
+        bucket=keyword_bucket(history, HISTORY_BUCKET_TERMS),
+    )
     async def intent_func(prompt):
         return await run_openai_prompt(prompt, model=OPENAI_MODEL)
-    response, cache_source, response_time = await async_cache_workflow(prompt, intent_func)
+    response, cache_source, response_time = await async_cache_workflow(prompt, intent_func, cache_key=cache_key)
     logging.info(f"Intent Agent Greeting response: {response} (Cache Source: {cache_source}, Response Time: {response_time:.4f}s)")
     #response = await run_openai_prompt(prompt)
     return response
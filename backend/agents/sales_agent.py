@@ -1,27 +1,70 @@
 from services.openai_service import run_openai_prompt
 from pathlib import Path
 from services.bot_response_formatter_md import ensure_markdown
-from services.cache_service import async_cache_workflow
+from services.cache_service import async_cache_workflow, build_cache_key, last_keyword
+from services import semantic_cache_service
 import logging
+from typing import Awaitable, Callable, Optional
 from config.settings import OPENAI_MODEL
 PROMPT_PATH = Path(__file__).parent.parent / "prompts/sales_prompt.txt"
 
-async def run_sales_agent(user_message: str, context: str, history: str) -> str:
+# Products / topics a follow-up ("yes", "tell me more") refers back to; the last one mentioned buckets the history
+HISTORY_TOPIC_TERMS = (
+    "securetrack", "bizradar", "receptionist", "cloud", "security", "data",
+    "demo", "call", "price", "pricing", "cost",
+)
+
+def history_bucket(history: str) -> str:
+    """Cache bucket of the conversation so far: the last product or topic it mentioned."""
+    return f"topic={last_keyword(history, HISTORY_TOPIC_TERMS)}"
+
+async def run_sales_agent(
+    user_message: str,
+    context: str,
+    history: str,
+    retrieve: Optional[Callable[[], Awaitable[str]]] = None
+) -> str:
+    """*retrieve* re-fetches the RAG context, so background cache refreshes answer from current content."""
     # with open(PROMPT_PATH, "r") as file:
     #     prompt_template = file.read()
     with open(PROMPT_PATH, "r", encoding="utf-8") as file:
         prompt_template = file.read()
-    prompt = (
-        f"{prompt_template}\n\n"
-        f"User message: {user_message}\n\n"
-        f"Context:\n{context}\n\n"
-        f"Chat History:\n{history}\n\n"
-        f"Sales Agent:"
+
+    def render(context: str):
+        prompt = (
+            f"{prompt_template}\n\n"
+            f"User message: {user_message}\n\n"
+            f"Context:\n{context}\n\n"
+            f"Chat History:\n{history}\n\n"
+            f"Sales Agent:"
+        )
+        # Cache-relevant: template, normalized message, RAG context, bucketed history (not the raw transcript)
+        return prompt, build_cache_key("sales", prompt_template, user_message, context=context, bucket=history_bucket(history))
+
+    async def rebuild():
+        return render(await retrieve())
+
+    prompt, cache_key = render(context)
+    # Paraphrases retrieving the same context may reuse an answer before we pay for a completion
+    # (request path only – background refreshes must reach the LLM, so sales_func stays a plain call)
+    semantic_scope = (
+        f"sales@{cache_key.version}|{semantic_cache_service.context_fingerprint(context.split(chr(10) * 2))}"
+        f"|{cache_key.bucket}"
     )
+    question_vector = await semantic_cache_service.embed_question(user_message)
+    response = await semantic_cache_service.lookup(user_message, semantic_scope, question_vector)
+    if response is not None:
+        logging.info("Sales Agent answered from the semantic cache")
+        return await ensure_markdown(response)
+
     async def sales_func(prompt):
         return await run_openai_prompt(prompt, model=OPENAI_MODEL)
-    response, cache_source, response_time = await async_cache_workflow(prompt, sales_func)
+    response, cache_source, response_time = await async_cache_workflow(
+        prompt, sales_func, cache_key=cache_key, rebuild=rebuild if retrieve is not None else None
+    )
     logging.info(f"Sales Agent Greeting response: {response} (Cache Source: {cache_source}, Response Time: {response_time:.4f}s)")
+    if cache_source in ("Fresh", "Fallback"):
+        await semantic_cache_service.store(user_message, semantic_scope, response, question_vector)
 
     #response = await run_openai_prompt(prompt, model=OPENAI_MODEL)
     return await ensure_markdown(response)
\ No newline at end of file
@@ -19,6 +19,23 @@ TEAMS_WEBHOOK_URL_VAPI = os.getenv("TEAMSWEBHOOKURLVAPIIND")
 VAPI_KEY = os.getenv("VAPIKEYIND")
 ASSISTANT_ID = os.getenv("ASSISTANTIDIND")
 PHONE_NUMBER_ID = os.getenv("PHONENUMBERIDIND")
+# Serve RAG lookups from an in-process mirror of the documents table
+LOCAL_VECTOR_INDEX = os.getenv("LOCALVECTORINDEXIND", "false").lower() in ("1", "true", "yes")
+# none | int8 | binary – in-memory codes of the local index, float32 re-rank from disk
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCALINDEXQUANTIZATIONIND", "none").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCALINDEXDIRIND", "/tmp/indrasol_vectors")
+# On-disk embedding store consulted by ingestion before OpenAI ("" disables)
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDINGSTOREPATHIND", "/tmp/indrasol_embeddings.sqlite3")
+# Sitemap used as the crawl list instead of website_content.get_urls() ("" = built-in list)
+WEBSITE_SITEMAP_URL = os.getenv("WEBSITESITEMAPURLIND", "")
+# Shared secret for the admin endpoints, sent as X-Admin-Key (unset = admin endpoints disabled)
+ADMIN_API_KEY = os.getenv("ADMINAPIKEYIND")
+# Corpus snapshot (manifest + .npy + chunks) imported by the bootstrap when the table is empty
+CORPUS_SNAPSHOT_DIR = os.getenv("CORPUSSNAPSHOTDIRIND", "/tmp/indrasol_snapshot")
+# Scopes the shared "corpus bootstrapped" marker; set per deployment so a new release waits for its own bootstrap
+DEPLOYMENT_ID = os.getenv("DEPLOYMENTIDIND", "default")
+# Fuse BM25 (lexical) with vector retrieval
+HYBRID_SEARCH = os.getenv("HYBRIDSEARCHIND", "true").lower() in ("1", "true", "yes")
 
 REDIS_DB=os.getenv("REDIS_DB_IND")
 REDIS_HOST=os.getenv("REDIS_HOST_IND")
@@ -0,0 +1,52 @@
+-- match_documents_multi: one RPC over several namespaces of public.documents
+-- Used by query_supabase_vector when it is given a list of namespaces.
+--
+--   weights  : per-namespace multiplier applied to the cosine similarity
+--              (aligned with `namespaces`, missing entries = 1.0)
+--   fallback : only return rows of the first namespace (in list order)
+--              that has any match – the old "website, else sales" behaviour
+--
+-- Run in the Supabase SQL editor; safe to re-run.
+
+CREATE OR REPLACE FUNCTION public.match_documents_multi(
+    query_embedding vector(1536),
+    match_count     int,
+    namespaces      text[],
+    weights         float8[] DEFAULT NULL,
+    fallback        boolean  DEFAULT false,
+    filter_category text     DEFAULT NULL,
+    filter_type     text     DEFAULT NULL
+)
+RETURNS TABLE (
+    id        text,
+    namespace text,
+    text      text,
+    source    text,
+    category  text,
+    type      text,
+    score     float8
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH ns AS (
+        SELECT n.name, n.pos, COALESCE(weights[n.pos], 1.0) AS weight
+        FROM unnest(namespaces) WITH ORDINALITY AS n(name, pos)
+    ),
+    candidates AS (
+        SELECT d.id, d.namespace, d.text, d.source, d.category, d.type,
+               (1 - (d.embedding <=> query_embedding)) * ns.weight AS score,
+               ns.pos
+        FROM public.documents d
+        JOIN ns ON ns.name = d.namespace
+        WHERE (filter_category IS NULL OR d.category = filter_category)
+          AND (filter_type IS NULL OR d.type = filter_type)
+    )
+    SELECT c.id, c.namespace, c.text, c.source, c.category, c.type, c.score
+    FROM candidates c
+    WHERE NOT fallback OR c.pos = (SELECT min(pos) FROM candidates)
+    ORDER BY c.score DESC
+    LIMIT match_count;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.match_documents_multi(vector, int, text[], float8[], boolean, text, text)
+    TO anon, authenticated, service_role;
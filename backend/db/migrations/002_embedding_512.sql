@@ -0,0 +1,121 @@
+-- Reduced-dimension embeddings: 512-d column next to the 1536-d one
+--
+-- text-embedding-3-* vectors can be shortened by truncating and
+-- re-normalizing (what the API's `dimensions` parameter does), so the new
+-- column is derived from the stored 1536-d vectors in SQL – no re-embedding.
+-- Needs pgvector >= 0.7 (subvector, l2_normalize).
+--
+-- Online migration (see services/embedding_migration.py):
+--   1. run this file                         (serving keeps using `embedding`)
+--   2. python -m services.embedding_migration backfill --dimensions 512
+--      (marks 512 as migrating in Redis – the app dual-writes both columns
+--      from then on – and fills the older rows)
+--   3. python -m services.embedding_migration cutover  --dimensions 512
+--      (one Redis SET – every worker switches RPCs within seconds)
+-- Rollback: `cutover --dimensions 1536`.  The 768-d variant is
+-- 004_embedding_768.sql (generated from this file, 512 → 768).
+
+ALTER TABLE public.documents
+ADD COLUMN IF NOT EXISTS embedding_512 vector(512);
+
+CREATE INDEX IF NOT EXISTS documents_embedding_512_hnsw
+    ON public.documents USING hnsw (embedding_512 vector_cosine_ops);
+
+-- Fill a batch of missing 512-d vectors; returns the number of rows updated
+CREATE OR REPLACE FUNCTION public.backfill_embedding_512(batch_size int DEFAULT 500)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated int;
+BEGIN
+    WITH todo AS (
+        SELECT d.id FROM public.documents d
+        WHERE d.embedding_512 IS NULL AND d.embedding IS NOT NULL
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE public.documents d
+    SET embedding_512 = l2_normalize(subvector(d.embedding, 1, 512))::vector(512)
+    FROM todo
+    WHERE d.id = todo.id;
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.match_documents_512(
+    query_embedding vector(512),
+    match_count     int,
+    namespace       text,
+    filter_category text DEFAULT NULL,
+    filter_type     text DEFAULT NULL
+)
+RETURNS TABLE (
+    id        text,
+    namespace text,
+    text      text,
+    source    text,
+    category  text,
+    type      text,
+    score     float8
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT d.id, d.namespace, d.text, d.source, d.category, d.type,
+           1 - (d.embedding_512 <=> query_embedding) AS score
+    FROM public.documents d
+    WHERE d.namespace = match_documents_512.namespace
+      AND d.embedding_512 IS NOT NULL
+      AND (filter_category IS NULL OR d.category = filter_category)
+      AND (filter_type IS NULL OR d.type = filter_type)
+    ORDER BY d.embedding_512 <=> query_embedding
+    LIMIT match_count;
+$$;
+
+CREATE OR REPLACE FUNCTION public.match_documents_multi_512(
+    query_embedding vector(512),
+    match_count     int,
+    namespaces      text[],
+    weights         float8[] DEFAULT NULL,
+    fallback        boolean  DEFAULT false,
+    filter_category text     DEFAULT NULL,
+    filter_type     text     DEFAULT NULL
+)
+RETURNS TABLE (
+    id        text,
+    namespace text,
+    text      text,
+    source    text,
+    category  text,
+    type      text,
+    score     float8
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH ns AS (
+        SELECT n.name, n.pos, COALESCE(weights[n.pos], 1.0) AS weight
+        FROM unnest(namespaces) WITH ORDINALITY AS n(name, pos)
+    ),
+    candidates AS (
+        SELECT d.id, d.namespace, d.text, d.source, d.category, d.type,
+               (1 - (d.embedding_512 <=> query_embedding)) * ns.weight AS score,
+               ns.pos
+        FROM public.documents d
+        JOIN ns ON ns.name = d.namespace
+        WHERE d.embedding_512 IS NOT NULL
+          AND (filter_category IS NULL OR d.category = filter_category)
+          AND (filter_type IS NULL OR d.type = filter_type)
+    )
+    SELECT c.id, c.namespace, c.text, c.source, c.category, c.type, c.score
+    FROM candidates c
+    WHERE NOT fallback OR c.pos = (SELECT min(pos) FROM candidates)
+    ORDER BY c.score DESC
+    LIMIT match_count;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.match_documents_512(vector, int, text, text, text)
+    TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.match_documents_multi_512(vector, int, text[], float8[], boolean, text, text)
+    TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.backfill_embedding_512(int) TO service_role;
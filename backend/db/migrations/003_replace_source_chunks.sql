@@ -0,0 +1,70 @@
+-- replace_source_chunks: swap the chunk set of one source in one transaction
+-- Used by bot_service.refresh_url for chunk-level incremental refreshes.
+--
+--   p_rows     : new / changed chunks only, as a JSON array of documents rows
+--                ({id, namespace, text, source, category, type, embedding[,
+--                embedding_<dims>, …]}) – every reduced column present in
+--                the rows (002 / 004 migrations) is written too
+--   p_keep_ids : ids of the full new chunk set of the source (unchanged
+--                chunks are kept without being sent again)
+--
+-- New rows are written first, then rows of (namespace, source) whose id is
+-- not in p_keep_ids are deleted – both inside the function's transaction, so
+-- concurrent readers see either the old or the new page, never an empty
+-- one.  Returns {"upserted": n, "deleted": [ids]}.
+--
+-- Run in the Supabase SQL editor; safe to re-run.
+
+CREATE OR REPLACE FUNCTION public.replace_source_chunks(
+    p_namespace text,
+    p_source    text,
+    p_rows      jsonb,
+    p_keep_ids  text[]
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    upserted int := 0;
+    deleted  text[];
+    col      text;
+BEGIN
+    IF jsonb_array_length(p_rows) > 0 THEN
+        INSERT INTO public.documents AS d (id, namespace, text, source, category, type, embedding)
+        SELECT r->>'id', p_namespace, r->>'text', p_source, r->>'category', r->>'type',
+               (r->>'embedding')::vector(1536)
+        FROM jsonb_array_elements(p_rows) r
+        ON CONFLICT (id) DO UPDATE
+        SET namespace = EXCLUDED.namespace,
+            text      = EXCLUDED.text,
+            source    = EXCLUDED.source,
+            category  = EXCLUDED.category,
+            type      = EXCLUDED.type,
+            embedding = EXCLUDED.embedding;
+        GET DIAGNOSTICS upserted = ROW_COUNT;
+
+        -- dual-write every reduced column being rolled out (embedding_512, embedding_768, …);
+        -- dynamic, so this file depends on none of them and serves any migrating dimension
+        FOR col IN
+            SELECT k FROM jsonb_object_keys(p_rows->0) k WHERE k ~ '^embedding_[0-9]+$'
+        LOOP
+            EXECUTE format(
+                'UPDATE public.documents d SET %I = (r->>%L)::vector(%s) '
+                'FROM jsonb_array_elements($1) r WHERE d.id = r->>''id''',
+                col, col, substring(col FROM 11)::int
+            ) USING p_rows;
+        END LOOP;
+    END IF;
+
+    WITH gone AS (
+        DELETE FROM public.documents d
+        WHERE d.namespace = p_namespace
+          AND d.source = p_source
+          AND NOT (d.id = ANY (COALESCE(p_keep_ids, '{}')))
+        RETURNING d.id
+    )
+    SELECT COALESCE(array_agg(id), '{}') INTO deleted FROM gone;
+
+    RETURN jsonb_build_object('upserted', upserted, 'deleted', to_jsonb(deleted));
+END;
+$$;
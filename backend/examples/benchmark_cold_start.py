@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold start: how long a fresh process takes to accept requests
+and to become ready.
+
+Starts `uvicorn main:app` in a subprocess (with the environment of this
+shell: Redis, Supabase, OpenAI settings), then polls
+
+  /health   first 200  → accepting requests (chat available, degraded)
+  /ready    first 200  → corpus bootstrap finished
+
+and prints both times plus the bootstrap step timings from /ready.  With
+--chat a chat request is sent as soon as /health answers, to time a
+degraded-mode answer.
+
+Usage:
+    python examples/benchmark_cold_start.py
+    python examples/benchmark_cold_start.py --runs 3 --chat
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.1
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(url: str, timeout: float = 2.0):
+    """(status, parsed body) – (None, None) while the server is not listening."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def post(url: str, payload: dict, timeout: float = 120.0):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.status
+
+
+def run_once(timeout: float, chat: bool) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    result = {"health_s": None, "ready_s": None, "chat_s": None, "bootstrap": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise SystemExit(f"server exited with {proc.returncode}")
+            if result["health_s"] is None:
+                status, _ = get(f"{base}/health")
+                if status == 200:
+                    result["health_s"] = time.perf_counter() - start
+                    if chat:
+                        s = time.perf_counter()
+                        post(f"{base}/v1/routes/message", {"query": "What does Indrasol do?", "history": [], "user_id": "cold-start"})
+                        result["chat_s"] = time.perf_counter() - s
+            if result["health_s"] is not None:
+                status, body = get(f"{base}/ready")
+                if status == 200 or (body and body.get("state") == "failed"):
+                    result["ready_s"] = time.perf_counter() - start if status == 200 else None
+                    result["bootstrap"] = body
+                    break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return result
+
+
+def fmt(seconds):
+    return f"{seconds:8.2f}s" if seconds is not None else "       -"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=900, help="give up on /ready after N seconds")
+    parser.add_argument("--chat", action="store_true", help="time one chat request while bootstrapping")
+    args = parser.parse_args()
+
+    print(f"{'run':>3} {'accepting':>9} {'ready':>9} {'chat':>9}  bootstrap steps")
+    for i in range(1, args.runs + 1):
+        r = run_once(args.timeout, args.chat)
+        steps = (r["bootstrap"] or {}).get("steps", {})
+        detail = ", ".join(f"{name} {step.get('seconds', step['status'])}" for name, step in steps.items())
+        print(f"{i:>3} {fmt(r['health_s'])} {fmt(r['ready_s'])} {fmt(r['chat_s'])}  {detail}")
+
+
+if __name__ == "__main__":
+    main()
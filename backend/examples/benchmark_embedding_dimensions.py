@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark reduced embedding dimensions on our corpus.
+
+For each size the stored 1536-d vectors are shortened the way the
+`dimensions` API parameter does (truncate + re-normalize) and compared with
+full-size search:
+
+  recall@k     overlap with the 1536-d top-k
+  payload      JSON bytes of the `query_embedding` sent with every RPC
+  storage      raw vector bytes of the whole table
+  latency      in-process search p50 / p99, and the RPC with --rpc
+               (only for sizes whose match_documents_<d> function exists)
+
+Usage:
+    python examples/benchmark_embedding_dimensions.py            # real questions (OpenAI)
+    python examples/benchmark_embedding_dimensions.py --offline  # stored vectors + noise
+    python examples/benchmark_embedding_dimensions.py --rpc
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.supabase_vector_service import (
+    EMBED_DIM, _rpc_match, _rpc_name, embed_texts, iter_document_pages, reduce_dimensions,
+)
+
+SIZES = [1536, 1024, 768, 512, 256]
+TOP_K = 5
+
+QUESTIONS = [
+    "What does SecureTrack do?", "How much does BizRadar cost?", "Are you SOC 2 compliant?",
+    "Where is your office?", "Do you build AWS landing zones?", "Can you help with a pentest?",
+    "What AI services do you offer?", "How does BizRadar find government contracts?",
+    "Do you support Azure migrations?", "What is CSPM?", "Who are your customers?",
+    "Can I book a demo?", "How do you secure data pipelines?", "Do you do NIST assessments?",
+    "What industries do you work with?", "How long does a cloud migration take?",
+]
+
+
+def pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+
+def unit_rows(matrix: np.ndarray, dims: int) -> np.ndarray:
+    m = matrix[:, :dims]
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--offline", action="store_true", help="queries = stored vectors + noise, no OpenAI")
+    parser.add_argument("--rpc", action="store_true", help="also time the match RPC per size")
+    args = parser.parse_args()
+
+    rows = [r for page in iter_document_pages("id, namespace, text, embedding") for r in page]
+    emb = [json.loads(r["embedding"]) if isinstance(r["embedding"], str) else r["embedding"] for r in rows]
+    full = np.asarray(emb, dtype=np.float32)
+    print(f"{len(rows)} rows, {full.shape[1]}-d")
+
+    if args.offline:
+        rng = np.random.default_rng(0)
+        queries = full[rng.integers(len(full), size=100)] + rng.normal(0, 0.01, (100, full.shape[1]))
+    else:
+        queries = np.asarray(asyncio.run(embed_texts(QUESTIONS)), dtype=np.float32)
+
+    truth = [set(np.argsort(-(unit_rows(full, EMBED_DIM) @ (q / np.linalg.norm(q))))[:TOP_K]) for q in queries]
+
+    print(f"\n{'dims':>5} {'recall@' + str(TOP_K):>9} {'payload':>9} {'storage':>10} {'p50':>8} {'p99':>8} {'rpc p50':>9}")
+    for dims in SIZES:
+        matrix = unit_rows(full, dims)
+        timings, recall = [], []
+        for q, expected in zip(queries, truth):
+            qd = np.asarray(reduce_dimensions(q.tolist(), dims), dtype=np.float32)
+            s = time.perf_counter()
+            top = set(np.argpartition(-(matrix @ qd), TOP_K - 1)[:TOP_K])
+            timings.append(time.perf_counter() - s)
+            recall.append(len(top & expected) / TOP_K)
+
+        payload = len(json.dumps({"query_embedding": reduce_dimensions(queries[0].tolist(), dims)}))
+        rpc = "-"
+        if args.rpc:
+            try:
+                rpc_t = []
+                for q in queries[:20]:
+                    s = time.perf_counter()
+                    _rpc_match({"query_embedding": reduce_dimensions(q.tolist(), dims), "match_count": TOP_K,
+                                "namespace": rows[0]["namespace"], "filter_category": None, "filter_type": None},
+                               _rpc_name("match_documents", dims))
+                    rpc_t.append(time.perf_counter() - s)
+                rpc = f"{pct(rpc_t, .5):7.1f}ms"
+            except Exception as e:
+                rpc = f"n/a ({type(e).__name__})"
+        print(f"{dims:>5} {np.mean(recall):>9.3f} {payload:>8}B {len(rows) * dims * 4 / 1e6:>8.2f}MB "
+              f"{pct(timings, .5):>6.3f}ms {pct(timings, .99):>6.3f}ms {rpc:>9}")
+
+
+if __name__ == "__main__":
+    main()
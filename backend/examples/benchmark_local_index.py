@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark retrieval served by the in-process vector index against the
+Supabase `match_documents` RPC.
+
+Loads the documents table into the local index, then issues the same
+queries both ways and prints p50 / p99 latency and the top-k overlap.
+Query vectors are stored chunk embeddings plus a little noise, so no
+OpenAI calls are made.
+
+--quantization also rebuilds the index as int8 and binary codes and
+prints resident vector bytes, latency and recall@k against exact search.
+
+Usage:
+    python examples/benchmark_local_index.py               # real table
+    python examples/benchmark_local_index.py --synthetic 5000   # local only, random rows
+    python examples/benchmark_local_index.py --quantization
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import local_vector_index
+
+TOP_K = 5
+DIM = 1536
+
+
+def pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+
+def report(label, timings):
+    print(f"  {label:6s}: p50={pct(timings, .5):8.3f}ms p99={pct(timings, .99):8.3f}ms")
+
+
+def compare_quantization(pages, queries):
+    exact = [{m["text"] for m in local_vector_index.search(vec, [ns], TOP_K)} for ns, vec in queries]
+    print(f"\nQuantization (recall@{TOP_K} vs exact float32 search)")
+    for mode in local_vector_index.QUANTIZATIONS:
+        local_vector_index.configure(mode)
+        local_vector_index.load(pages)
+        timings, recall = [], []
+        for (ns, vec), truth in zip(queries, exact):
+            s = time.perf_counter()
+            found = {m["text"] for m in local_vector_index.search(vec, [ns], TOP_K)}
+            timings.append(time.perf_counter() - s)
+            recall.append(len(found & truth) / max(len(truth), 1))
+        resident = sum(local_vector_index.memory_bytes().values())
+        print(f"  {mode:6s}: {resident / 1e6:8.2f} MB resident  p50={pct(timings, .5):7.3f}ms "
+              f"p99={pct(timings, .99):7.3f}ms  recall@{TOP_K}={np.mean(recall):.3f}")
+    local_vector_index.configure("none")
+
+
+def synthetic_pages(n: int, rng: np.random.Generator):
+    rows = [
+        {"id": f"syn{i}", "namespace": "website" if i % 3 else "sales", "text": f"chunk {i}",
+         "source": f"src{i // 10}", "category": f"cat{i % 7}", "type": "benefit",
+         "embedding": rng.standard_normal(DIM).astype(np.float32)}
+        for i in range(n)
+    ]
+    return [rows]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--synthetic", type=int, help="benchmark the local index only, on N random rows")
+    parser.add_argument("--quantization", action="store_true", help="compare none / int8 / binary codes")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    if args.synthetic:
+        pages = synthetic_pages(args.synthetic, rng)
+    else:
+        from services.supabase_vector_service import iter_document_pages
+        s = time.perf_counter()
+        pages = list(iter_document_pages())
+        print(f"Fetched {sum(len(p) for p in pages)} rows in {time.perf_counter() - s:.2f}s")
+
+    s = time.perf_counter()
+    local_vector_index.configure("none")
+    local_vector_index.load(pages)
+    print(f"Built local index in {(time.perf_counter() - s) * 1000:.1f}ms: "
+          f"{local_vector_index.get_local_index_stats()['local_index_rows']}")
+
+    rows = [r for page in pages for r in page]
+    queries = []
+    for _ in range(args.queries):
+        row = rows[rng.integers(len(rows))]
+        vec = local_vector_index._vector(row["embedding"])
+        queries.append((row["namespace"], (vec + rng.normal(0, 0.01, vec.shape)).astype(np.float32)))
+
+    local_t, rpc_t, overlap = [], [], []
+    for namespace, vec in queries:
+        s = time.perf_counter()
+        local = local_vector_index.search(vec, [namespace], TOP_K)
+        local_t.append(time.perf_counter() - s)
+        if args.synthetic:
+            continue
+
+        from services.supabase_vector_service import _rpc_match
+        s = time.perf_counter()
+        remote = _rpc_match({"query_embedding": vec.tolist(), "match_count": TOP_K, "namespace": namespace,
+                             "filter_category": None, "filter_type": None}).data or []
+        rpc_t.append(time.perf_counter() - s)
+        overlap.append(len({m["text"] for m in local} & {r["text"] for r in remote}) / TOP_K)
+
+    print(f"\n{len(queries)} queries, top_k={TOP_K}")
+    report("local", local_t)
+    if rpc_t:
+        report("rpc", rpc_t)
+        print(f"  top-{TOP_K} overlap local vs rpc: {np.mean(overlap):.1%}")
+
+    if args.quantization:
+        compare_quantization(pages, queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark the MinHash/LSH prompt index against the old linear difflib scan.
+
+Fills a scratch Redis database with 1k / 10k / 100k synthetic agent prompts
+(shared template + varied user message) and measures `find_similar` latency
+for near-duplicate hits and for misses.
+
+Usage:
+    BENCH_REDIS_URL=redis://localhost:6379/15 python examples/benchmark_prompt_index.py
+
+Only the prompt-index keys (PROMPT_*) of the given database are touched.
+MAX_PROMPT_ENTRIES is lifted for the run so the registry can hold 100k.
+"""
+
+import asyncio
+import difflib
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis.asyncio import Redis
+from services import prompt_index_service as idx
+
+REDIS_URL = os.getenv("BENCH_REDIS_URL", "redis://localhost:6379/15")
+SIZES = [1_000, 10_000, 100_000]
+LOOKUPS = 200
+THRESHOLD = 0.85
+
+WORDS = (
+    "securetrack bizradar cloud engineering application security data ai "
+    "pricing demo compliance soc2 nist iso office location team contact "
+    "how what where why does do you your offer support integrate migrate "
+    "pipeline landing zone pentest audit roadmap partner customer case study"
+).split()
+
+TEMPLATE = " ".join(random.Random(0).choices(WORDS, k=400))
+OTHER_TEMPLATE = " ".join(random.Random(1).choices(WORDS, k=400))  # a different agent
+
+
+def make_prompt(rng: random.Random, template: str = TEMPLATE) -> str:
+    message = " ".join(rng.choices(WORDS, k=rng.randint(6, 18)))
+    history = " ".join(rng.choices(WORDS, k=rng.randint(20, 60)))
+    return f"{template}\n\nUser message: {message}\n\nChat History:\n{history}\n\nSales Agent:"
+
+
+def perturb(prompt: str, rng: random.Random) -> str:
+    words = prompt.split(" ")
+    for _ in range(3):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+async def clear(redis: Redis):
+    await redis.delete(idx.REGISTRY_KEY, idx.BANDS_KEY)
+    for pattern in (f"{idx.BUCKET_KEY_PREFIX}:*", f"{idx.ENTRY_KEY_PREFIX}:*", "bench*"):
+        batch = []
+        async for key in redis.scan_iter(match=pattern, count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                await redis.delete(*batch)
+                batch.clear()
+        if batch:
+            await redis.delete(*batch)
+
+
+def pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+
+async def main():
+    idx.MAX_PROMPT_ENTRIES = max(SIZES)
+    redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    rng = random.Random(42)
+    await clear(redis)
+
+    prompts: list[str] = []
+    for size in SIZES:
+        start = time.perf_counter()
+        while len(prompts) < size:
+            p = make_prompt(rng)
+            await idx.register(redis, p, f"bench{len(prompts)}", '"cached"', ttl=3600)
+            prompts.append(p)
+        print(f"\n=== {size:,} cached prompts (indexed in {time.perf_counter() - start:.1f}s) ===")
+
+        for label, queries in (
+            ("near-dup", [perturb(rng.choice(prompts), rng) for _ in range(LOOKUPS)]),
+            ("miss", [make_prompt(rng, OTHER_TEMPLATE) for _ in range(LOOKUPS)]),
+        ):
+            timings, hits = [], 0
+            for q in queries:
+                s = time.perf_counter()
+                hits += bool(await idx.find_similar(redis, q, THRESHOLD))
+                timings.append(time.perf_counter() - s)
+            print(f"  LSH {label:8s}: p50={pct(timings, .5):7.2f}ms p99={pct(timings, .99):7.2f}ms "
+                  f"mean={statistics.mean(timings) * 1000:7.2f}ms hit-rate={hits / len(queries):.0%}")
+
+        if size == SIZES[0]:
+            # Old behaviour: difflib against every cached prompt (miss = full scan)
+            q = make_prompt(rng, OTHER_TEMPLATE)
+            s = time.perf_counter()
+            for cached in prompts:
+                difflib.SequenceMatcher(None, q, cached).ratio()
+            linear = time.perf_counter() - s
+            print(f"  linear difflib miss: {linear * 1000:.0f}ms "
+                  f"(≈{linear * 100:.1f}s extrapolated to 100k)")
+
+    await clear(redis)
+    await redis.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Replay stored conversations and compare exact cache-hit rates of the old
+rendered-prompt keys against the structured CacheKey components.
+
+Conversations come from the `conversation_memory` table (conv_history) or
+from a JSON file holding a list of structured histories
+([[{"user": ..., "bot": ...}, ...], ...]).
+
+The per-visitor summary is approximated by the raw transcript so far – like
+the real LLM summary it is unique per visitor, which is what kills hit rate.
+
+Intent and sales keys are both reported.  Without --with-context the sales
+prompts are replayed with an empty RAG context (same for old and new keys,
+so the comparison isolates the history handling); with it every turn runs
+the real retrieval.
+
+Usage:
+    python examples/replay_cache_hit_rate.py                  # from Supabase
+    python examples/replay_cache_hit_rate.py --file convos.json
+    python examples/replay_cache_hit_rate.py --with-context   # real RAG context for sales keys
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import intent_agent, sales_agent
+from services.cache_service import _make_cache_key, build_cache_key, keyword_bucket
+
+
+def load_from_supabase(limit: int) -> list[list[dict]]:
+    from db.supabase import get_supabase_client
+    rows = (get_supabase_client().from_("conversation_memory")
+            .select("conv_history").limit(limit).execute()).data or []
+    return [r["conv_history"] for r in rows if isinstance(r.get("conv_history"), list)]
+
+
+def read(path) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+async def replay(conversations: list[list[dict]], with_context: bool):
+    intent_tmpl, sales_tmpl = read(intent_agent.PROMPT_PATH), read(sales_agent.PROMPT_PATH)
+    if with_context:
+        from agents.context_agent import retrieve_context
+
+    seen_old, seen_new = set(), set()
+    hits = {"intent_old": 0, "intent_new": 0, "sales_old": 0, "sales_new": 0}
+    turns = 0
+
+    for convo in conversations:
+        history: list[str] = []
+        for pair in convo:
+            message = (pair.get("user") or "").strip()
+            if not message:
+                continue
+            turns += 1
+            summary = "\n".join(history)
+
+            keys = {
+                "intent": (
+                    f"{intent_tmpl}\n\nUser: {message}\nHistory: {summary}\n→",
+                    build_cache_key("intent", intent_tmpl, message,
+                                    bucket=keyword_bucket(summary, intent_agent.HISTORY_BUCKET_TERMS)).text(),
+                ),
+            }
+            context = "\n\n".join((await retrieve_context(message))["chunks"]) if with_context else ""
+            keys["sales"] = (
+                f"{sales_tmpl}\n\nUser message: {message}\n\nContext:\n{context}\n\n"
+                f"Chat History:\n{summary}\n\nSales Agent:",
+                build_cache_key("sales", sales_tmpl, message, context=context,
+                                bucket=sales_agent.history_bucket(summary)).text(),
+            )
+
+            for agent, (old_prompt, new_text) in keys.items():
+                old_key, new_key = _make_cache_key(old_prompt), _make_cache_key(new_text)
+                hits[f"{agent}_old"] += old_key in seen_old
+                hits[f"{agent}_new"] += new_key in seen_new
+                seen_old.add(old_key)
+                seen_new.add(new_key)
+
+            history += [f"User: {message}", f"Bot: {pair.get('bot') or ''}"]
+
+    print(f"Replayed {len(conversations)} conversations, {turns} user turns")
+    for agent in ("intent", "sales"):
+        old, new = hits[f"{agent}_old"], hits[f"{agent}_new"]
+        print(f"  {agent:6s} exact hit rate: rendered prompt {old / max(turns, 1):6.1%}"
+              f"  →  structured key {new / max(turns, 1):6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="JSON list of structured conversation histories")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--with-context", action="store_true")
+    args = parser.parse_args()
+
+    conversations = json.loads(read(args.file)) if args.file else load_from_supabase(args.limit)
+    asyncio.run(replay(conversations, args.with_context))
+
+
+if __name__ == "__main__":
+    main()
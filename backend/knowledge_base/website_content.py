@@ -1,13 +1,44 @@
 
-import requests
+"""
+Website scraping – pages are fetched with a shared async HTTP client and
+only handed to a headless browser when they need JavaScript to render.
+
+The site is a client-rendered SPA for some routes: a static response whose
+readable text is shorter than MIN_STATIC_CHARS (an empty `<div id="root">`)
+is re-fetched through BrowserPool.  The pool keeps BROWSER_POOL_SIZE Chrome
+instances alive across calls, waits for `document.readyState` plus rendered
+body text instead of a fixed sleep, and runs every Selenium call in a worker
+thread so the event loop keeps serving chat traffic.
+
+`fetch_page` sends the ETag / Last-Modified of the previous crawl; a 304
+skips parsing and rendering altogether (see services/web_crawler.py).
+"""
+import asyncio
+import logging
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+import httpx
 import html2text
 from bs4 import BeautifulSoup
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
-import logging
-import time
+
+from config.settings import WEBSITE_SITEMAP_URL
+
+FETCH_TIMEOUT      = 15          # seconds per static request
+RENDER_TIMEOUT     = 20          # seconds the browser may take to render a page
+MIN_STATIC_CHARS   = 500         # less readable text than this ⇒ page needs JS
+BROWSER_POOL_SIZE  = 1
+ACQUIRE_TIMEOUT    = 60          # seconds a render waits for a free browser
+USER_AGENT         = "Mozilla/5.0 (compatible; IndrasolBot/1.0; +https://indrasol.com)"
+
 def get_urls():
     urls = [
     "https://indrasol.com/",
@@ -31,25 +62,236 @@ def get_urls():
 
 
 
+
+
+# ── HTML → markdown ───────────────────────────────────────────────────
+def html_to_markdown(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    for elem in soup(["nav", "footer", "script", "style", "noscript"]):
+        elem.decompose()
+    h = html2text.HTML2Text()
+    h.ignore_links = True
+    return h.handle(str(soup))
+
+
+def _needs_browser(html: str) -> bool:
+    """True when the static HTML has too little readable text (an SPA shell)."""
+    soup = BeautifulSoup(html, "html.parser")
+    for elem in soup(["script", "style", "noscript", "template"]):
+        elem.decompose()
+    return len(soup.get_text(" ", strip=True)) < MIN_STATIC_CHARS
+
+
+# ── Static fetch ──────────────────────────────────────────────────────
+_http_client: httpx.AsyncClient | None = None
+
+
+def _client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=FETCH_TIMEOUT,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+    return _http_client
+
+
+async def fetch_static(url: str, validators: dict | None = None) -> httpx.Response:
+    """GET *url* without running its JavaScript, conditional on stored ETag / Last-Modified."""
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    resp = await _client().get(url, headers=headers)
+    if resp.status_code != 304:
+        resp.raise_for_status()
+    return resp
+
+
+# ── Sitemap ───────────────────────────────────────────────────────────
+_SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+async def get_sitemap_urls(sitemap_url: str = WEBSITE_SITEMAP_URL) -> list[str]:
+    """Page URLs of a sitemap (following one level of sitemap index)."""
+    resp = await _client().get(sitemap_url)
+    resp.raise_for_status()
+    root = ET.fromstring(resp.content)
+    locs = [el.text.strip() for el in root.iter(f"{_SITEMAP_NS}loc") if el.text]
+    if root.tag != f"{_SITEMAP_NS}sitemapindex":
+        return locs
+    urls: list[str] = []
+    for child in locs:
+        urls.extend(await get_sitemap_urls(child))
+    return urls
+
+
+async def get_crawl_urls() -> list[str]:
+    """Pages to crawl: the sitemap when WEBSITESITEMAPURLIND is set, else get_urls()."""
+    if WEBSITE_SITEMAP_URL:
+        try:
+            urls = await get_sitemap_urls(WEBSITE_SITEMAP_URL)
+            if urls:
+                return list(dict.fromkeys(urls))
+            logging.warning(f"Sitemap {WEBSITE_SITEMAP_URL} lists no pages; using the built-in URL list")
+        except (httpx.HTTPError, ET.ParseError) as e:
+            logging.warning(f"Sitemap {WEBSITE_SITEMAP_URL} unavailable ({e}); using the built-in URL list")
+    return get_urls()
+
+
+# ── Headless browser pool ─────────────────────────────────────────────
+class BrowserPool:
+    """
+    Long-lived headless Chrome instances, checked out one page at a time.
+
+    Capacity is a semaphore of *size* slots held for the whole checkout, so
+    a browser that fails is quit and its slot freed for a fresh one: the
+    pool never shrinks, and a render waits at most ACQUIRE_TIMEOUT.
+    (A threading semaphore – renders run in worker threads.)
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE):
+        self.size = size
+        self._idle: "queue.Queue[webdriver.Chrome]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._driver_path: str | None = None
+
+    def _new_driver(self) -> webdriver.Chrome:
+        if self._driver_path is None:
+            self._driver_path = ChromeDriverManager().install()   # once per process, not per URL
+        options = Options()
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.page_load_strategy = "eager"      # DOMContentLoaded; rendering is awaited below
+        driver = webdriver.Chrome(service=Service(self._driver_path), options=options)
+        driver.set_page_load_timeout(RENDER_TIMEOUT)
+        return driver
+
+    def _acquire(self, timeout: float = ACQUIRE_TIMEOUT) -> webdriver.Chrome:
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"no browser free within {timeout}s")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._new_driver()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, driver: webdriver.Chrome, healthy: bool):
+        try:
+            if healthy:
+                self._idle.put(driver)
+            else:
+                self._quit(driver)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _quit(driver: webdriver.Chrome):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def render(self, url: str) -> str:
+        """Page source of *url* once the DOM is ready and the body has text (blocking)."""
+        driver = self._acquire()
+        healthy = False
+        try:
+            driver.get(url)
+            wait = WebDriverWait(driver, RENDER_TIMEOUT, poll_frequency=0.2)
+            wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+            try:
+                wait.until(lambda d: len(d.execute_script("return document.body ? document.body.innerText : ''") or "")
+                           >= MIN_STATIC_CHARS)
+            except TimeoutException:
+                logging.warning(f"{url} rendered less than {MIN_STATIC_CHARS} characters of text")
+            html = driver.page_source
+            healthy = True
+        finally:
+            # any failure leaves the browser in an unknown state: quit it, a fresh one takes the slot
+            self._release(driver, healthy)
+        return html
+
+    def close(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(driver)
+
+
+browser_pool = BrowserPool()
+
+
+async def close_fetchers():
+    """Close the HTTP client and the browsers (app shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    await asyncio.to_thread(browser_pool.close)
+
+
+@dataclass
+class Page:
+    url: str
+    html: str = ""
+    content: str = ""                   # markdown, filled by fetch_page
+    rendered: bool = False              # html came from the browser pool
+    not_modified: bool = False          # 304: content was not downloaded
+    validators: dict = field(default_factory=dict)   # {"etag", "last_modified"} of the response
+
+
+async def fetch_html(url: str, validators: dict | None = None) -> Page:
+    """
+    Fetch the HTML of *url*, rendering it in the browser pool when the static
+    response is an SPA shell.  With *validators* the request is conditional:
+    on 304 nothing is downloaded or rendered and `not_modified` is set.  For
+    client-rendered routes the validators are those of the HTML shell,
+    which changes with every deploy of the site.
+    """
+    page = Page(url)
+    try:
+        resp = await fetch_static(url, validators)
+        if resp.status_code == 304:
+            page.not_modified = True
+            page.validators = dict(validators or {})
+            return page
+        page.validators = {k: v for k, v in (("etag", resp.headers.get("etag")),
+                                            ("last_modified", resp.headers.get("last-modified"))) if v}
+        page.html = resp.text
+    except httpx.HTTPError as e:
+        logging.warning(f"Static fetch of {url} failed ({e}); rendering in the browser")
+    if not page.html or await asyncio.to_thread(_needs_browser, page.html):
+        try:
+            page.html = await asyncio.to_thread(browser_pool.render, url)
+            page.rendered = True
+        except Exception as e:
+            logging.error(f"Failed to scrape {url}: {e}")
+            page.html, page.validators = "", {}
+    return page
+
+
+async def fetch_page(url: str, validators: dict | None = None) -> Page:
+    """`fetch_html` + conversion to markdown (`content`)."""
+    page = await fetch_html(url, validators)
+    if page.html:
+        page.content = await asyncio.to_thread(html_to_markdown, page.html)
+        logging.info(f"Scraped {len(page.content)} characters from {url} ({'browser' if page.rendered else 'static'})")
+    return page
+
+
 # Scrape URL and convert to markdown
 async def scrapped_website_content(url):
-    try:
-        # Set up Selenium WebDriver
-        options = Options()
-        options.add_argument("--headless")  # Run without opening a browser window
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        driver.get(url)
-        time.sleep(5)  # Wait for JavaScript to load (adjust as needed)
-        page_source = driver.page_source
-        driver.quit()
-        soup = BeautifulSoup(page_source, "html.parser")
-        for elem in soup(["nav", "footer"]):
-            elem.decompose()
-        h = html2text.HTML2Text()
-        h.ignore_links = True
-        markdown_content = h.handle(str(soup))
-        logging.info(f"Scraped {len(markdown_content)} characters from {url}")
-        return markdown_content
-    except requests.RequestException as e:
-        logging.error(f"Failed to scrape {url}: {e}")
-        return ""
+    return (await fetch_page(url)).content
@@ -4,16 +4,21 @@ import asyncio
 # from indra_bot import WebContentProcessor
 from routes_register import router as api_router
 from contextlib import asynccontextmanager
-from services.bot_service import initialize_website_content, initialize_sales_content, load_hashes, check_for_updates, get_urls, check_index_stats, get_namespace_counts
+from services.bot_service import load_hashes, get_urls
 # from backend.config.settings import PINECONE_API_KEY
 from apscheduler.schedulers.background import BackgroundScheduler   
 import logging
-from fastapi.responses import Response
-from services.sales_content_check import sales_content_changed
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 
 from redis.asyncio import Redis
-from services.cache_service import init_redis_client
+from services.cache_service import init_redis_client, run_invalidation_listener
+from services.semantic_cache_service import run_semantic_cache_listener
+from services.embedding_cache_service import init_embedding_cache
+from services.bootstrap_service import follow, run_leader_jobs, is_ready, get_bootstrap_status
+from services.leader_service import elector
+from services.retrieval_cache_service import run_corpus_listener
+from knowledge_base.website_content import close_fetchers
 from config.settings import REDIS_URL
 
 logging.basicConfig(level=logging.INFO)
@@ -29,41 +34,24 @@ async def lifespan(app: FastAPI):
             raise ValueError("REDIS_URL is not set in the environment variables.")
         redis = Redis.from_url(redis_url, decode_responses=True)
         init_redis_client(redis)
+        # embeddings are cached as packed float32 bytes → needs a non-decoding client
+        embedding_redis = Redis.from_url(redis_url, decode_responses=False)
+        init_embedding_cache(embedding_redis)
+        invalidation_task = asyncio.create_task(run_invalidation_listener())
+        semantic_cache_task = asyncio.create_task(run_semantic_cache_listener())
 
     
 
         global hashes
         hashes = load_hashes()
-        counts = get_namespace_counts()
-        website_count = counts["website"]
-        sales_count   = counts["sales"]
-        logging.info(f"Vector rows total: {counts['total']}")
-        if website_count == 0:
-            await initialize_website_content()
-        if sales_count == 0:
-            await initialize_sales_content()
-        # if website_count == 0 and sales_count == 0:
-        #     logging.info("Initializing pinecone")
-        #     await initialize_website_content()
-        #     await initialize_sales_content()
-        if await sales_content_changed():
-            logging.info("Sales content changed, refreshing...")
-            await initialize_sales_content()
-        # Periodic refresh (async)
-        async def refresh_task():
-            logging.info("Starting periodic refresh task...")
-            while True:
-                logging.info("Sleeping for 24 hours before checking for updates...")
-                await asyncio.sleep(86400)  # Wait 24 hours before each check
-                logging.info("Checking for updates...")
-                try:
-                    await check_for_updates()
-                    logging.info("Update check completed successfully.")
-                except Exception as e:
-                    logging.error(f"Error during periodic update check: {e}") 
-
-        loop = asyncio.get_event_loop()
-        loop.create_task(refresh_task())
+        corpus_task = asyncio.create_task(run_corpus_listener())
+        # Corpus bootstrap and the 24h refresh run on one elected worker only (fenced by its lease);
+        # every worker serves requests (degraded) meanwhile and follows the leader, see GET /ready
+        async def leader_jobs(fence: int):
+            await run_leader_jobs(elector.guard(fence))
+
+        follow_task = asyncio.create_task(follow())
+        jobs_task = asyncio.create_task(elector.run(leader_jobs))
         yield
     except Exception as e:
         logging.error(f"Error during lifespan startup: {e}")
@@ -72,7 +60,15 @@ async def lifespan(app: FastAPI):
         # Cleanup resources in finally block to ensure they run even on errors
         if hasattr(app.state, 'scheduler'):
             app.state.scheduler.shutdown()
+        invalidation_task.cancel()
+        semantic_cache_task.cancel()
+        corpus_task.cancel()
+        follow_task.cancel()
+        jobs_task.cancel()
+        await asyncio.gather(jobs_task, return_exceptions=True)
         await redis.close()
+        await embedding_redis.close()
+        await close_fetchers()
         pass
 
 # Create the FastAPI app once
@@ -145,5 +141,15 @@ async def log_requests(request: Request, call_next):
 # List of URLs to process on startup
 urls = get_urls()
 
+# Liveness: the process serves requests
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+# Readiness: corpus bootstrap finished (chat works degraded before that)
+@app.get("/ready")
+async def ready():
+    return JSONResponse(status_code=200 if is_ready() else 503, content=get_bootstrap_status())
+
 # Include API router
 app.include_router(api_router, prefix="/v1/routes")
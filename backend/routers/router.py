@@ -448,7 +448,9 @@ async def chat_controller(req: QueryRequest):
             context_txt = "\n\n".join(context["chunks"])
             ##logging.info(f"Sales Agent context text: {context_txt}")
             #logging.info("calling sales agent")
-            reply = await run_sales_agent(req.query, context_txt, conv_summary)
+            async def fresh_context():
+                return "\n\n".join((await retrieve_context(req.query))["chunks"])
+            reply = await run_sales_agent(req.query, context_txt, conv_summary, retrieve=fresh_context)
             # logging.info(f"Sales Agent response: {reply}")
 
             # Detect product / service mentioned
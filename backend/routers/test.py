@@ -1,12 +1,30 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from knowledge_base.website_content import scrapped_website_content,get_urls
 from knowledge_base.sales_content import get_sales_content
 from services.bot_service import export_pinecone_to_markdown,refresh_urls
 from services.bot_service import delete_all_pinecone_data,check_for_updates
 from agents.engagement_agent import run_engagement_agent
+from services.cache_service import get_cache_stats
+from services.semantic_cache_service import get_semantic_cache_stats
+from services.embedding_cache_service import get_embedding_cache_stats
+from services.retrieval_cache_service import get_retrieval_cache_stats
+from services.embedding_store import get_embedding_store_stats
+from services.corpus_snapshot import SnapshotError, export_snapshot, import_snapshot, snapshot_path
+from services.corpus_export import FORMATS, check_format, iter_export
+from config.settings import ADMIN_API_KEY
+from typing import Optional
+import asyncio
+import secrets
 router = APIRouter()
 
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    # Admin-only routes: fail closed when no key is configured
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled (ADMINAPIKEYIND not set)")
+    if not x_admin_key or not secrets.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
 @router.post("/website_content")
 async def website_content_endpoint(url:str):
     data =  await scrapped_website_content(url)
@@ -17,10 +35,24 @@ def sales_content_endpoint():
     sales_content = get_sales_content()
     return JSONResponse(content={"sales_content": sales_content})
 @router.get("/retrieve_data")
-def retrieve_data_endpoint():
-    # Call the export function from bot_service
-    export_pinecone_to_markdown()
+async def retrieve_data_endpoint():
+    # Writes pinecone_content.md, streamed page by page in a worker thread
+    await asyncio.to_thread(export_pinecone_to_markdown)
     return JSONResponse(content={"message": "Data retrieval initiated"})
+@router.get("/export_data", dependencies=[Depends(require_admin)])
+def export_data_endpoint(format: str = "ndjson", namespace: Optional[str] = None):
+    # Chunked download; the sync generator is iterated in the threadpool, off the event loop
+    try:
+        check_format(format)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    media_type, extension = FORMATS[format]
+    filename = f"documents-{namespace or 'all'}{extension}"
+    return StreamingResponse(
+        iter_export(format, namespace),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 @router.delete("/delete_data")
 def delete_data_endpoint():
     delete_all_pinecone_data()
@@ -37,6 +69,28 @@ async def refresh_urls_endpoint():
     data = await refresh_urls(urls)
     return JSONResponse(content={"message": "URLs refreshed successfully", "data": data})
 
+@router.post("/export_snapshot", dependencies=[Depends(require_admin)])
+async def export_snapshot_endpoint(name: str = ""):
+    # Binary snapshot (manifest + embeddings.npy + chunks.jsonl) of the documents table, under CORPUS_SNAPSHOT_DIR
+    try:
+        path = snapshot_path(name)
+        manifest = await asyncio.to_thread(export_snapshot, path)
+    except SnapshotError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    return JSONResponse(content={"message": "Snapshot exported", "path": path, "manifest": manifest})
+@router.post("/import_snapshot", dependencies=[Depends(require_admin)])
+async def import_snapshot_endpoint(name: str = ""):
+    try:
+        data = await import_snapshot(snapshot_path(name))
+    except SnapshotError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    return JSONResponse(content={"message": "Snapshot imported", "data": data})
+
+@router.get("/cache_stats")
+def cache_stats_endpoint():
+    # Per-tier hit/miss counters of the worker that serves this request
+    return JSONResponse(content={**get_cache_stats(), **get_semantic_cache_stats(), **get_embedding_cache_stats(), **get_retrieval_cache_stats(), **get_embedding_store_stats()})
+
 @router.post("/engagement")
 async def engagement_endpoint(request: Request):
     data = await request.json()
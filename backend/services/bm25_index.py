@@ -0,0 +1,171 @@
+"""
+bm25_index – in-process lexical (BM25) index over the ingested chunks.
+
+Dense retrieval blurs exact product names and acronyms ("SOC2", "CSPM",
+"SecureTrack"); a term index catches them.  `query_supabase_vector` fuses
+this ranking with the vector ranking by reciprocal-rank fusion.
+
+One inverted index per namespace (term -> {doc id: tf}).  It is filled
+from the documents table at startup and patched by the same ingestion
+paths that write Supabase, so it never needs a full rebuild.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("bm25_index")
+
+# ── constants ─────────────────────────────────────────────────────────
+K1 = 1.5
+B  = 0.75
+RRF_K = 60            # reciprocal-rank fusion damping
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case alphanumeric terms; "SOC 2" also yields "soc2"."""
+    words = _TOKEN_RE.findall((text or "").lower())
+    compounds = [a + b for a, b in zip(words, words[1:]) if b.isdigit() and not a.isdigit()]
+    return words + compounds
+
+
+class _Namespace:
+    __slots__ = ("postings", "lengths", "docs", "total_length")
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+
+    def add(self, doc_id: str, row: Dict[str, Any]):
+        if doc_id in self.docs:
+            self.discard(doc_id)
+        terms = Counter(tokenize(row.get("text") or ""))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(terms.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+        self.docs[doc_id] = {k: row.get(k) for k in ("text", "source", "category", "type")}
+
+    def discard(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in set(tokenize(doc["text"] or "")):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id, 0)
+
+    def search(self, terms: List[str], top_k: int, category: Optional[str], doc_type: Optional[str]):
+        n = len(self.docs)
+        if not n:
+            return []
+        avgdl = self.total_length / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = tf + K1 * (1 - B + B * self.lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / norm
+        hits = []
+        for doc_id, score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+            doc = self.docs[doc_id]
+            if (category is None or doc["category"] == category) and (doc_type is None or doc["type"] == doc_type):
+                hits.append((score, doc_id))
+                if len(hits) >= top_k:
+                    break
+        return hits
+
+
+_namespaces: Dict[str, _Namespace] = {}
+_ready = False
+
+
+# ── Loading / incremental sync ────────────────────────────────────────
+def load(pages: Iterable[List[Dict[str, Any]]]):
+    """Replace the index with the rows yielded page by page (id, namespace, text, …)."""
+    global _namespaces, _ready
+    built: Dict[str, _Namespace] = {}
+    for page in pages:
+        for row in page:
+            built.setdefault(row["namespace"], _Namespace()).add(row["id"], row)
+    _namespaces, _ready = built, True
+    logger.info("BM25 index loaded: %s", {n: len(ns.docs) for n, ns in built.items()})
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def upsert(rows: List[Dict[str, Any]]):
+    """Index rows just written to Supabase (no-op until loaded)."""
+    if not _ready:
+        return
+    for row in rows:
+        _namespaces.setdefault(row["namespace"], _Namespace()).add(row["id"], row)
+
+
+def remove(namespace: str, source: Optional[str] = None, ids: Optional[Iterable[str]] = None):
+    """Drop rows of *namespace* by source and/or id (no-op until loaded)."""
+    ns = _namespaces.get(namespace)
+    if not _ready or ns is None:
+        return
+    drop = set(ids or ())
+    if source is not None:
+        drop.update(doc_id for doc_id, doc in ns.docs.items() if doc["source"] == source)
+    for doc_id in drop:
+        ns.discard(doc_id)
+
+
+# ── Query ─────────────────────────────────────────────────────────────
+def search(
+    query: str,
+    namespaces: Sequence[str],
+    top_k: int = 5,
+    filter_category: Optional[str] = None,
+    filter_type: Optional[str] = None,
+    fallback: bool = False,
+) -> List[Dict[str, Any]]:
+    """BM25-ranked matches, shaped like the vector matches."""
+    terms = tokenize(query)
+    hits: List[Tuple[float, str, str]] = []
+    for name in namespaces:
+        ns = _namespaces.get(name)
+        if ns is None:
+            continue
+        found = [(score, name, doc_id) for score, doc_id in ns.search(terms, top_k, filter_category, filter_type)]
+        if fallback and found:
+            hits = found
+            break
+        hits.extend(found)
+    hits.sort(key=lambda h: h[0], reverse=True)
+    return [
+        {**_namespaces[name].docs[doc_id], "namespace": name, "score": score}
+        for score, name, doc_id in hits[:top_k]
+    ]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """Merge ranked match lists; the fused score replaces the per-ranker scores."""
+    fused: Dict[Tuple[Any, Any], float] = {}
+    matches: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking):
+            key = (match.get("source"), match.get("text"))
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            matches.setdefault(key, match)
+    order = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [{**matches[key], "score": fused[key]} for key in order]
@@ -0,0 +1,231 @@
+"""
+bootstrap_service – corpus bootstrap as a supervised background job.
+
+The lifespan used to await the whole bootstrap (Supabase row counts, a
+full website scrape + embed on an empty table, the sales re-embed) before
+the server accepted a single request.  Now it only starts `supervise()`
+and yields; the bootstrap runs next to live traffic:
+
+  * chat is available from the first second, degraded: retrieval goes to
+    the Supabase RPC (local indexes not loaded yet) over whatever rows
+    exist, and answers cached meanwhile are marked stale once the
+    bootstrap has written content;
+  * a failed attempt is retried with exponential backoff, up to
+    BOOTSTRAP_MAX_ATTEMPTS;
+  * `GET /ready` reports the state, the per-step timings and the corpus
+    counts – 200 once ready, 503 before;
+  * an empty table is filled from the corpus snapshot in
+    CORPUS_SNAPSHOT_DIR, when there is one, before anything is scraped.
+
+With several workers only the leader (leader_service) runs `supervise`
+and `refresh_loop`, fenced by its lease; the others `follow`: they wait
+for the bootstrap marker, load their in-process indexes and report ready.
+The marker is scoped by DEPLOYMENT_ID and deleted whenever a leader starts
+a bootstrap, so a stale marker left by an earlier release or an earlier
+leader never makes a follower ready ahead of the corpus; it expires unless
+the leader's refresh loop renews it.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services import bm25_index, cache_service, local_vector_index
+from services.bot_service import check_for_updates, get_namespace_counts, initialize_sales_content, initialize_website_content
+from services.cache_service import mark_cache_stale
+from services.corpus_snapshot import import_snapshot, snapshot_available
+from config.settings import CORPUS_SNAPSHOT_DIR, DEPLOYMENT_ID
+from services.sales_content_check import record_sales_content, sales_content_changed
+from services.supabase_vector_service import load_retrieval_indexes
+
+logger = logging.getLogger("bootstrap_service")
+
+# ── constants ─────────────────────────────────────────────────────────
+BOOTSTRAP_MAX_ATTEMPTS = 5
+BOOTSTRAP_BACKOFF      = 10       # seconds before the 2nd attempt, doubled after each failure
+BOOTSTRAP_BACKOFF_MAX  = 300
+BOOTSTRAP_DONE_KEY     = f"CORPUS_BOOTSTRAPPED:{DEPLOYMENT_ID}"   # set by the leader once the corpus is in place
+FOLLOW_POLL            = 2        # seconds between follower checks of BOOTSTRAP_DONE_KEY
+REFRESH_INTERVAL       = 86400    # website update check, shared across workers and restarts
+BOOTSTRAP_DONE_TTL     = 2 * REFRESH_INTERVAL   # renewed by the leader after every update check
+LAST_REFRESH_KEY       = "CORPUS_LAST_REFRESH"
+
+Guard = Optional[Callable[[], Awaitable[bool]]]
+
+_started = time.monotonic()
+_status: Dict[str, Any] = {
+    "state": "pending",            # pending | following | bootstrapping | ready | failed
+    "attempt": 0,
+    "error": None,
+    "ready_after_s": None,         # seconds from process start to ready
+    "counts": {},
+    "steps": {},
+}
+
+
+def is_ready() -> bool:
+    return _status["state"] == "ready"
+
+
+def get_bootstrap_status() -> Dict[str, Any]:
+    return {
+        **_status,
+        "steps": {name: dict(step) for name, step in _status["steps"].items()},
+        "chat": "ready" if is_ready() else "degraded",
+        "local_index_ready": local_vector_index.is_ready(),
+        "bm25_ready": bm25_index.is_ready(),
+        "uptime_s": round(time.monotonic() - _started, 3),
+    }
+
+
+async def _step(name: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    step = _status["steps"][name] = {"status": "running"}
+    start = time.perf_counter()
+    try:
+        result = await fn()
+    except Exception as e:
+        step.update(status="failed", error=str(e), seconds=round(time.perf_counter() - start, 3))
+        raise
+    step.update(status="done", seconds=round(time.perf_counter() - start, 3))
+    logger.info("Bootstrap step %s done in %.2fs", name, step["seconds"])
+    return result
+
+
+async def _ingest(name: str, fn: Callable[..., Awaitable[Dict[str, Any]]], guard: Guard):
+    """Run an ingestion pipeline as a step; nothing written out of several sources fails the attempt."""
+    summary = await _step(name, lambda: fn(guard=guard))
+    failed = sum(stage["failed"] for stage in summary["stages"].values())
+    _status["steps"][name].update(written=summary["written"], sources=summary["sources"], failed=failed)
+    if summary["sources"] and not summary["written"]:
+        _status["steps"][name]["status"] = "failed"
+        raise RuntimeError(f"{name} ingestion wrote none of {summary['sources']} sources")
+
+
+def _skip(name: str):
+    _status["steps"][name] = {"status": "skipped"}
+
+
+async def bootstrap(guard: Guard = None):
+    """One bootstrap attempt: ingest what is missing or changed, then load the retrieval indexes."""
+    counts = await _step("namespace_counts", lambda: asyncio.to_thread(get_namespace_counts))
+    _status["counts"] = counts
+    logger.info(f"Vector rows total: {counts['total']}")
+    wrote = False
+
+    if counts["total"] == 0 and snapshot_available(CORPUS_SNAPSHOT_DIR):
+        await _step("snapshot", lambda: import_snapshot(CORPUS_SNAPSHOT_DIR, guard=guard))
+        counts = await asyncio.to_thread(get_namespace_counts)
+        _status["counts"] = counts
+        wrote = True
+
+    if counts["website"] == 0:
+        await _ingest("website", initialize_website_content, guard)
+        wrote = True
+    else:
+        _skip("website")
+
+    if counts["sales"] == 0 or await sales_content_changed():
+        await _ingest("sales", initialize_sales_content, guard)
+        if guard is None or await guard():
+            record_sales_content()
+        wrote = True
+    else:
+        _skip("sales")
+
+    try:
+        await _step("retrieval_indexes", load_retrieval_indexes)
+    except Exception as e:
+        logger.error(f"Retrieval indexes not loaded, using Supabase RPC only: {e}")
+
+    if wrote:
+        _status["counts"] = await asyncio.to_thread(get_namespace_counts)
+        # answers given from the partial corpus: serve, then re-generate
+        await mark_cache_stale()
+
+
+async def _mark_bootstrapped(guard: Guard, done: bool):
+    """Set (renew) or clear the marker followers wait for – only while *guard* holds."""
+    redis = cache_service.redis_client
+    if redis is None or (guard is not None and not await guard()):
+        return
+    if done:
+        await redis.set(BOOTSTRAP_DONE_KEY, time.time(), ex=BOOTSTRAP_DONE_TTL)
+    else:
+        await redis.delete(BOOTSTRAP_DONE_KEY)
+
+
+async def supervise(guard: Guard = None):
+    """Run `bootstrap` until it succeeds or BOOTSTRAP_MAX_ATTEMPTS attempts failed."""
+    delay = BOOTSTRAP_BACKOFF
+    was_ready = is_ready()            # a follower promoted to leader keeps serving as ready
+    await _mark_bootstrapped(guard, done=False)
+    for attempt in range(1, BOOTSTRAP_MAX_ATTEMPTS + 1):
+        _status.update(attempt=attempt, error=None)
+        if not was_ready:
+            _status["state"] = "bootstrapping"
+        try:
+            await bootstrap(guard)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _status["error"] = str(e)
+            logger.exception(f"Bootstrap attempt {attempt}/{BOOTSTRAP_MAX_ATTEMPTS} failed: {e}")
+            if attempt == BOOTSTRAP_MAX_ATTEMPTS:
+                if not was_ready:
+                    _status["state"] = "failed"
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, BOOTSTRAP_BACKOFF_MAX)
+            continue
+        if not was_ready:
+            _status.update(state="ready", ready_after_s=round(time.monotonic() - _started, 3))
+        await _mark_bootstrapped(guard, done=True)
+        logger.info("Bootstrap complete after %.2fs", time.monotonic() - _started)
+        return
+
+
+async def follow():
+    """Follower: become ready once the leader has bootstrapped the corpus."""
+    if _status["state"] == "pending":
+        _status["state"] = "following"
+    while not is_ready():
+        if _status["state"] == "following" and await cache_service.redis_client.exists(BOOTSTRAP_DONE_KEY):
+            try:
+                await _step("retrieval_indexes", load_retrieval_indexes)
+            except Exception as e:
+                logger.error(f"Retrieval indexes not loaded, using Supabase RPC only: {e}")
+            if _status["state"] == "following":
+                _status.update(state="ready", ready_after_s=round(time.monotonic() - _started, 3))
+            logger.info("Corpus bootstrapped by the leader, ready after %.2fs", time.monotonic() - _started)
+            return
+        await asyncio.sleep(FOLLOW_POLL)
+
+
+async def refresh_loop(guard: Guard = None):
+    """Leader: check the website for updates every REFRESH_INTERVAL, counted from the last check by any worker."""
+    redis = cache_service.redis_client
+    while True:
+        last = float(await redis.get(LAST_REFRESH_KEY) or 0)
+        wait = max(0.0, last + REFRESH_INTERVAL - time.time()) if last else REFRESH_INTERVAL
+        logger.info("Next website update check in %.0fs", wait)
+        await asyncio.sleep(wait)
+        logger.info("Checking for updates...")
+        try:
+            await check_for_updates(guard=guard)
+            logger.info("Update check completed successfully.")
+        except Exception as e:
+            logger.error(f"Error during periodic update check: {e}")
+        if guard is None or await guard():
+            await redis.set(LAST_REFRESH_KEY, time.time())
+            if is_ready():
+                await _mark_bootstrapped(guard, done=True)
+        elif guard is not None:
+            return
+
+
+async def run_leader_jobs(guard: Guard = None):
+    """Everything only one worker may run: bootstrap, then the periodic refresh."""
+    await supervise(guard)
+    await refresh_loop(guard)
@@ -4,7 +4,7 @@ from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
-from knowledge_base.website_content import scrapped_website_content,get_urls
+from knowledge_base.website_content import get_crawl_urls, get_urls
 from knowledge_base.sales_content import get_sales_content
 import logging
 import os
@@ -12,7 +12,11 @@ import json
 import hashlib
 from pydantic import BaseModel
 import time
-from services.supabase_vector_service import store_documents, query_supabase_vector
+from services.supabase_vector_service import query_supabase_vector
+from services.ingestion_pipeline import IngestionPipeline, Source
+from services.cache_service import mark_cache_stale
+from services.web_crawler import crawl
+from services.corpus_export import write_export
 from supabase import create_client, Client
 from config.settings import SUPABASE_URL, SUPABASE_SERVICE_KEY
 
@@ -33,29 +37,6 @@ hashes = {}
 def get_openai_client():
     return openai_client
 
-# Split content into smaller chunks
-async def split_content(content, chunk_size=500):
-    if not content:
-        logging.warning("No content to split")
-        return []
-    words = content.split()
-    final_chunks = []
-    current_chunk = []
-    current_length = 0
-    for word in words:
-        word_length = len(word) + 1
-        if current_length + word_length > chunk_size and current_chunk:
-            final_chunks.append(" ".join(current_chunk))
-            current_chunk = [word]
-            current_length = word_length
-        else:
-            current_chunk.append(word)
-            current_length += word_length
-    if current_chunk:
-        final_chunks.append(" ".join(current_chunk))
-    logging.info(f"Split content into {len(final_chunks)} chunks")
-    return [chunk.strip() for chunk in final_chunks if chunk.strip()]
-
 # Create embeddings using OpenAI
 async def create_embedding(text):
     client = get_openai_client()
@@ -73,13 +54,17 @@ def compute_hash(content):
 
 # Load hashes from file
 def load_hashes():
-    """Load stored hashes from hashes.json."""
+    """Load stored hashes (+ HTTP validators) from hashes.json into `hashes`."""
+    hashes.clear()
     if os.path.exists('hashes.json'):
         with open('hashes.json', 'r') as f:
             logging.info("Loading hashes from file")
-            return json.load(f)
-    logging.info("No hashes file found, starting with empty hashes")
-    return {}
+            for url, entry in json.load(f).items():
+                # older files map url -> hash only
+                hashes[url] = entry if isinstance(entry, dict) else {"hash": entry}
+    else:
+        logging.info("No hashes file found, starting with empty hashes")
+    return hashes
 
 # Save hashes to file
 def save_hashes():
@@ -87,60 +72,43 @@ def save_hashes():
     with open('hashes.json', 'w') as f:
         json.dump(hashes, f)
 
-# Modified store_embeddings
-async def store_embeddings(chunks: list[str], namespace: str, source_id: str):
-    """
-    Stores a list of text chunks as vector embeddings in Pinecone under a given namespace.
-    
-    Args:
-        chunks (list[str]): The text chunks to embed and store.
-        namespace (str): Pinecone namespace (e.g., "website", "sales").
-        source_id (str): A unique identifier for the source (URL, title, etc.).
-    """
-    for i, chunk in enumerate(chunks):
-        try:
-            embedding = await create_embedding(chunk)
-            vector_id = f"{source_id.replace('/', '_')}_{i}"
-            # Supabase upsert handled elsewhere (store_documents). Left here if needed for direct upsert
-            pass
-            logging.info(f"Upserted vector {vector_id} in namespace '{namespace}'")
-        except Exception as e:
-            logging.error(f"Failed to upsert vector for {source_id}, chunk {i}: {e}")
+def _validators(url):
+    """ETag / Last-Modified recorded for *url* by the last successful crawl."""
+    entry = hashes.get(url) or {}
+    return {k: entry[k] for k in ("etag", "last_modified") if entry.get(k)}
 
+def _record_page(url, content_hash, validators=None):
+    hashes[url] = {"hash": content_hash, **(validators or {})}
 
-def split_overlap(text: str, size: int = 400, overlap: int = 50):
-    words = text.split()
-    for start in range(0, len(words), size - overlap):
-        yield " ".join(words[start:start + size])
+def _record_source(source: Source):
+    """Pipeline callback: remember the hash / validators of a written website page."""
+    _record_page(source.source_id, compute_hash(source.text), source.validators)
 
+def _website_source(url, content=None, validators=None):
+    return Source(url, "website", category="Website", url=url, text=content, validators=validators or {})
 
 # Website content initialization
-async def initialize_website_content():
-    urls = get_urls()
-    for url in urls:
-        content = await scrapped_website_content(url)
-        chunks  = list(split_overlap(content))
-        await store_documents(
-                chunks=chunks,
-                namespace="website",
-                source_id=url,
-                category="Website"
-            )
-        hashes[url] = compute_hash(content)
-    save_hashes()
+async def initialize_website_content(guard=None):
+    urls = await get_crawl_urls()
+    pipeline = IngestionPipeline("website", on_done=_record_source, guard=guard)
+    summary = await pipeline.run(_website_source(url) for url in urls)
+    if guard is None or await guard():
+        save_hashes()
+    return summary
 
 #  Sales content initialization
-async def initialize_sales_content():
+async def initialize_sales_content(guard=None):
     sales_items = await get_sales_content()
-    for item in sales_items:
-        chunks = list(split_overlap(item["content"]))
-        await store_documents(
-            chunks=chunks,
-            namespace="sales",
-            source_id=item["title"],
+    return await IngestionPipeline("sales", guard=guard).run(
+        Source(
+            item["title"],
+            "sales",
             category=item["title"],   # e.g., Cloud Engineering
-            doc_type="benefit"
+            doc_type="benefit",
+            text=item["content"],
         )
+        for item in sales_items
+    )
 
 def check_index_stats():
     counts = get_namespace_counts()
@@ -164,92 +132,70 @@ def get_namespace_counts():
         return {"website": 0, "sales": 0, "total": 0}
 
 # Refresh embeddings for a single URL
-async def refresh_url(url: str, content: str | None = None):
+async def refresh_url(url: str, content: str | None = None, validators: dict | None = None):
     """Refresh embeddings for a given URL in Supabase.
 
+    Only new / changed chunks are embedded; stale rows are removed in the
+    same transaction (see ingestion_pipeline).
+
     Args:
         url (str): The page URL.
         content (str | None): Pre-fetched page content. If ``None`` the URL will be scraped internally.
+        validators (dict | None): ETag / Last-Modified of the pre-fetched response, stored with the hash.
     """
-    # Fetch latest content if not provided
-    if content is None:
-        content = await scrapped_website_content(url)
-
-    # Guard against empty scrape results
-    if not content:
-        logging.warning(f"No content found for {url}. Skipping refresh.")
-        return
-
-    # Delete and reinsert in Supabase in refresh_url below
-
-    # ----- Chunk + embed -----
-    try:
-        chunks: list[str] = await split_content(content)
-    except TypeError:
-        # Fallback if split_content still returns coroutine when forgotten to await elsewhere
-        chunks = await split_content(content)
-
-    if not chunks:
-        logging.warning(f"No chunks generated for {url}. Skipping refresh.")
-        return
-
-    new_vectors = []
-    for i, chunk in enumerate(chunks):
-        embedding = await create_embedding(chunk)
-        vector_id = f"{url.replace('/', '_')}_{i}"
-        new_vectors.append({
-            "id": vector_id,
-            "values": embedding,
-            "metadata": {"text": chunk, "url": url}
-        })
-
-    # Delete existing rows for this URL within website namespace
-    _s = time.perf_counter()
-    supabase.table("documents").delete().eq("namespace", "website").eq("source", url).execute()
-    logging.info(f"Supabase delete website rows for url in {time.perf_counter()-_s:.4f}s")
-
-    # Upsert new rows
-    rows = []
-    for v in new_vectors:
-        rows.append({
-            "id": v["id"],
-            "namespace": "website",
-            "text": v["metadata"]["text"],
-            "source": url,
-            "embedding": v["values"]
-        })
-    if rows:
-        _s = time.perf_counter()
-        supabase.table("documents").upsert(rows).execute()
-        logging.info(f"Supabase upsert {len(rows)} rows in {time.perf_counter()-_s:.4f}s")
-    
-    # Update hash
-    hash_value = compute_hash(content)
-    hashes[url] = hash_value
-    save_hashes()
+    summary = await IngestionPipeline("refresh", on_done=_record_source).run([_website_source(url, content, validators)])
+    if summary["written"]:
+        save_hashes()
+    return summary
 
 # Check for updates periodically
-async def check_for_updates():
-    """Periodically check for content changes and refresh embeddings."""
-    urls = get_urls()
-    for url in urls:
-        try:
-            content = await scrapped_website_content(url)
-            new_hash = compute_hash(content)
-            if new_hash != hashes.get(url):
+async def check_for_updates(guard=None):
+    """Periodically check for content changes and refresh embeddings.
+
+    *guard* is the leader's fencing check (see leader_service): writes stop
+    once it fails.
+    """
+    urls = await get_crawl_urls()
+    validators_changed = False
+
+    async def changed_pages():
+        nonlocal validators_changed
+        async for page in crawl(urls, {url: _validators(url) for url in urls}):
+            url = page.url
+            if page.not_modified:
+                logging.info(f"Not modified: {url}")
+                continue
+            if not page.content:
+                logging.error(f"Failed to check {url}: no content")
+                continue
+            new_hash = compute_hash(page.content)
+            if new_hash != (hashes.get(url) or {}).get("hash"):
                 logging.info(f"Change detected for {url}, refreshing...")
-                await refresh_url(url, content)
+                yield _website_source(url, page.content, page.validators)
             else:
                 logging.info(f"No change for {url}")
-        except Exception as e:
-            logging.error(f"Failed to check {url}: {e}")
+                if page.validators != _validators(url):
+                    _record_page(url, new_hash, page.validators)
+                    validators_changed = True
+
+    # pages stream into the pipeline while the crawl is still running
+    summary = await IngestionPipeline("updates", on_done=_record_source, guard=guard).run(changed_pages())
+    if (summary["written"] or validators_changed) and (guard is None or await guard()):
+        save_hashes()
+    if summary["written"]:
+        # Cached agent answers may quote the old content: serve, then re-generate
+        await mark_cache_stale()
+    return summary
 
 # Refresh multiple URLs
 async def refresh_urls(urls_to_refresh: list[str]):
-    for url in urls_to_refresh:
-        logging.info(f"Refreshing {url}")
-        await refresh_url(url)
-        logging.info(f"Finished refreshing {url}")
+    logging.info(f"Refreshing {len(urls_to_refresh)} URLs")
+    summary = await IngestionPipeline("refresh", on_done=_record_source).run(
+        _website_source(url) for url in urls_to_refresh
+    )
+    if summary["written"]:
+        save_hashes()
+    return summary
 
 # Pydantic model for refresh request
 class RefreshRequest(BaseModel):
@@ -295,26 +241,10 @@ async def retrieve_relevant_chunks(query, top_k=5):
 #     except Exception as e:
 #         logging.error(f"Failed to export Pinecone data to markdown: {e}")
 def export_pinecone_to_markdown(output_file="pinecone_content.md"):
+    """Stream the website namespace to *output_file* as markdown (blocking – run it in a thread)."""
     try:
-        _s = time.perf_counter()
-        resp = supabase.table("documents").select("source,text,namespace").eq("namespace", "website").execute()
-        logging.info(f"Supabase select website export in {time.perf_counter()-_s:.4f}s")
-        rows = resp.data or []
-        all_texts_by_url = {}
-        for r in rows:
-            url = r.get("source") or "unknown-url"
-            text = r.get("text") or ""
-            if url and text:
-                all_texts_by_url.setdefault(url, []).append(text)
-
-        # Write to markdown
-        with open(output_file, "w", encoding="utf-8") as f:
-            for url, chunks in all_texts_by_url.items():
-                f.write(f"# Content from: {url}\n\n")
-                for chunk in chunks:
-                    f.write(f"{chunk}\n\n---\n\n")
-
-        logging.info(f"Markdown file '{output_file}' created successfully.")
+        size = write_export(output_file, "markdown", namespace="website")
+        logging.info(f"Markdown file '{output_file}' created successfully ({size} bytes).")
     except Exception as e:
         logging.exception(f"Failed to export Supabase content: {e}")
 
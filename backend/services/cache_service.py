@@ -1,23 +1,123 @@
+import asyncio
 import hashlib
-import difflib
 import logging
 import json
-from typing import Any, Callable, Optional, List, Tuple
+import re
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
 from redis.asyncio import Redis
 import time  # Add this import
 
+from services import prompt_index_service
+
 # Setup logger
 logger = logging.getLogger("cache_service")
 logger.setLevel(logging.INFO)
 
 # Constants
-DEFAULT_TTL = 86400  # seconds
+DEFAULT_TTL = 86400  # seconds – hard TTL, entries are gone from Redis after this
+SWR_SOFT_TTL = 6 * 3600       # older answers are served once more and refreshed in the background
+SWR_PREWARM_LIMIT = 20        # hottest prompts per worker refreshed when site content changes
+SWR_PREWARM_CONCURRENCY = 4
+GENERATION_KEY = "CACHE_CONTENT_GENERATION"  # bumped whenever the website content changes
 SIMILARITY_THRESHOLD = 0.85
-PROMPT_LIST_KEY = "GLOBAL_PROMPT_LIST"  # stores list of (prompt, key)
+L1_MAX_ENTRIES = 512          # in-process entries per worker
+L1_TTL = 300                  # seconds; bounds staleness if an invalidation is missed
+INVALIDATION_CHANNEL = "CACHE_INVALIDATE"
+LOCK_KEY_PREFIX = "CACHE_LOCK"  # CACHE_LOCK:{key} -> token of the worker computing it
+SINGLE_FLIGHT_LEASE = 30      # seconds a leader may hold the cross-worker lease
+SINGLE_FLIGHT_WAIT = 15       # seconds a follower waits before calling the API itself
+SINGLE_FLIGHT_POLL = 0.25     # follower re-check interval when no invalidation arrives
 
 # Global Redis client (set from main)
 redis_client: Optional[Redis] = None
 
+_WORKER_ID = uuid.uuid4().hex
+
+# single-flight state: key -> result of the in-process leader / remote-leader signal
+_inflight: Dict[str, asyncio.Future] = {}
+_remote_waiters: Dict[str, asyncio.Event] = {}
+
+# stale-while-revalidate state
+_content_generation = 0
+_refresh_tasks: set = set()                       # keeps background refreshes referenced
+_refreshers: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (prompt, api_func, ttl, cache_key, rebuild)
+
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# ------------ L1 (in-process) cache ------------ #
+
+class LocalTTLCache:
+    """Bounded in-process LRU with per-entry expiry, used as L1 in front of Redis."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_l1 = LocalTTLCache(L1_MAX_ENTRIES, L1_TTL)
+
+_stats: Dict[str, int] = {
+    "l1_hits": 0,
+    "l1_misses": 0,
+    "redis_hits": 0,
+    "redis_similar_hits": 0,
+    "redis_misses": 0,
+    "coalesced": 0,
+    "coalesce_timeouts": 0,
+    "stale_served": 0,
+    "background_refreshes": 0,
+}
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Per-tier hit/miss counters for this worker."""
+    lookups = _stats["l1_hits"] + _stats["l1_misses"]
+    redis_hits = _stats["redis_hits"] + _stats["redis_similar_hits"]
+    return {
+        **_stats,
+        "worker": _WORKER_ID,
+        "l1_size": len(_l1),
+        "content_generation": _content_generation,
+        "l1_hit_rate": round(_stats["l1_hits"] / lookups, 4) if lookups else 0.0,
+        "overall_hit_rate": round((_stats["l1_hits"] + redis_hits) / lookups, 4) if lookups else 0.0,
+    }
+
 # ------------ Redis Setup ------------ #
 
 def init_redis_client(client: Redis):
@@ -26,6 +126,57 @@ def init_redis_client(client: Redis):
     redis_client = client
     logger.info("Redis client initialized in cache_service")
 
+
+async def publish_invalidation(keys: Iterable[str]):
+    """Drop *keys* from this worker's L1 and tell the other workers to do the same.
+    Pass ``["*"]`` to clear every L1 cache."""
+    keys = list(keys)
+    if not keys:
+        return
+    _apply_invalidation(keys)
+    if redis_client is not None:
+        await redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"src": _WORKER_ID, "keys": keys}))
+
+
+def _apply_invalidation(keys: list[str]):
+    if "*" in keys:
+        _l1.clear()
+        return
+    for key in keys:
+        _l1.pop(key)
+        # a remote leader just stored this key → wake local followers
+        waiter = _remote_waiters.get(key)
+        if waiter is not None:
+            waiter.set()
+
+
+async def run_invalidation_listener():
+    """Long-running task: apply L1 invalidations published by other workers."""
+    if redis_client is None:
+        raise RuntimeError("Redis client not initialized")
+
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            logger.info("Listening for cache invalidations on %s", INVALIDATION_CHANNEL)
+            _set_generation(int(await redis_client.get(GENERATION_KEY) or 0))
+            async for message in pubsub.listen():
+                payload = json.loads(message["data"])
+                if payload.get("src") != _WORKER_ID:
+                    _apply_invalidation(payload.get("keys", []))
+                    if "generation" in payload:
+                        _set_generation(payload["generation"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A missed message only costs L1_TTL of staleness; resubscribe with a clean L1
+            logger.error(f"Cache invalidation listener failed, resubscribing: {e}")
+            _l1.clear()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
+
 # ------------ Helper Functions ------------ #
 
 def _make_cache_key(prompt: str) -> str:
@@ -33,67 +184,170 @@ def _make_cache_key(prompt: str) -> str:
     return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
 
 
-async def find_similar_prompt(prompt: str) -> Optional[str]:
-    """Return the key of a similar prompt if it exists."""
-    if redis_client is None:
-        raise RuntimeError("Redis client not initialized")
+# ------------ Structured keys ------------ #
 
-    data = await redis_client.get(PROMPT_LIST_KEY)
-    prompt_list: List[Tuple[str, str]] = json.loads(data) if data else []
-    
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_WS_RE = re.compile(r"\s+")
 
-    # Check for similarity with existing prompts
-    # logger.info(f"Checking for similar prompts to: {prompt}")
 
-    for cached_prompt, key in prompt_list:
-        similarity = difflib.SequenceMatcher(None, prompt, cached_prompt).ratio()
-        if similarity >= SIMILARITY_THRESHOLD:
-            logger.info(f"Found similar prompt (similarity={similarity:.2f}) , returning key: {key}")
-            return key
+def normalize_message(text: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace."""
+    return _WS_RE.sub(" ", _PUNCT_RE.sub(" ", (text or "").lower())).strip()
 
-    return None
 
+def fingerprint(text: str) -> str:
+    """Short stable digest of (normalized) text, e.g. the RAG context."""
+    if not text:
+        return ""
+    return hashlib.sha256(normalize_message(text).encode("utf-8")).hexdigest()[:16]
 
-async def get_cached_response(prompt: str) -> Optional[Any]:
-    """Try to get cached response by exact match or similar prompt."""
+
+def keyword_bucket(text: str, keywords: Iterable[str]) -> str:
+    """Coarse bucket of free text: the sorted *keywords* it mentions."""
+    padded = f" {normalize_message(text)} "
+    return ",".join(sorted(k for k in keywords if f" {k} " in padded))
+
+
+def last_keyword(text: str, keywords: Iterable[str]) -> str:
+    """Coarse bucket of a conversation: the one of *keywords* mentioned last ("" if none)."""
+    padded = f" {normalize_message(text)} "
+    positions = {k: padded.rfind(f" {k} ") for k in keywords}
+    last = max(positions, key=positions.get, default="")
+    return last if positions.get(last, -1) >= 0 else ""
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    """
+    Cache-relevant parts of an agent prompt.  Agents build one of these
+    instead of letting the fully rendered prompt (with per-visitor history)
+    decide the cache key.
+    """
+    template: str           # template id, e.g. "sales"
+    version: str            # digest of the template text
+    message: str            # normalized user message
+    context: str = ""       # fingerprint of the RAG context
+    bucket: str = ""        # coarse intent / summary bucket
+
+    def text(self) -> str:
+        """Canonical form: scope line (must match exactly) + message (fuzzy-matched)."""
+        scope = f"{self.template}@{self.version}|ctx={self.context}|bucket={self.bucket}"
+        return f"{scope}{prompt_index_service.SCOPE_SEPARATOR}{self.message}"
+
+
+def build_cache_key(
+    template_id: str,
+    template_text: str,
+    user_message: str,
+    context: Optional[str] = None,
+    bucket: Optional[str] = None
+) -> CacheKey:
+    """Declare the cache-relevant components of an agent prompt."""
+    return CacheKey(
+        template=template_id,
+        version=hashlib.sha256(template_text.encode("utf-8")).hexdigest()[:12],
+        message=normalize_message(user_message),
+        context=fingerprint(context) if context else "",
+        bucket=bucket or "",
+    )
+
+
+# Re-renders an agent prompt from its inputs: () -> (prompt, cache_key)
+Rebuild = Callable[[], Awaitable[tuple[str, Optional[CacheKey]]]]
+
+
+def _content_dependent(text: str) -> bool:
+    """
+    Whether the answer cached under *text* depends on the website content.
+    Structured keys say so through their context fingerprint (an intent key
+    has none); raw prompts may embed retrieved context, so they count too.
+    """
+    scope, sep, _ = text.partition(prompt_index_service.SCOPE_SEPARATOR)
+    return not sep or "|ctx=|" not in scope
+
+
+def _wrap(response: Any, content_dependent: bool = True) -> str:
+    """Serialize *response* with its write time and – if it depends on site content – the content generation."""
+    generation = _content_generation if content_dependent else None
+    return json.dumps({"__swr__": 1, "v": response, "t": time.time(), "g": generation})
+
+
+def _unwrap(raw: str) -> tuple[Any, float, Optional[int]]:
+    """Return (response, stored_at, generation); pre-SWR values count as stale."""
+    data = json.loads(raw)
+    if isinstance(data, dict) and data.get("__swr__") == 1:
+        return data["v"], data["t"], data["g"]
+    return data, 0.0, -1
+
+
+def _is_stale(entry: tuple[Any, float, Optional[int]], soft_ttl: float) -> bool:
+    """Past *soft_ttl*, or written before the last content change (content-dependent entries only)."""
+    _, stored_at, generation = entry
+    outdated = generation is not None and generation < _content_generation
+    return outdated or time.time() - stored_at > soft_ttl
+
+
+async def find_similar_prompt(prompt: str) -> Optional[str]:
+    """Return the key of a similar prompt if it exists (LSH candidates only)."""
+    if redis_client is None:
+        raise RuntimeError("Redis client not initialized")
+
+    return await prompt_index_service.find_similar(redis_client, prompt, SIMILARITY_THRESHOLD)
+
+
+async def _lookup(prompt: str) -> Optional[tuple[Any, float, int]]:
+    """L1 → Redis exact → Redis similar; returns the (response, stored_at, generation) entry."""
     if redis_client is None:
         raise RuntimeError("Redis client not initialized")
 
     key = _make_cache_key(prompt)
-    result = await redis_client.get(key)
+    local = _l1.get(key)
+    if local is not None:
+        _stats["l1_hits"] += 1
+        logger.info(f"L1 Cache HIT for key")
+        return local
+    _stats["l1_misses"] += 1
+
+    result = await prompt_index_service.fetch(redis_client, key)
 
     if result:
+        _stats["redis_hits"] += 1
         logger.info(f"Redis Cache HIT for key")
-        return json.loads(result)
+        entry = _unwrap(result)
+        _l1.set(key, entry)
+        return entry
 
     # Try fuzzy match
     similar_key = await find_similar_prompt(prompt)
     if similar_key:
-        result = await redis_client.get(similar_key)
+        result = await prompt_index_service.fetch(redis_client, similar_key)
         if result:
+            _stats["redis_similar_hits"] += 1
             logger.info(f"Redis Cache SIMILAR HIT for key")
-            return json.loads(result)
+            # not copied into L1: invalidations name similar_key, so an alias under key would outlive them
+            return _unwrap(result)
 
+    _stats["redis_misses"] += 1
     logger.info(f"Redis Cache MISS for prompt")
     return None
 
 
+async def get_cached_response(prompt: str) -> Optional[Any]:
+    """Try to get cached response by exact match or similar prompt."""
+    entry = await _lookup(prompt)
+    return entry[0] if entry else None
+
+
 async def set_cached_response(prompt: str, response: Any, ttl: int = DEFAULT_TTL):
-    """Set prompt-response pair in Redis with TTL, avoiding duplicates."""
+    """Atomically store the response and register the prompt (bounded, LRU)."""
     if redis_client is None:
         raise RuntimeError("Redis client not initialized")
 
     key = _make_cache_key(prompt)
-    await redis_client.set(key, json.dumps(response), ex=ttl)
-
-    # Update global prompt list
-    data = await redis_client.get(PROMPT_LIST_KEY)
-    prompt_list: List[Tuple[str, str]] = json.loads(data) if data else []
-
-    # Avoid duplicates in the prompt list
-    if not any(k == key for _, k in prompt_list):
-        prompt_list.append((prompt, key))
-        await redis_client.set(PROMPT_LIST_KEY, json.dumps(prompt_list), ex=ttl)
+    raw = _wrap(response, _content_dependent(prompt))
+    dropped = await prompt_index_service.register(redis_client, prompt, key, raw, ttl)
+    await publish_invalidation([key, *dropped])
+    _l1.set(key, _unwrap(raw))
 
     logger.info(f"Stored prompt in Redis with TTL={ttl}s")
 
@@ -109,35 +363,256 @@ async def set_cached_response(prompt: str, response: Any, ttl: int = DEFAULT_TTL
 #     return response, "Fresh"
 
 
+# ------------ Single-flight ------------ #
+
+async def _wait_for_remote_leader(key: str) -> Optional[Any]:
+    """Wait for another worker holding the lease to store *key*; None on timeout."""
+    waiter = _remote_waiters.setdefault(key, asyncio.Event())
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+    try:
+        while time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(waiter.wait(), SINGLE_FLIGHT_POLL)
+            except asyncio.TimeoutError:
+                pass
+            waiter.clear()
+            result = await redis_client.get(key)
+            if result:
+                return _unwrap(result)[0]
+            if not await redis_client.exists(f"{LOCK_KEY_PREFIX}:{key}"):
+                return None        # leader gave up without storing anything
+        return None
+    finally:
+        _remote_waiters.pop(key, None)
+
+
+async def _fallback(prompt: str, api_func: Callable[[str], Any], ttl: int) -> tuple[Any, str]:
+    """Call *api_func* without the lease after the leader failed or stalled;
+    the answer is still cached so later callers don't repeat the call."""
+    response = await api_func(prompt)
+    await set_cached_response(prompt, response, ttl)
+    return response, "Fallback"
+
+
+async def _lead(
+    key: str,
+    prompt: str,
+    api_func: Callable[[str], Any],
+    ttl: int,
+    follow: bool = True
+) -> tuple[Any, str]:
+    """Compute *key* once across workers: take the Redis lease or follow its holder.
+    With ``follow=False`` a held lease means someone else is on it → (None, "Skipped")."""
+    lock_key = f"{LOCK_KEY_PREFIX}:{key}"
+    token = uuid.uuid4().hex
+    if not await redis_client.set(lock_key, token, nx=True, ex=SINGLE_FLIGHT_LEASE):
+        if not follow:
+            return None, "Skipped"
+        shared = await _wait_for_remote_leader(key)
+        if shared is not None:
+            _stats["coalesced"] += 1
+            return shared, "Coalesced"
+        _stats["coalesce_timeouts"] += 1
+        logger.warning("Single-flight leader on another worker stalled, calling API directly")
+        return await _fallback(prompt, api_func, ttl)
+
+    try:
+        response = await api_func(prompt)
+        await set_cached_response(prompt, response, ttl)
+        return response, "Fresh"
+    finally:
+        await redis_client.eval(_RELEASE_LOCK_LUA, 1, lock_key, token)
+
+
+async def single_flight(prompt: str, api_func: Callable[[str], Any], ttl: int = DEFAULT_TTL) -> tuple[Any, str]:
+    """
+    Call *api_func* for *prompt* at most once at a time across all callers.
+
+    Concurrent callers in this process await the same future; callers in
+    other workers wait on the Redis lease holder.  A follower whose leader
+    fails or stalls past SINGLE_FLIGHT_WAIT makes its own call and caches
+    it, reported as "Fallback".
+    """
+    if redis_client is None:
+        raise RuntimeError("Redis client not initialized")
+
+    key = _make_cache_key(prompt)
+    leader = _inflight.get(key)
+    if leader is not None:
+        try:
+            response, _ = await asyncio.wait_for(asyncio.shield(leader), SINGLE_FLIGHT_WAIT)
+            _stats["coalesced"] += 1
+            return response, "Coalesced"
+        except Exception as e:
+            _stats["coalesce_timeouts"] += 1
+            logger.warning(f"Single-flight leader failed or stalled ({type(e).__name__}), calling API directly")
+            return await _fallback(prompt, api_func, ttl)
+
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())   # never "unretrieved"
+    _inflight[key] = future
+    try:
+        result = await _lead(key, prompt, api_func, ttl)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+# ------------ Stale-while-revalidate ------------ #
+
+def content_generation() -> int:
+    """Current website-content generation (bumped by `mark_cache_stale`)."""
+    return _content_generation
+
+
+def _set_generation(generation: int):
+    global _content_generation
+    if generation > _content_generation:
+        _content_generation = generation
+        _schedule_prewarm()
+
+
+def _bind(prompt: str, api_func: Callable[[str], Any], cache_key: Optional["CacheKey"]) -> tuple[str, Callable[[str], Any]]:
+    """(lookup text, function of the lookup text) for a rendered *prompt* and its optional structured key."""
+    if cache_key is None:
+        return prompt, api_func
+    return cache_key.text(), lambda _key_text: api_func(prompt)
+
+
+def _remember(key: str, job: tuple):
+    """Track how to recompute recently used prompts (bounded like L1)."""
+    _refreshers[key] = job
+    _refreshers.move_to_end(key)
+    while len(_refreshers) > L1_MAX_ENTRIES:
+        _refreshers.popitem(last=False)
+
+
+async def _refresh(
+    prompt: str,
+    api_func: Callable[[str], Any],
+    ttl: int,
+    cache_key: Optional["CacheKey"] = None,
+    rebuild: Optional["Rebuild"] = None
+):
+    try:
+        if rebuild is not None:
+            # re-run retrieval + rendering: after a content change the old prompt carries the old context
+            prompt, cache_key = await rebuild()
+        text, call = _bind(prompt, api_func, cache_key)
+        key = _make_cache_key(text)
+        if key in _inflight:
+            return
+        raw = await redis_client.get(key)
+        if raw and not _is_stale(_unwrap(raw), SWR_SOFT_TTL):
+            return                         # the rebuilt prompt is already cached fresh
+        _, source = await _lead(key, text, call, ttl, follow=False)
+        if source != "Skipped":
+            _stats["background_refreshes"] += 1
+            logger.info("Background refresh stored a fresh answer")
+    except Exception as e:
+        logger.error(f"Background refresh failed, keeping the stale answer: {e}")
+
+
+def _schedule_refresh(job: tuple):
+    task = asyncio.create_task(_refresh(*job))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+def _schedule_prewarm():
+    """Refresh this worker's hottest content-dependent prompts against the new content generation."""
+    dependent = [job for job in _refreshers.values() if _content_dependent(_bind(job[0], job[1], job[3])[0])]
+    hottest = dependent[-SWR_PREWARM_LIMIT:]
+    if not hottest:
+        return
+    semaphore = asyncio.Semaphore(SWR_PREWARM_CONCURRENCY)
+
+    async def bounded(job):
+        async with semaphore:
+            await _refresh(*job)
+
+    logger.info("Content generation %s: pre-warming %s hot prompts", _content_generation, len(hottest))
+    for job in reversed(hottest):
+        task = asyncio.create_task(bounded(job))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
+
+async def mark_cache_stale():
+    """
+    Website content changed: every content-dependent cached answer becomes
+    stale (intent answers stay on their plain TTL).  Stale answers are still
+    served immediately and refreshed in the background; each worker also
+    pre-warms its hottest content-dependent prompts right away.
+    """
+    if redis_client is None:
+        logger.warning("Redis client not initialized, cannot mark cached answers stale")
+        return
+    generation = await redis_client.incr(GENERATION_KEY)
+    await redis_client.publish(
+        INVALIDATION_CHANNEL,
+        json.dumps({"src": _WORKER_ID, "keys": [], "generation": generation}),
+    )
+    _set_generation(generation)
+
+
 async def async_cache_workflow(
     prompt: str,
     api_func: Callable[[str], Any],
-    ttl: int = DEFAULT_TTL
+    ttl: int = DEFAULT_TTL,
+    soft_ttl: int = SWR_SOFT_TTL,
+    cache_key: Optional[CacheKey] = None,
+    rebuild: Optional[Rebuild] = None
 ) -> tuple[Any, str, float]:
     """
-    Try to get response from Redis cache or call API.
+    Try to get response from the L1/Redis cache or call API (single-flight).
+
+    Answers older than *soft_ttl* (or, if they depend on site content, from
+    before the last content change) are returned at once while a background task refreshes them; past the
+    hard *ttl* Redis has dropped them and the call is synchronous.
+
+    With *cache_key* the entry is identified by its structured components
+    instead of the rendered *prompt*; *api_func* still receives *prompt*.
+
+    *rebuild* re-renders the prompt from its inputs – re-running retrieval –
+    and returns ``(prompt, cache_key)``; background refreshes and pre-warms
+    use it so a content change reaches the refreshed answer.  Without it
+    they re-send the prompt of the request that cached the answer.
     
     Returns:
         (response, source, response_time)
         - response: dict or str
-        - source: "Cache" or "Fresh"
+        - source: "Cache", "Stale" (refresh scheduled), "Coalesced"
+          (shared an in-flight call), "Fallback" (leader failed or
+          stalled, called directly) or "Fresh"
         - response_time: in seconds (float)
     """
     start = time.monotonic()
+    job = (prompt, api_func, ttl, cache_key, rebuild)
+    prompt, api_func = _bind(prompt, api_func, cache_key)
+    _remember(_make_cache_key(prompt), job)
 
     # Try cache first
-    cached = await get_cached_response(prompt)
-    if cached:
+    entry = await _lookup(prompt)
+    if entry and entry[0]:
+        source = "Cache"
+        if _is_stale(entry, soft_ttl):
+            _stats["stale_served"] += 1
+            _schedule_refresh(job)
+            source = "Stale"
         duration = time.monotonic() - start
-        logger.info(f"Returned from Redis cache in {duration:.4f}s")
-        return cached, "Cache", duration
+        logger.info(f"Returned from Redis cache ({source}) in {duration:.4f}s")
+        return entry[0], source, duration
 
-    # Call API
-    response = await api_func(prompt)
-    await set_cached_response(prompt, response, ttl)
+    # Call API – identical concurrent prompts share one call
+    response, source = await single_flight(prompt, api_func, ttl)
     duration = time.monotonic() - start
-    logger.info(f"Returned from OpenAI API in {duration:.4f}s")
-    return response, "Fresh", duration
+    logger.info(f"Returned from OpenAI API ({source}) in {duration:.4f}s")
+    return response, source, duration
 
 
 
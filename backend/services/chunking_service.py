@@ -0,0 +1,175 @@
+"""
+chunking service – one token-aware, heading-aware chunker for all ingestion.
+
+Replaces `split_overlap` (400 words) and `split_content` (500 chars).  Input
+is the markdown `html2text` produces (or plain text): it is cut into
+sections at headings, sections into paragraphs, and paragraphs are packed
+into chunks of at most CHUNK_TOKENS tokens, measured with the tokenizer of
+the embedding model.  Chunks never span two sections; each one starts with
+the heading trail it belongs to, so "Pricing" under "BizRadar" stays
+attributable.  Oversized paragraphs fall back to sentence, then token
+windows with CHUNK_OVERLAP tokens of overlap.
+
+`iter_chunks` is a generator, so a long page streams into the embedding
+batches instead of being materialized.  Chunk ids are derived from the
+source and the chunk text only: unchanged text keeps its id across
+re-ingestion.  That only holds while every environment cuts the same
+boundaries, so there is no character-count fallback: without the
+tokenizer (tiktoken missing, or the encoding neither cached under
+TIKTOKEN_CACHE_DIR – the Docker image bakes it in – nor downloadable)
+chunking raises TokenizerUnavailable instead of producing other ids.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("chunking_service")
+
+# ── constants ─────────────────────────────────────────────────────────
+CHUNK_TOKENS  = 400
+CHUNK_OVERLAP = 50            # only when a single paragraph has to be cut
+ENCODING      = "cl100k_base" # text-embedding-3-*
+
+_HEADING_RE  = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_PARA_RE     = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class TokenizerUnavailable(RuntimeError):
+    """The embedding model's tokenizer cannot be loaded; chunk boundaries would not be stable."""
+
+
+@dataclass(frozen=True)
+class Chunk:
+    id: str
+    text: str
+    heading: str          # "Products > BizRadar"
+    index: int            # position within the source
+    tokens: int
+
+
+# ── tokenizer ─────────────────────────────────────────────────────────
+_encode: Optional[Callable[[str], List[int]]] = None
+_decode: Optional[Callable[[List[int]], str]] = None
+
+
+def _load_tokenizer():
+    """Load ENCODING once; raises TokenizerUnavailable (retried on the next call)."""
+    global _encode, _decode
+    if _encode is not None:
+        return
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding(ENCODING)
+    except Exception as e:   # not installed, or the encoding file is neither cached nor downloadable
+        raise TokenizerUnavailable(
+            f"tiktoken encoding {ENCODING} unavailable ({e}); pre-cache it with TIKTOKEN_CACHE_DIR"
+        ) from e
+    _encode, _decode = enc.encode, enc.decode
+
+
+def count_tokens(text: str) -> int:
+    _load_tokenizer()
+    return len(_encode(text))
+
+
+def _token_windows(text: str, size: int, overlap: int) -> Iterator[str]:
+    """Cut *text* into windows of *size* tokens."""
+    _load_tokenizer()
+    step = max(1, size - overlap)
+    tokens = _encode(text)
+    for start in range(0, len(tokens), step):
+        yield _decode(tokens[start:start + size])
+        if start + size >= len(tokens):
+            return
+
+
+# ── helpers ───────────────────────────────────────────────────────────
+def chunk_id(source_id: str, text: str, occurrence: int = 0) -> str:
+    """Stable row id of a chunk: same source + same text ⇒ same id (*occurrence* tells repeats apart)."""
+    key = f"{source_id}\n{text}" + (f"\n#{occurrence}" if occurrence else "")
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def _sections(text: str) -> Iterator[Tuple[str, str]]:
+    """Yield (heading trail, body) per markdown section."""
+    trail: List[Tuple[int, str]] = []
+    body: List[str] = []
+    for line in text.splitlines():
+        m = _HEADING_RE.match(line)
+        if not m:
+            body.append(line)
+            continue
+        if "".join(body).strip():
+            yield " > ".join(t for _, t in trail), "\n".join(body)
+        body = []
+        level, title = len(m.group(1)), m.group(2).strip("*_ ")
+        trail = [(lvl, t) for lvl, t in trail if lvl < level] + [(level, title)]
+    if "".join(body).strip():
+        yield " > ".join(t for _, t in trail), "\n".join(body)
+
+
+def _pieces(paragraph: str, budget: int) -> Iterator[str]:
+    """Split a paragraph that exceeds *budget* tokens."""
+    if count_tokens(paragraph) <= budget:
+        yield paragraph
+        return
+    current: List[str] = []
+    for sentence in _SENTENCE_RE.split(paragraph):
+        if count_tokens(sentence) > budget:
+            if current:
+                yield " ".join(current)
+                current = []
+            yield from _token_windows(sentence, budget, CHUNK_OVERLAP)
+            continue
+        if current and count_tokens(" ".join(current + [sentence])) > budget:
+            yield " ".join(current)
+            current = []
+        current.append(sentence)
+    if current:
+        yield " ".join(current)
+
+
+# ── Public API ────────────────────────────────────────────────────────
+def iter_chunks(text: str, source_id: str = "", max_tokens: int = CHUNK_TOKENS) -> Iterator[Chunk]:
+    """Stream the chunks of a markdown / plain-text document."""
+    if not text:
+        return
+    index = 0
+    seen: Dict[str, int] = {}
+    for heading, body in _sections(text):
+        prefix = f"{heading}\n" if heading else ""
+        budget = max(16, max_tokens - count_tokens(prefix))
+        current: List[str] = []
+        used = 0
+
+        def emit(parts: List[str]) -> Chunk:
+            nonlocal index
+            chunk_text = prefix + "\n\n".join(parts)
+            occurrence = seen.get(chunk_text, 0)
+            seen[chunk_text] = occurrence + 1
+            chunk = Chunk(chunk_id(source_id, chunk_text, occurrence), chunk_text, heading, index, count_tokens(chunk_text))
+            index += 1
+            return chunk
+
+        for paragraph in _PARA_RE.split(body):
+            paragraph = re.sub(r"[ \t]+", " ", paragraph).strip()
+            if not paragraph:
+                continue
+            for piece in _pieces(paragraph, budget):
+                size = count_tokens(piece)
+                if current and used + size > budget:
+                    yield emit(current)
+                    current, used = [], 0
+                current.append(piece)
+                used += size
+        if current:
+            yield emit(current)
+
+
+def chunk_text(text: str, source_id: str = "", max_tokens: int = CHUNK_TOKENS) -> List[Chunk]:
+    return list(iter_chunks(text, source_id, max_tokens))
@@ -0,0 +1,200 @@
+"""
+corpus_export – streaming exports of the documents table.
+
+`export_pinecone_to_markdown` used to select the whole website namespace
+in one request, hold every row in memory and only then write the file –
+from the `/retrieve_data` handler, on the event loop.  Exports now stream:
+
+  * rows are read in keyset-paginated pages of PAGE_SIZE, ordered by
+    (source, id) so the markdown sections of one URL stay together;
+  * each page is rendered and handed on before the next one is read, so
+    memory stays at one page whatever the table size;
+  * everything here is blocking and generator-based: files are written
+    from a worker thread, HTTP downloads are a StreamingResponse over
+    `iter_export`, which Starlette iterates in its threadpool.
+
+Formats:
+
+  ndjson    one JSON object per row (id, namespace, text, source, category, type)
+  markdown  "# Content from: <url>" sections, chunks separated by "---"
+  parquet   one row group per page (needs pyarrow)
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from services.supabase_vector_service import PAGE_SIZE, supabase
+
+logger = logging.getLogger("corpus_export")
+
+# ── constants ─────────────────────────────────────────────────────────
+COLUMNS = ("id", "namespace", "text", "source", "category", "type")
+FORMATS = {
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "markdown": ("text/markdown; charset=utf-8", ".md"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+
+def _quote(value: str) -> str:
+    # PostgREST filter value: double-quoted so URLs with , . ( ) stay one value
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def iter_rows_by_source(namespace: Optional[str] = None, page_size: int = PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the documents table page by page, keyset-paginated on (source, id); NULL sources last (blocking)."""
+    columns = ", ".join(COLUMNS)
+
+    def query():
+        q = supabase.table("documents").select(columns)
+        return q.eq("namespace", namespace) if namespace else q
+
+    last: Optional[Dict[str, Any]] = None
+    while True:
+        q = query().not_.is_("source", "null").order("source").order("id").limit(page_size)
+        if last is not None:
+            src = _quote(last["source"])
+            q = q.or_(f"source.gt.{src},and(source.eq.{src},id.gt.{_quote(last['id'])})")
+        rows = q.execute().data or []
+        if rows:
+            yield rows
+            last = rows[-1]
+        if len(rows) < page_size:
+            break
+
+    last_id: Optional[str] = None
+    while True:
+        q = query().is_("source", "null").order("id").limit(page_size)
+        if last_id is not None:
+            q = q.gt("id", last_id)
+        rows = q.execute().data or []
+        if rows:
+            yield rows
+            last_id = rows[-1]["id"]
+        if len(rows) < page_size:
+            return
+
+
+# ── Renderers: pages in, encoded bytes out ────────────────────────────
+def _ndjson(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for rows in pages:
+        yield "".join(json.dumps({c: r.get(c) for c in COLUMNS}, ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+
+def _markdown(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    current = None
+    for rows in pages:
+        parts: List[str] = []
+        for r in rows:
+            url = r.get("source") or "unknown-url"
+            text = r.get("text") or ""
+            if not text:
+                continue
+            if url != current:
+                parts.append(f"# Content from: {url}\n\n")
+                current = url
+            parts.append(f"{text}\n\n---\n\n")
+        if parts:
+            yield "".join(parts).encode("utf-8")
+
+
+class _Sink:
+    """Write-only file object whose bytes are drained after every row group."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _parquet(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    import pyarrow as pa              # optional dependency, checked by check_format
+    import pyarrow.parquet as pq
+    schema = pa.schema([(c, pa.string()) for c in COLUMNS])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in pages:
+            writer.write_table(pa.Table.from_pylist([{c: r.get(c) for c in COLUMNS} for r in rows], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()                  # footer
+
+
+_RENDERERS = {"ndjson": _ndjson, "markdown": _markdown, "parquet": _parquet}
+
+
+# ── Public API (blocking – files via asyncio.to_thread) ───────────────
+def check_format(fmt: str):
+    """Raise before anything is streamed if *fmt* cannot be exported here."""
+    if fmt not in _RENDERERS:
+        raise ValueError(f"format must be one of {tuple(_RENDERERS)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+
+
+def iter_export(fmt: str = "ndjson", namespace: Optional[str] = None, page_size: int = PAGE_SIZE) -> Iterator[bytes]:
+    """Encoded export of *namespace* (all when None) in *fmt*, one piece per page."""
+    check_format(fmt)
+    _s = time.perf_counter()
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for page in iter_rows_by_source(namespace, page_size):
+            rows += len(page)
+            yield page
+
+    size = 0
+    for piece in _RENDERERS[fmt](counted()):
+        size += len(piece)
+        yield piece
+    logger.info("Exported %s rows (%s, %s bytes) of %s in %.2fs", rows, fmt, size, namespace or "all namespaces", time.perf_counter() - _s)
+
+
+def write_export(path: str, fmt: str = "ndjson", namespace: Optional[str] = None) -> int:
+    """Stream an export to *path* (replaced only once complete); returns the bytes written."""
+    check_format(fmt)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    size = 0
+    try:
+        with open(tmp, "wb") as f:
+            for piece in iter_export(fmt, namespace):
+                f.write(piece)
+                size += len(piece)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return size
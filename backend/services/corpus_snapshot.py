@@ -0,0 +1,328 @@
+"""
+corpus_snapshot – versioned binary snapshots of the documents table.
+
+An empty `documents` table could only be rebuilt by re-scraping every URL
+(browser renders included) and re-embedding everything, and
+`export_pinecone_to_markdown` keeps the text only.  A snapshot keeps all
+of it, in one directory:
+
+    manifest.json     format / version, embedding model + dims, row and
+                      namespace counts, sha256 of the data files
+    chunks.jsonl      one row per line: id, namespace, text, source,
+                      category, type
+    embeddings.npy    float32 (rows × dims) matrix, row i ↔ line i – loads
+                      memory-mapped, no parsing
+
+Import streams the rows page by page into Supabase, IMPORT_BATCH-row
+upserts with IMPORT_CONCURRENCY in flight, so memory stays at a few
+pages.  Once every write has committed the in-process vector / BM25
+indexes are rebuilt straight from the memory-mapped files (no table
+read) and the corpus version is bumped.  Rows are upserted by id: a
+snapshot merges into the table, it does not delete rows it does not
+contain.
+
+    python -m services.corpus_snapshot export /srv/snapshot
+    python -m services.corpus_snapshot info   /srv/snapshot
+    python -m services.corpus_snapshot import /srv/snapshot
+
+Also exposed as POST /export_snapshot and /import_snapshot (admin key,
+snapshots under CORPUS_SNAPSHOT_DIR only – `snapshot_path`), and imported
+by the bootstrap when the table is empty and CORPUS_SNAPSHOT_DIR holds one.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+
+from config.settings import CORPUS_SNAPSHOT_DIR, HYBRID_SEARCH, LOCAL_VECTOR_INDEX
+from services import bm25_index, local_vector_index
+from services import retrieval_cache_service as retrieval_cache
+from services.leader_service import LostLeadership
+from services.supabase_vector_service import (
+    EMBED_DIM, EMBED_MODEL, _upsert_batch, active_dimensions, embedding_columns, iter_document_pages,
+    reduce_dimensions, write_dimensions,
+)
+
+logger = logging.getLogger("corpus_snapshot")
+
+# ── constants ─────────────────────────────────────────────────────────
+SNAPSHOT_FORMAT    = "indrasol-corpus-snapshot"
+SNAPSHOT_VERSION   = 1
+MANIFEST_FILE      = "manifest.json"
+CHUNKS_FILE        = "chunks.jsonl"
+EMBEDDINGS_FILE    = "embeddings.npy"
+METADATA_COLUMNS   = ("id", "namespace", "text", "source", "category", "type")
+IMPORT_BATCH       = 500          # rows per Supabase upsert
+IMPORT_CONCURRENCY = 4            # upserts in flight
+COPY_BLOCK         = 4096         # rows copied per step when writing the .npy
+
+
+class SnapshotError(ValueError):
+    """The directory is not a snapshot this version can import (or may not be written)."""
+
+
+def snapshot_path(name: str = "", root: str = CORPUS_SNAPSHOT_DIR) -> str:
+    """Directory of snapshot *name* under *root*; anything resolving outside *root* is rejected."""
+    base = Path(root).resolve()
+    target = (base / name).resolve() if name else base
+    if not target.is_relative_to(base):
+        raise SnapshotError(f"snapshot {name!r} is outside {root}")
+    return str(target)
+
+
+def _is_snapshot(path: str) -> bool:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f).get("format") == SNAPSHOT_FORMAT
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _vector(value: Any) -> np.ndarray:
+    # PostgREST returns pgvector columns as their text form "[0.1,0.2,…]"
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype="<f4")
+
+
+# ── Export (blocking) ─────────────────────────────────────────────────
+def export_snapshot(path: str = CORPUS_SNAPSHOT_DIR) -> Dict[str, Any]:
+    """Write the documents table to a snapshot directory at *path*; returns its manifest."""
+    # only ever replace a previous snapshot (or an empty directory), never arbitrary data
+    if os.path.lexists(path) and not (os.path.isdir(path) and (_is_snapshot(path) or not os.listdir(path))):
+        raise SnapshotError(f"{path} exists and is not a corpus snapshot; refusing to replace it")
+    _s = time.perf_counter()
+    tmp = f"{path.rstrip(os.sep)}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    raw_path = os.path.join(tmp, "embeddings.f32")
+    rows, dims, namespaces = 0, None, {}
+    try:
+        # one table pass: metadata to JSONL, vectors appended raw (the row count is unknown up front)
+        with open(os.path.join(tmp, CHUNKS_FILE), "w", encoding="utf-8") as chunks, open(raw_path, "wb") as raw:
+            for page in iter_document_pages(", ".join(METADATA_COLUMNS + ("embedding",))):
+                for row in page:
+                    vec = _vector(row["embedding"])
+                    if dims is None:
+                        dims = len(vec)
+                    elif len(vec) != dims:
+                        raise SnapshotError(f"row {row['id']} has {len(vec)} dimensions, expected {dims}")
+                    raw.write(vec.tobytes())
+                    chunks.write(json.dumps({c: row.get(c) for c in METADATA_COLUMNS}, ensure_ascii=False) + "\n")
+                    namespaces[row["namespace"]] = namespaces.get(row["namespace"], 0) + 1
+                    rows += 1
+
+        dims = dims or EMBED_DIM
+        matrix = np.lib.format.open_memmap(os.path.join(tmp, EMBEDDINGS_FILE), mode="w+", dtype="<f4", shape=(rows, dims))
+        if rows:
+            source = np.memmap(raw_path, dtype="<f4", mode="r", shape=(rows, dims))
+            for start in range(0, rows, COPY_BLOCK):
+                matrix[start:start + COPY_BLOCK] = source[start:start + COPY_BLOCK]
+            del source
+        matrix.flush()
+        del matrix
+        os.remove(raw_path)
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "embed_model": EMBED_MODEL,
+            "dims": dims,
+            "rows": rows,
+            "namespaces": namespaces,
+            "files": {"chunks": CHUNKS_FILE, "embeddings": EMBEDDINGS_FILE},
+            "sha256": {name: _sha256(os.path.join(tmp, name)) for name in (CHUNKS_FILE, EMBEDDINGS_FILE)},
+        }
+        with open(os.path.join(tmp, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        # swap in the complete snapshot; a reader never sees a half-written one
+        if os.path.isdir(path):
+            old = f"{tmp}.old"
+            os.replace(path, old)
+            os.replace(tmp, path)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    logger.info("Exported %s rows (%s-d) to %s in %.2fs", rows, dims, path, time.perf_counter() - _s)
+    return manifest
+
+
+# ── Reading ───────────────────────────────────────────────────────────
+def snapshot_available(path: str = CORPUS_SNAPSHOT_DIR) -> bool:
+    return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def read_manifest(path: str, verify: bool = False) -> Dict[str, Any]:
+    """Manifest of the snapshot at *path*, checked against this version (and its checksums with *verify*)."""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"no readable snapshot manifest in {path}: {e}")
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"{path} is not a corpus snapshot")
+    if int(manifest.get("version", 0)) > SNAPSHOT_VERSION:
+        raise SnapshotError(f"snapshot version {manifest['version']} is newer than supported ({SNAPSHOT_VERSION})")
+    if manifest.get("embed_model") != EMBED_MODEL or manifest.get("dims") != EMBED_DIM:
+        raise SnapshotError(
+            f"snapshot embeddings are {manifest.get('embed_model')} / {manifest.get('dims')}-d, "
+            f"this deployment uses {EMBED_MODEL} / {EMBED_DIM}-d"
+        )
+    if verify:
+        for name, expected in manifest["sha256"].items():
+            if _sha256(os.path.join(path, name)) != expected:
+                raise SnapshotError(f"{name} does not match its checksum")
+    return manifest
+
+
+def iter_snapshot_pages(path: str, page_size: int = IMPORT_BATCH) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the snapshot rows page by page; "embedding" is a row view of the memory-mapped matrix."""
+    manifest = read_manifest(path)
+    matrix = np.load(os.path.join(path, manifest["files"]["embeddings"]), mmap_mode="r")
+    if matrix.shape != (manifest["rows"], manifest["dims"]):
+        raise SnapshotError(f"embeddings are {matrix.shape}, manifest says ({manifest['rows']}, {manifest['dims']})")
+    page: List[Dict[str, Any]] = []
+    with open(os.path.join(path, manifest["files"]["chunks"]), encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            page.append({**json.loads(line), "embedding": matrix[i]})
+            if len(page) == page_size:
+                yield page
+                page = []
+    if page:
+        yield page
+
+
+# ── Import ────────────────────────────────────────────────────────────
+def _load_indexes(path: str, dims: int):
+    """Rebuild the local indexes from the snapshot files (each one reads them page by page)."""
+    if LOCAL_VECTOR_INDEX:
+        pages = iter_snapshot_pages(path)
+        if dims != EMBED_DIM:
+            pages = ([{**r, "embedding": reduce_dimensions(r["embedding"], dims)} for r in page] for page in pages)
+        local_vector_index.load(pages)
+    if HYBRID_SEARCH:
+        bm25_index.load(iter_snapshot_pages(path))
+
+
+async def import_snapshot(
+    path: str = CORPUS_SNAPSHOT_DIR,
+    load_index: bool = True,
+    verify: bool = True,
+    guard: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> Dict[str, Any]:
+    """
+    Upsert the snapshot at *path* into Supabase, then rebuild the local
+    indexes from it (*load_index*).  *guard* is awaited before every batch
+    (see leader_service); False stops the import before the indexes change.
+    """
+    _s = time.perf_counter()
+    manifest = await asyncio.to_thread(read_manifest, path, verify)
+    summary: Dict[str, Any] = {"rows": manifest["rows"], "namespaces": manifest["namespaces"], "index_s": None}
+
+    columns = await write_dimensions()
+
+    def write(page: List[Dict[str, Any]]):
+        _upsert_batch([
+            {**{c: r[c] for c in METADATA_COLUMNS}, **embedding_columns(np.asarray(r["embedding"]).tolist(), columns)}
+            for r in page
+        ])
+
+    async def upsert(page: List[Dict[str, Any]]):
+        if guard is not None and not await guard():
+            raise LostLeadership("fencing token no longer holds the leader lease")
+        await asyncio.to_thread(write, page)
+
+    # read the next page only when an upsert slot is free: at most IMPORT_CONCURRENCY pages in memory
+    pages = iter_snapshot_pages(path)
+    pending: Set[asyncio.Task] = set()
+    try:
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            pending.add(asyncio.create_task(upsert(page)))
+            if len(pending) >= IMPORT_CONCURRENCY:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                errors = [task.exception() for task in done if task.exception() is not None]
+                if errors:
+                    raise errors[0]
+        for task in asyncio.as_completed(pending):
+            await task
+        pending = set()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        pages.close()
+
+    if load_index and (LOCAL_VECTOR_INDEX or HYBRID_SEARCH):
+        dims = await active_dimensions()
+        _i = time.perf_counter()
+        await asyncio.to_thread(_load_indexes, path, dims)
+        summary["index_s"] = round(time.perf_counter() - _i, 3)
+    await retrieval_cache.bump_corpus_version()
+    summary["seconds"] = round(time.perf_counter() - _s, 3)
+    logger.info("Imported %s rows from %s in %.2fs", manifest["rows"], path, summary["seconds"])
+    return summary
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["export", "import", "info"])
+    parser.add_argument("path", nargs="?", default=CORPUS_SNAPSHOT_DIR, help="snapshot directory")
+    parser.add_argument("--no-verify", action="store_true", help="import: skip the checksum check")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export_snapshot(args.path)
+        print(f"exported {manifest['rows']} rows to {args.path}")
+    elif args.command == "info":
+        print(json.dumps(read_manifest(args.path, verify=True), indent=2))
+    else:
+        asyncio.run(_import_cli(args.path, not args.no_verify))
+
+
+async def _import_cli(path: str, verify: bool):
+    from redis.asyncio import Redis
+    from config.settings import REDIS_URL
+    from services.cache_service import init_redis_client
+
+    # the version bump reaches running workers, which then reload their indexes from Supabase
+    redis = Redis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
+    if redis is not None:
+        init_redis_client(redis)
+    try:
+        summary = await import_snapshot(path, load_index=False, verify=verify)
+        print(f"imported {summary['rows']} rows from {path} in {summary['seconds']:.2f}s")
+    finally:
+        if redis is not None:
+            await redis.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+embedding_cache service – content-addressed cache for query embeddings.
+
+Keyed by (model, whitespace-normalized text).  Tier 1 is an in-process LRU,
+tier 2 is Redis holding the vector as packed little-endian float32 bytes
+(6 KB for 1536-d instead of ~30 KB as a JSON list), so it needs its own
+client created with ``decode_responses=False``.
+
+Case and punctuation are kept in the key: embeddings are sensitive to both.
+A Redis failure only costs the cache, never the embedding call.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from redis.asyncio import Redis
+
+from services.cache_service import LocalTTLCache
+
+logger = logging.getLogger("embedding_cache_service")
+
+# ── constants ─────────────────────────────────────────────────────────
+L1_MAX_ENTRIES = 2048
+L1_TTL         = 86400
+REDIS_TTL      = 30 * 86400      # embeddings of a given model never change
+KEY_PREFIX     = "EMBEDDING"
+
+_WS_RE = re.compile(r"\s+")
+
+redis_client: Optional[Redis] = None      # binary client (decode_responses=False)
+
+_l1 = LocalTTLCache(L1_MAX_ENTRIES, L1_TTL)
+
+_stats: Dict[str, int] = {
+    "embedding_l1_hits": 0,
+    "embedding_redis_hits": 0,
+    "embedding_misses": 0,
+    "embedding_bytes_stored": 0,    # packed bytes written to Redis
+    "embedding_bytes_saved": 0,     # vs. storing the same vectors as JSON lists
+}
+
+
+def init_embedding_cache(client: Redis):
+    """Set the binary Redis client used for the shared tier."""
+    global redis_client
+    redis_client = client
+    logger.info("Redis client initialized in embedding_cache_service")
+
+
+def _key(model: str, text: str) -> str:
+    normalized = _WS_RE.sub(" ", text or "").strip()
+    digest = hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}:{model}:{digest}"
+
+
+def _pack(vector: List[float]) -> bytes:
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def _unpack(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype="<f4").tolist()
+
+
+# ── Public API ────────────────────────────────────────────────────────
+async def get(model: str, text: str) -> Optional[List[float]]:
+    """Cached embedding of *text* under *model*, or None."""
+    key = _key(model, text)
+    packed = _l1.get(key)
+    if packed is not None:
+        _stats["embedding_l1_hits"] += 1
+        return _unpack(packed)
+
+    if redis_client is not None:
+        try:
+            packed = await redis_client.get(key)
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+        if packed is not None:
+            _stats["embedding_redis_hits"] += 1
+            _l1.set(key, packed)
+            return _unpack(packed)
+
+    _stats["embedding_misses"] += 1
+    return None
+
+
+async def put(model: str, text: str, vector: List[float]):
+    """Store *vector* as the embedding of *text* under *model*."""
+    key = _key(model, text)
+    packed = _pack(vector)
+    _l1.set(key, packed)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(key, packed, ex=REDIS_TTL)
+    except Exception as e:
+        logger.warning(f"Embedding cache write failed: {e}")
+        return
+    _stats["embedding_bytes_stored"] += len(packed)
+    _stats["embedding_bytes_saved"] += len(json.dumps(vector)) - len(packed)
+
+
+def get_embedding_cache_stats() -> Dict[str, Any]:
+    hits = _stats["embedding_l1_hits"] + _stats["embedding_redis_hits"]
+    lookups = hits + _stats["embedding_misses"]
+    return {
+        **_stats,
+        "embedding_l1_size": len(_l1),
+        "embedding_hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,123 @@
+"""
+embedding_migration – online switch of the embedding dimension retrieval uses.
+
+    python -m services.embedding_migration status   --dimensions 512
+    python -m services.embedding_migration backfill --dimensions 512
+    python -m services.embedding_migration cutover  --dimensions 512
+    python -m services.embedding_migration cutover  --dimensions 1536   # rollback
+    python -m services.embedding_migration stop     --dimensions 512    # stop dual writes
+
+The reduced column and its RPCs come from db/migrations/002_embedding_512.sql
+(004_embedding_768.sql for 768-d); replace_source_chunks (003) writes any of them.
+`backfill` first adds <dims> to MIGRATION_DIMENSIONS_KEY – from then on every
+write fills both columns (`write_dimensions`, same Redis source as the
+active dimension) – waits until every worker has seen it, then derives the
+reduced vectors of older rows in SQL.
+`cutover` refuses to run while rows are missing, then flips the active
+dimension with one Redis SET and bumps the corpus version – each worker
+switches its queries within DIMENSIONS_TTL seconds, serving from the old
+column until then.  Dual writes continue after a rollback so the cutover
+can be repeated; `stop` ends them for a dimension that is not active.
+"""
+import argparse
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+
+from config.settings import REDIS_URL
+from services.supabase_vector_service import (
+    ACTIVE_DIMENSIONS_KEY, DIMENSIONS_TTL, EMBED_DIM, MIGRATION_DIMENSIONS_KEY, embedding_column, supabase,
+)
+from services.retrieval_cache_service import CORPUS_CHANNEL, CORPUS_VERSION_KEY, corpus_event
+
+logger = logging.getLogger("embedding_migration")
+
+BACKFILL_BATCH = 500
+
+
+def missing_rows(dims: int) -> int:
+    """Rows without a vector in the *dims* column."""
+    res = (supabase.table("documents").select("id", count="exact")
+           .is_(embedding_column(dims), "null").execute())
+    return getattr(res, "count", None) or 0
+
+
+async def mark_migrating(dims: int, migrating: bool = True):
+    """Start (or stop) writing the *dims* column next to the full vectors on every worker."""
+    redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        if migrating:
+            await redis.sadd(MIGRATION_DIMENSIONS_KEY, dims)
+        else:
+            if int(await redis.get(ACTIVE_DIMENSIONS_KEY) or EMBED_DIM) == dims:
+                raise SystemExit(f"retrieval is served from {embedding_column(dims)} – cut over first")
+            await redis.srem(MIGRATION_DIMENSIONS_KEY, dims)
+    finally:
+        await redis.close()
+    if migrating:
+        await asyncio.sleep(DIMENSIONS_TTL)   # rows written after this carry both columns
+    logger.info("%s writes of %s", "Started" if migrating else "Stopped", embedding_column(dims))
+
+
+def backfill(dims: int) -> int:
+    total = 0
+    while True:
+        updated = supabase.rpc(f"backfill_embedding_{dims}", {"batch_size": BACKFILL_BATCH}).execute().data or 0
+        total += updated
+        logger.info("Backfilled %s rows (%s total)", updated, total)
+        if updated < BACKFILL_BATCH:
+            return total
+
+
+async def cutover(dims: int):
+    if dims != EMBED_DIM:
+        missing = missing_rows(dims)
+        if missing:
+            raise SystemExit(f"{missing} rows have no {embedding_column(dims)} yet – run backfill first")
+    redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        pipe = redis.pipeline(transaction=True)
+        pipe.set(ACTIVE_DIMENSIONS_KEY, dims)
+        pipe.incr(CORPUS_VERSION_KEY)      # cached retrievals were ranked in the old space
+        _, version = await pipe.execute()
+        await redis.publish(CORPUS_CHANNEL, corpus_event(version))   # running workers reload their indexes
+    finally:
+        await redis.close()
+    logger.info("Retrieval now served from %s (%s-d)", embedding_column(dims), dims)
+
+
+async def status(dims: int):
+    redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        active = int(await redis.get(ACTIVE_DIMENSIONS_KEY) or EMBED_DIM)
+        migrating = sorted(int(d) for d in await redis.smembers(MIGRATION_DIMENSIONS_KEY))
+    finally:
+        await redis.close()
+    print(f"active dimensions: {active}")
+    print(f"dual-written dimensions: {migrating or 'none'}")
+    if dims != EMBED_DIM:
+        print(f"rows missing {embedding_column(dims)}: {missing_rows(dims)}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["status", "backfill", "cutover", "stop"])
+    parser.add_argument("--dimensions", type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        if args.dimensions != EMBED_DIM:
+            asyncio.run(mark_migrating(args.dimensions))
+        backfill(args.dimensions)
+    elif args.command == "stop":
+        asyncio.run(mark_migrating(args.dimensions, migrating=False))
+    elif args.command == "cutover":
+        asyncio.run(cutover(args.dimensions))
+    else:
+        asyncio.run(status(args.dimensions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+embedding_store – content-addressed, on-disk embeddings for ingestion.
+
+A redeploy against an empty table, a changed sales file or `/refresh_urls`
+used to re-embed text that was embedded before.  `embed_texts` now looks
+every text up here first and only sends the misses to OpenAI.
+
+One SQLite file (EMBEDDING_STORE_PATH), one row per sha256(model + text)
+holding the vector as packed little-endian float32.  Reads go through
+SQLite's memory-mapped I/O; the file survives restarts and can be copied
+between machines:
+
+    python -m services.embedding_store stats
+    python -m services.embedding_store export embeddings.sqlite3   # e.g. in CI
+    python -m services.embedding_store import embeddings.sqlite3   # warm a fresh container
+
+Any SQLite error disables the store for the process; ingestion then just
+embeds everything, as before.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config.settings import EMBEDDING_STORE_PATH
+
+logger = logging.getLogger("embedding_store")
+
+# ── constants ─────────────────────────────────────────────────────────
+MMAP_SIZE   = 256 * 1024 * 1024
+LOOKUP_SIZE = 500            # keys per SELECT … IN (…) (SQLite variable limit)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key    BLOB PRIMARY KEY,      -- sha256(model + "\\n" + text)
+    model  TEXT NOT NULL,
+    dims   INTEGER NOT NULL,
+    vector BLOB NOT NULL          -- little-endian float32
+) WITHOUT ROWID
+"""
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_disabled = not EMBEDDING_STORE_PATH
+
+_stats: Dict[str, int] = {
+    "embedding_store_hits": 0,
+    "embedding_store_misses": 0,
+    "embedding_store_writes": 0,
+}
+
+
+def _key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).digest()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_SCHEMA)
+    conn.commit()
+    return conn
+
+
+def _connection() -> Optional[sqlite3.Connection]:
+    """Lazily open the store (caller holds _lock); None when disabled."""
+    global _conn, _disabled
+    if _conn is None and not _disabled:
+        try:
+            _conn = _connect(EMBEDDING_STORE_PATH)
+            logger.info("Embedding store opened at %s", EMBEDDING_STORE_PATH)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store unavailable ({e}); embedding without it")
+            _disabled = True
+    return _conn
+
+
+def _fail(e: Exception):
+    global _conn, _disabled
+    logger.warning(f"Embedding store error ({e}); disabled for this process")
+    _disabled = True
+    if _conn is not None:
+        try:
+            _conn.close()
+        except sqlite3.Error:
+            pass
+        _conn = None
+
+
+# ── Public API (blocking – call through asyncio.to_thread) ────────────
+def get_many(model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+    """Stored embeddings aligned with *texts* (None where missing)."""
+    keys = [_key(model, t) for t in texts]
+    found: Dict[bytes, bytes] = {}
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            return [None] * len(texts)
+        try:
+            for start in range(0, len(keys), LOOKUP_SIZE):
+                part = keys[start:start + LOOKUP_SIZE]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+        except sqlite3.Error as e:
+            _fail(e)
+            return [None] * len(texts)
+    result = [np.frombuffer(found[k], dtype="<f4").tolist() if k in found else None for k in keys]
+    hits = len(texts) - result.count(None)
+    _stats["embedding_store_hits"] += hits
+    _stats["embedding_store_misses"] += sum(1 for t in texts if t) - hits
+    return result
+
+
+def put_many(model: str, texts: Sequence[str], vectors: Sequence[Optional[List[float]]]):
+    """Store the embeddings of *texts*; None vectors are skipped."""
+    rows = [
+        (_key(model, t), model, len(v), np.asarray(v, dtype="<f4").tobytes())
+        for t, v in zip(texts, vectors) if v is not None
+    ]
+    if not rows:
+        return
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            return
+        try:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, dims, vector) VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+        except sqlite3.Error as e:
+            _fail(e)
+            return
+    _stats["embedding_store_writes"] += len(rows)
+
+
+def export_to(path: str) -> int:
+    """Write a consistent single-file copy of the store to *path*; returns its row count."""
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            raise RuntimeError("embedding store is disabled")
+        target = sqlite3.connect(path)
+        try:
+            conn.backup(target)
+            target.execute("PRAGMA journal_mode=DELETE")     # self-contained file, no -wal sidecar
+            return target.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        finally:
+            target.close()
+
+
+def import_from(path: str) -> int:
+    """Merge the embeddings of an exported file into the store; returns rows added."""
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            raise RuntimeError("embedding store is disabled")
+        before = conn.total_changes
+        conn.execute("ATTACH DATABASE ? AS incoming", (path,))
+        try:
+            conn.execute("INSERT OR IGNORE INTO embeddings SELECT key, model, dims, vector FROM incoming.embeddings")
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE incoming")
+        return conn.total_changes - before
+
+
+def get_embedding_store_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    with _lock:
+        conn = _connection()
+        if conn is not None:
+            try:
+                stats["embedding_store_rows"] = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            except sqlite3.Error as e:
+                _fail(e)
+    lookups = stats["embedding_store_hits"] + stats["embedding_store_misses"]
+    stats["embedding_store_hit_rate"] = round(stats["embedding_store_hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["stats", "export", "import"])
+    parser.add_argument("file", nargs="?", help="SQLite file to export to / import from")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(get_embedding_store_stats())
+        return
+    if not args.file:
+        parser.error(f"{args.command} needs a file")
+    if args.command == "export":
+        print(f"exported {export_to(args.file)} embeddings to {args.file}")
+    else:
+        print(f"imported {import_from(args.file)} new embeddings from {args.file}")
+
+
+if __name__ == "__main__":
+    main()
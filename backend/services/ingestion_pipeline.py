@@ -0,0 +1,302 @@
+"""
+ingestion_pipeline – staged, streaming ingestion with backpressure.
+
+Ingestion used to be nested sequential loops (scrape a URL, split it, embed
+it, upsert it, next URL), so a run took the *sum* of every page's fetch,
+embedding and Supabase time.  Here each source flows through five stages,
+each with its own pool of workers, connected by bounded queues:
+
+    fetch    static HTTP / pooled browser (`website_content.fetch_html`)
+    extract  HTML → markdown (worker thread), drop empty or unchanged sources
+    chunk    `chunking_service`, then the diff against the stored chunk ids
+    embed    `embed_texts` on the new chunks only
+    upsert   transactional swap of the source's rows (`write_source_chunks`)
+
+While one page is embedding the next is being fetched, so throughput is
+set by the slowest external dependency.  A full queue blocks its producer
+(backpressure) instead of buffering a whole crawl in memory.  A failing
+item is logged, counted and dropped; the run goes on.  Losing the leader
+lease, cancellation or a failing source iterator aborts the whole run
+instead: every stage is cancelled and the error is raised from `run`.
+
+Every run returns (and logs) a summary with, per stage: items in / out /
+dropped / failed, busy and wall time, and the peak and mean depth of its
+input queue – the stage in front of the deepest queue is the bottleneck.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from knowledge_base.website_content import fetch_html, html_to_markdown
+from services import local_vector_index
+from services.chunking_service import Chunk, chunk_text
+from services.leader_service import LostLeadership
+from services.supabase_vector_service import diff_source_chunks, embed_texts, write_source_chunks
+
+logger = logging.getLogger("ingestion_pipeline")
+
+# ── constants ─────────────────────────────────────────────────────────
+STAGES      = ("fetch", "extract", "chunk", "embed", "upsert")
+QUEUE_SIZE  = 8
+CONCURRENCY = {
+    "fetch": 4,       # HTTP; browser renders are further bounded by the browser pool
+    "extract": 2,     # CPU, in worker threads
+    "chunk": 2,       # CPU + one Supabase read for the diff
+    "embed": 2,       # each embed_texts call already fans out EMBED_CONCURRENCY requests
+    "upsert": 2,      # Supabase RPC
+}
+
+_DONE = object()
+
+
+@dataclass
+class Source:
+    """One document travelling through the pipeline."""
+    source_id: str
+    namespace: str
+    category: Optional[str] = None
+    doc_type: Optional[str] = None
+    url: Optional[str] = None             # fetched when `text` is not given
+    text: Optional[str] = None            # markdown / plain text
+    html: str = ""
+    validators: dict = field(default_factory=dict)
+    chunks: List[Chunk] = field(default_factory=list)
+    fresh: List[Chunk] = field(default_factory=list)
+    existing: Set[str] = field(default_factory=set)
+    vectors: List[List[float]] = field(default_factory=list)
+    result: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class StageMetrics:
+    workers: int
+    items_in: int = 0
+    items_out: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy: float = 0.0                     # summed processing time of all workers
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+    queue_peak: int = 0
+    queue_samples: int = 0
+    queue_total: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        wall = (self.last_end - self.first_start) if self.first_start is not None and self.last_end else 0.0
+        return {
+            "workers": self.workers,
+            "in": self.items_in,
+            "out": self.items_out,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "busy_s": round(self.busy, 3),
+            "wall_s": round(wall, 3),
+            "queue_peak": self.queue_peak,
+            "queue_mean": round(self.queue_total / self.queue_samples, 2) if self.queue_samples else 0.0,
+        }
+
+
+StageFn = Callable[[Source], Awaitable[Optional[Source]]]
+
+
+class IngestionPipeline:
+    """
+    fetch → extract → chunk → embed → upsert over bounded queues.
+
+    *skip* is asked after extraction whether a source can be dropped (e.g.
+    its content hash is unchanged); *on_done* is called for every source
+    whose rows were written.  *guard* is awaited right before every write;
+    False (e.g. the fencing token of the leader lease expired) fails the
+    item instead of writing it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: Optional[Dict[str, int]] = None,
+        queue_size: int = QUEUE_SIZE,
+        skip: Optional[Callable[[Source], bool]] = None,
+        on_done: Optional[Callable[[Source], Any]] = None,
+        guard: Optional[Callable[[], Awaitable[bool]]] = None,
+    ):
+        self.name = name
+        self.concurrency = {**CONCURRENCY, **(concurrency or {})}
+        self.queue_size = queue_size
+        self.skip = skip
+        self.on_done = on_done
+        self.guard = guard
+        self.stages: Dict[str, StageFn] = {
+            "fetch": self._fetch,
+            "extract": self._extract,
+            "chunk": self._chunk,
+            "embed": self._embed,
+            "upsert": self._upsert,
+        }
+
+    # ── stages ────────────────────────────────────────────────────────
+    async def _fetch(self, src: Source) -> Optional[Source]:
+        if src.text is not None or not src.url:
+            return src
+        page = await fetch_html(src.url)
+        if not page.html:
+            logger.warning("No content fetched for %s", src.url)
+            return None
+        src.html, src.validators = page.html, page.validators
+        return src
+
+    async def _extract(self, src: Source) -> Optional[Source]:
+        if src.text is None:
+            src.text = await asyncio.to_thread(html_to_markdown, src.html)
+            src.html = ""
+        if not src.text or not src.text.strip():
+            logger.warning("No content found for %s", src.source_id)
+            return None
+        if self.skip is not None and self.skip(src):
+            return None
+        return src
+
+    async def _chunk(self, src: Source) -> Optional[Source]:
+        src.chunks = await asyncio.to_thread(chunk_text, src.text, src.source_id)
+        if not src.chunks:
+            logger.warning("No chunks generated for %s", src.source_id)
+            return None
+        src.fresh, src.existing = await asyncio.to_thread(diff_source_chunks, src.chunks, src.namespace, src.source_id)
+        return src
+
+    async def _embed(self, src: Source) -> Optional[Source]:
+        vectors = await embed_texts([c.text for c in src.fresh]) if src.fresh else []
+        if any(v is None for v in vectors):
+            # keep the current rows rather than replace them with a partial source
+            raise RuntimeError(f"embedding failed for {sum(v is None for v in vectors)} chunks")
+        src.vectors = vectors
+        return src
+
+    async def _upsert(self, src: Source) -> Optional[Source]:
+        if self.guard is not None and not await self.guard():
+            raise LostLeadership("fencing token no longer holds the leader lease")
+        src.result = await write_source_chunks(
+            src.namespace, src.source_id, src.fresh, src.vectors,
+            [c.id for c in src.chunks], src.existing, src.category, src.doc_type,
+        )
+        if self.on_done is not None:
+            self.on_done(src)
+        return src
+
+    # ── runner ────────────────────────────────────────────────────────
+    async def run(self, sources: Union[Iterable[Source], AsyncIterable[Source]]) -> Dict[str, Any]:
+        """Push *sources* through every stage; returns the run summary."""
+        metrics = {name: StageMetrics(self.concurrency[name]) for name in STAGES}
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in STAGES]
+        results: List[Source] = []
+        start = time.perf_counter()
+
+        async def put(index: int, item: Any):
+            await queues[index].put(item)
+            if item is not _DONE:
+                m = metrics[STAGES[index]]
+                depth = queues[index].qsize()
+                m.queue_peak = max(m.queue_peak, depth)
+                m.queue_samples += 1
+                m.queue_total += depth
+
+        async def worker(index: int):
+            name, m, fn = STAGES[index], metrics[STAGES[index]], self.stages[STAGES[index]]
+            while True:
+                src = await queues[index].get()
+                if src is _DONE:
+                    return
+                m.items_in += 1
+                s = time.perf_counter()
+                m.first_start = s if m.first_start is None else m.first_start
+                try:
+                    out = await fn(src)
+                except LostLeadership:
+                    logger.error("[%s] %s lost the leader lease at %s, aborting the run", self.name, name, src.source_id)
+                    m.failed += 1
+                    raise
+                except Exception as e:
+                    logger.error("[%s] %s failed for %s: %s", self.name, name, src.source_id, e)
+                    m.failed += 1
+                    continue
+                finally:
+                    m.last_end = time.perf_counter()
+                    m.busy += m.last_end - s
+                if out is None:
+                    m.dropped += 1
+                    continue
+                m.items_out += 1
+                if index + 1 < len(STAGES):
+                    await put(index + 1, out)
+                else:
+                    results.append(out)
+
+        async def stage(index: int):
+            async with asyncio.TaskGroup() as workers:
+                for _ in range(self.concurrency[STAGES[index]]):
+                    workers.create_task(worker(index))
+            if index + 1 < len(STAGES):
+                for _ in range(self.concurrency[STAGES[index + 1]]):
+                    await queues[index + 1].put(_DONE)
+
+        async def produce():
+            if hasattr(sources, "__aiter__"):
+                async for src in sources:
+                    await put(0, src)
+            else:
+                for src in sources:
+                    await put(0, src)
+            for _ in range(self.concurrency[STAGES[0]]):
+                await queues[0].put(_DONE)
+
+        # one failing task cancels all the others – nothing is left waiting on a queue
+        try:
+            async with asyncio.TaskGroup() as tasks:
+                tasks.create_task(produce())
+                for i in range(len(STAGES)):
+                    tasks.create_task(stage(i))
+        except BaseExceptionGroup as group:
+            raise _first_error(group) from None
+        finally:
+            # the local index re-quantizes + persists once per run, not once per source
+            await asyncio.to_thread(local_vector_index.flush)
+
+        summary = {
+            "pipeline": self.name,
+            "seconds": round(time.perf_counter() - start, 3),
+            "sources": metrics["fetch"].items_in,
+            "written": len(results),
+            "embedded": sum(r.result.get("embedded", 0) for r in results),
+            "kept": sum(r.result.get("kept", 0) for r in results),
+            "deleted": sum(r.result.get("deleted", 0) for r in results),
+            "stages": {name: metrics[name].as_dict() for name in STAGES},
+        }
+        logger.info(format_summary(summary))
+        return summary
+
+
+def _first_error(group: BaseExceptionGroup) -> BaseException:
+    """The error that aborted a run, out of the (nested) task group errors."""
+    error: BaseException = group
+    while isinstance(error, BaseExceptionGroup):
+        error = error.exceptions[0]
+    return error
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [
+        f"Ingestion '{summary['pipeline']}': {summary['written']}/{summary['sources']} sources written "
+        f"in {summary['seconds']:.2f}s ({summary['embedded']} chunks embedded, {summary['kept']} unchanged, "
+        f"{summary['deleted']} deleted)",
+        f"  {'stage':8s} {'workers':>7s} {'in':>5s} {'out':>5s} {'drop':>5s} {'fail':>5s} "
+        f"{'busy s':>8s} {'wall s':>8s} {'q peak':>6s} {'q mean':>6s}",
+    ]
+    for name, m in summary["stages"].items():
+        lines.append(
+            f"  {name:8s} {m['workers']:>7d} {m['in']:>5d} {m['out']:>5d} {m['dropped']:>5d} {m['failed']:>5d} "
+            f"{m['busy_s']:>8.3f} {m['wall_s']:>8.3f} {m['queue_peak']:>6d} {m['queue_mean']:>6.2f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,165 @@
+"""
+leader_service – one worker runs the background jobs, the others follow.
+
+uvicorn runs several workers and each executes the lifespan, so every
+worker used to bootstrap the corpus, check `.sales_hash` and run its own
+24h refresh loop – duplicate scraping / embedding and racing writes of
+hashes.json.  Now the workers compete for a Redis lease:
+
+  * LEADER_KEY is taken with SET NX PX LEASE_TTL and renewed every
+    RENEW_INTERVAL by its holder; a worker that dies loses it after at
+    most LEASE_TTL and another one takes over;
+  * every acquisition INCRs FENCE_KEY – the *fencing token*.  Writes done
+    for a job (pipeline upserts, hashes.json, .sales_hash) first check
+    that the lease still holds our token, so a leader that stalled past
+    its lease (GC pause, blocked loop) cannot overwrite the work of its
+    successor;
+  * losing the lease cancels the jobs.
+
+Followers learn about corpus changes over pub/sub (retrieval_cache_service
+CORPUS_CHANNEL) and reload their in-process indexes.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from services import cache_service
+
+logger = logging.getLogger("leader_service")
+
+# ── constants ─────────────────────────────────────────────────────────
+LEADER_KEY     = "JOBS_LEADER"           # "{worker id}:{fencing token}" of the leader
+FENCE_KEY      = "JOBS_LEADER_FENCE"     # monotonically increasing fencing token
+LEASE_TTL      = 30                      # seconds
+RENEW_INTERVAL = 10                      # seconds between renewals by the leader
+RETRY_INTERVAL = 5                       # seconds between acquisition attempts of followers
+
+# Take the lease if free and hand out the next fencing token, atomically
+_ACQUIRE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return false
+end
+local fence = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. fence, 'PX', ARGV[2])
+return fence
+"""
+
+_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LostLeadership(RuntimeError):
+    """A fenced write was attempted with a token that no longer holds the lease."""
+
+
+class LeaderElector:
+    """Run *job(fence)* on exactly one worker at a time."""
+
+    def __init__(self, name: str = "jobs"):
+        self.name = name
+        self.worker_id = uuid.uuid4().hex
+        self.fence: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.fence is not None
+
+    def _holder(self, fence: int) -> str:
+        return f"{self.worker_id}:{fence}"
+
+    async def _acquire(self) -> Optional[int]:
+        fence = await cache_service.redis_client.eval(
+            _ACQUIRE_LUA, 2, LEADER_KEY, FENCE_KEY, self.worker_id, LEASE_TTL * 1000,
+        )
+        return int(fence) if fence else None
+
+    async def _renew(self, fence: int) -> bool:
+        return bool(await cache_service.redis_client.eval(
+            _RENEW_LUA, 1, LEADER_KEY, self._holder(fence), LEASE_TTL * 1000,
+        ))
+
+    async def _release(self, fence: int):
+        await cache_service.redis_client.eval(_RELEASE_LUA, 1, LEADER_KEY, self._holder(fence))
+
+    async def holds(self, fence: Optional[int] = None) -> bool:
+        """True while the lease still carries *fence* (default: ours)."""
+        fence = self.fence if fence is None else fence
+        if fence is None:
+            return False
+        try:
+            return await cache_service.redis_client.get(LEADER_KEY) == self._holder(fence)
+        except Exception as e:
+            logger.warning(f"Leader check failed: {e}")
+            return False
+
+    def guard(self, fence: int) -> Callable[[], Awaitable[bool]]:
+        """Fencing check to run right before a job's write."""
+        return lambda: self.holds(fence)
+
+    async def run(self, job: Callable[[int], Awaitable[None]]):
+        """Long-running task: compete for the lease; while held, run *job* and keep renewing."""
+        while True:
+            try:
+                fence = await self._acquire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Leader election failed: {e}")
+                fence = None
+            if fence is None:
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+
+            self.fence = fence
+            logger.info("Worker %s leads '%s' (fencing token %s)", self.worker_id[:8], self.name, fence)
+            task = asyncio.create_task(job(fence))
+            try:
+                await self._hold(fence, task)
+            finally:
+                self.fence = None
+                if not task.done():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                try:
+                    await self._release(fence)
+                except Exception:
+                    pass
+            await asyncio.sleep(RETRY_INTERVAL)
+
+    async def _hold(self, fence: int, task: asyncio.Task):
+        """Renew the lease until *task* ends or the lease is lost."""
+        renewed = time.monotonic()
+        while not task.done():
+            await asyncio.wait({task}, timeout=RENEW_INTERVAL)
+            if task.done():
+                break
+            try:
+                ok = await self._renew(fence)
+                if ok:
+                    renewed = time.monotonic()
+            except Exception as e:
+                logger.warning(f"Lease renewal failed: {e}")
+                ok = time.monotonic() - renewed < LEASE_TTL - RENEW_INTERVAL   # may still be ours
+            if not ok:
+                logger.warning("Worker %s lost the '%s' lease, stopping its jobs", self.worker_id[:8], self.name)
+                return
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Leader job '{self.name}' failed: {task.exception()}")
+
+
+elector = LeaderElector()
@@ -0,0 +1,365 @@
+"""
+local_vector_index – in-process mirror of public.documents for retrieval.
+
+The whole table is a few thousand chunks, so every namespace fits in one
+contiguous float32 matrix of unit rows.  A query is a single matmul,
+`argpartition` for the top-k and boolean masks for the category / type
+filters – microseconds instead of a PostgREST round trip.
+
+Supabase stays the source of truth: the mirror is filled from it at startup
+(`supabase_vector_service.load_retrieval_indexes`), patched by the ingestion
+paths after they write, and `search` returns None until it is loaded so
+callers fall back to the RPC.
+
+Every uvicorn worker holds its own mirror, so the float32 matrix can be
+swapped for compact codes (LOCALINDEXQUANTIZATIONIND):
+
+  int8    per-row scaled int8 codes (4x smaller), approximate scores
+  binary  sign bits packed 8 per byte (32x smaller), Hamming distance
+
+The top candidates of the approximate pass are re-ranked exactly against
+the float32 rows, which then live in a memory-mapped .npy under
+LOCALINDEXDIRIND: read on demand, and shared through the page cache by
+workers that map the same (content-addressed) file.
+
+Quantizing and writing that file costs a pass over the whole namespace, so
+`upsert` / `remove` do not do it: a changed namespace is served exactly from
+its float32 rows in RAM and marked dirty, and `flush` – called once at the
+end of an ingestion run – quantizes and persists it.  Older generations of
+the file are swept only after GENERATION_GRACE seconds, since other workers
+may be about to map them.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+from config.settings import LOCAL_INDEX_QUANTIZATION, LOCAL_INDEX_DIR
+
+logger = logging.getLogger("local_vector_index")
+
+# ── constants ─────────────────────────────────────────────────────────
+QUANTIZATIONS  = ("none", "int8", "binary")
+RERANK_FACTOR  = {"int8": 4, "binary": 16}    # approximate candidates = factor * top_k
+SCORE_BLOCK    = 4096                         # rows dequantized per step
+GENERATION_GRACE = 300                        # seconds an older .npy is kept for workers still mapping it
+PERSIST_ATTEMPTS = 3
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class _Namespace:
+    """Unit-row matrix (+ codes) and metadata of one namespace, rows aligned."""
+    __slots__ = ("ids", "matrix", "codes", "scales", "texts", "sources", "categories", "types", "pos")
+
+    def __init__(self, dim: int):
+        self.ids: List[str] = []
+        self.matrix = np.empty((0, dim), dtype=np.float32)   # in RAM, or mmap when quantized
+        self.codes: Optional[np.ndarray] = None               # int8 rows / packed sign bits
+        self.scales: Optional[np.ndarray] = None              # int8 per-row scale
+        self.texts: List[str] = []
+        self.sources: List[Optional[str]] = []
+        self.categories = np.empty(0, dtype=object)
+        self.types = np.empty(0, dtype=object)
+        self.pos: Dict[str, int] = {}
+
+
+_namespaces: Dict[str, _Namespace] = {}
+_dirty: Set[str] = set()                      # changed since their last _finalize
+_lock = threading.Lock()
+_ready = False
+_quantization = LOCAL_INDEX_QUANTIZATION if LOCAL_INDEX_QUANTIZATION in QUANTIZATIONS else "none"
+_directory = LOCAL_INDEX_DIR
+
+
+def configure(quantization: str = "none", directory: Optional[str] = None):
+    """Select the in-memory representation; takes effect on the next load()."""
+    global _quantization, _directory
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+    _quantization = quantization
+    _directory = directory or _directory
+
+
+def _vector(value: Any) -> np.ndarray:
+    # PostgREST returns pgvector columns as their text form "[0.1,0.2,…]"
+    if isinstance(value, str):
+        value = json.loads(value)
+    v = np.asarray(value, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+def _build(rows: List[Dict[str, Any]], dim: int) -> _Namespace:
+    ns = _Namespace(dim)
+    if not rows:
+        return ns
+    ns.ids = [r["id"] for r in rows]
+    ns.matrix = np.ascontiguousarray(np.stack([_vector(r["embedding"]) for r in rows]))
+    ns.texts = [r.get("text") for r in rows]
+    ns.sources = [r.get("source") for r in rows]
+    ns.categories = np.array([r.get("category") for r in rows], dtype=object)
+    ns.types = np.array([r.get("type") for r in rows], dtype=object)
+    ns.pos = {vid: i for i, vid in enumerate(ns.ids)}
+    return ns
+
+
+def _subset(ns: _Namespace, keep: np.ndarray) -> _Namespace:
+    out = _Namespace(ns.matrix.shape[1])
+    rows = np.flatnonzero(keep)
+    out.ids = [ns.ids[i] for i in rows]
+    out.matrix = np.ascontiguousarray(ns.matrix[rows])
+    out.texts = [ns.texts[i] for i in rows]
+    out.sources = [ns.sources[i] for i in rows]
+    out.categories = ns.categories[rows]
+    out.types = ns.types[rows]
+    out.pos = {vid: i for i, vid in enumerate(out.ids)}
+    return out
+
+
+def _concat(a: _Namespace, b: _Namespace) -> _Namespace:
+    out = _Namespace(b.matrix.shape[1])
+    out.ids = a.ids + b.ids
+    out.matrix = np.ascontiguousarray(np.concatenate([a.matrix, b.matrix]))
+    out.texts = a.texts + b.texts
+    out.sources = a.sources + b.sources
+    out.categories = np.concatenate([a.categories, b.categories])
+    out.types = np.concatenate([a.types, b.types])
+    out.pos = {vid: i for i, vid in enumerate(out.ids)}
+    return out
+
+
+# ── Quantization ──────────────────────────────────────────────────────
+def _persist(name: str, matrix: np.ndarray) -> np.ndarray:
+    """Write *matrix* to a content-addressed .npy and return a read-only mmap of it."""
+    os.makedirs(_directory, exist_ok=True)
+    digest = hashlib.sha256(matrix.tobytes()).hexdigest()[:16]
+    path = os.path.join(_directory, f"{name}-{digest}.npy")
+    for attempt in range(PERSIST_ATTEMPTS):
+        try:
+            if os.path.exists(path):      # another worker may have written it already
+                os.utime(path)            # current again: keep it out of their sweeps
+            else:
+                tmp = f"{path}.{os.getpid()}.tmp.npy"
+                np.save(tmp, matrix)
+                os.replace(tmp, path)
+            mapped = np.load(path, mmap_mode="r")
+            break
+        except FileNotFoundError:
+            # swept by a worker between our write and map – write it again
+            if attempt + 1 == PERSIST_ATTEMPTS:
+                raise
+    cutoff = time.time() - GENERATION_GRACE
+    for old in os.listdir(_directory):    # mapped files survive unlinking
+        if old.startswith(f"{name}-") and old.endswith(".npy") and old != os.path.basename(path):
+            try:
+                if os.path.getmtime(os.path.join(_directory, old)) < cutoff:
+                    os.remove(os.path.join(_directory, old))
+            except OSError:
+                pass
+    return mapped
+
+
+def _finalize(name: str, ns: _Namespace) -> _Namespace:
+    """Derive the codes of *ns* and move its float32 rows to disk (quantized modes only)."""
+    if _quantization == "none" or not ns.ids:
+        ns.codes = ns.scales = None
+        return ns
+    matrix = np.asarray(ns.matrix, dtype=np.float32)
+    if _quantization == "int8":
+        scales = np.abs(matrix).max(axis=1)
+        scales[scales == 0] = 1.0
+        ns.codes = np.round(matrix / scales[:, None] * 127).astype(np.int8)
+        ns.scales = (scales / 127).astype(np.float32)
+    else:
+        ns.codes = np.packbits(matrix > 0, axis=1)
+        ns.scales = None
+    ns.matrix = _persist(name, matrix)
+    return ns
+
+
+def _approximate_scores(ns: _Namespace, query: np.ndarray) -> np.ndarray:
+    if _quantization == "int8" and ns.scales is not None:
+        scores = np.empty(len(ns.ids), dtype=np.float32)
+        for start in range(0, len(ns.ids), SCORE_BLOCK):
+            block = ns.codes[start:start + SCORE_BLOCK]
+            scores[start:start + SCORE_BLOCK] = (block.astype(np.float32) @ query) * ns.scales[start:start + SCORE_BLOCK]
+        return scores
+    bits = np.packbits(query > 0)
+    hamming = _POPCOUNT[np.bitwise_xor(ns.codes, bits)].sum(axis=1, dtype=np.int32)
+    return -hamming.astype(np.float32)
+
+
+def memory_bytes() -> Dict[str, int]:
+    """Resident bytes of the vector data per namespace (mmapped rows excluded)."""
+    out = {}
+    for name, ns in _namespaces.items():
+        if ns.codes is None:
+            out[name] = ns.matrix.nbytes
+        else:
+            out[name] = ns.codes.nbytes + (ns.scales.nbytes if ns.scales is not None else 0)
+    return out
+
+
+# ── Loading / incremental sync ────────────────────────────────────────
+def load(pages: Iterable[List[Dict[str, Any]]]):
+    """Replace the mirror with the rows yielded page by page (id, namespace, text, …, embedding)."""
+    global _namespaces, _ready
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for page in pages:
+        for row in page:
+            grouped.setdefault(row["namespace"], []).append(row)
+    built = {}
+    for name, rows in grouped.items():
+        built[name] = _finalize(name, _build(rows, len(_vector(rows[0]["embedding"]))))
+    with _lock:
+        _namespaces, _ready = built, True
+        _dirty.clear()
+    logger.info("Local vector index loaded: %s", {n: len(ns.ids) for n, ns in built.items()})
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def dimension() -> Optional[int]:
+    """Vector dimension of the loaded rows (None when empty / not loaded)."""
+    for ns in _namespaces.values():
+        if ns.ids:
+            return int(ns.matrix.shape[1])
+    return None
+
+
+def upsert(rows: List[Dict[str, Any]]):
+    """Apply rows just written to Supabase (no-op until the mirror is loaded); see `flush`."""
+    if not _ready or not rows:
+        return
+    grouped: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for row in rows:
+        grouped.setdefault(row["namespace"], {})[row["id"]] = row
+    with _lock:
+        for name, new_rows in grouped.items():
+            added = _build(list(new_rows.values()), len(_vector(next(iter(new_rows.values()))["embedding"])))
+            current = _namespaces.get(name)
+            if current is not None and current.matrix.shape[1] == added.matrix.shape[1]:
+                keep = np.array([vid not in new_rows for vid in current.ids], dtype=bool)
+                added = _concat(_subset(current, keep), added)
+            _namespaces[name] = added
+            _dirty.add(name)
+
+
+def remove(namespace: str, source: Optional[str] = None, ids: Optional[Iterable[str]] = None):
+    """Drop rows of *namespace* by source and/or id (no-op until loaded); see `flush`."""
+    if not _ready:
+        return
+    drop = set(ids or ())
+    with _lock:
+        current = _namespaces.get(namespace)
+        if current is None:
+            return
+        keep = np.array(
+            [vid not in drop and (source is None or src != source) for vid, src in zip(current.ids, current.sources)],
+            dtype=bool,
+        )
+        _namespaces[namespace] = _subset(current, keep)
+        _dirty.add(namespace)
+
+
+def flush():
+    """Quantize and persist the namespaces changed by upsert / remove (blocking)."""
+    with _lock:
+        pending = {name: _namespaces[name] for name in _dirty if name in _namespaces}
+        _dirty.clear()
+    for name, ns in pending.items():
+        finalized = _finalize(name, ns)
+        with _lock:
+            if _namespaces.get(name) is not ns:   # changed again meanwhile: next flush
+                continue
+            _namespaces[name] = finalized
+    if pending and _quantization != "none":
+        logger.info("Local vector index flushed: %s", {n: len(ns.ids) for n, ns in pending.items()})
+
+
+# ── Query ─────────────────────────────────────────────────────────────
+def _top(ns: _Namespace, query: np.ndarray, top_k: int, category: Optional[str], doc_type: Optional[str]):
+    if not ns.ids or query.shape[0] != ns.matrix.shape[1]:
+        return []
+    mask = np.ones(len(ns.ids), dtype=bool)
+    if category is not None:
+        mask &= ns.categories == category
+    if doc_type is not None:
+        mask &= ns.types == doc_type
+    valid = int(mask.sum())
+    if not valid:
+        return []
+
+    if ns.codes is None:
+        scores = np.where(mask, ns.matrix @ query, -np.inf)
+        k = min(top_k, valid)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        return [(float(scores[i]), i) for i in idx]
+
+    # approximate pass over the codes, exact re-rank of the survivors
+    approx = np.where(mask, _approximate_scores(ns, query), -np.inf)
+    pool = min(top_k * RERANK_FACTOR[_quantization], valid)
+    candidates = np.sort(np.argpartition(-approx, pool - 1)[:pool])
+    exact = np.asarray(ns.matrix[candidates], dtype=np.float32) @ query
+    k = min(top_k, pool)
+    best = np.argpartition(-exact, k - 1)[:k]
+    return [(float(exact[i]), int(candidates[i])) for i in best]
+
+
+def search(
+    query_embedding: Sequence[float],
+    namespaces: Sequence[str],
+    top_k: int = 5,
+    filter_category: Optional[str] = None,
+    filter_type: Optional[str] = None,
+    weights: Optional[Sequence[float]] = None,
+    fallback: bool = False,
+) -> Optional[List[Dict[str, Any]]]:
+    """Same contract as match_documents / match_documents_multi; None if not loaded."""
+    if not _ready:
+        return None
+    query = _vector(query_embedding)
+    if dimension() not in (None, query.shape[0]):      # mirror built for another dimension
+        return None
+    hits = []
+    for i, name in enumerate(namespaces):
+        ns = _namespaces.get(name)
+        if ns is None:
+            continue
+        weight = weights[i] if weights and i < len(weights) else 1.0
+        found = [(score * weight, name, ns, row) for score, row in _top(ns, query, top_k, filter_category, filter_type)]
+        if fallback and found:
+            hits = found
+            break
+        hits.extend(found)
+    hits.sort(key=lambda h: h[0], reverse=True)
+    return [
+        {
+            "text": ns.texts[row],
+            "source": ns.sources[row],
+            "category": ns.categories[row],
+            "type": ns.types[row],
+            "namespace": name,
+            "score": score,
+        }
+        for score, name, ns, row in hits[:top_k]
+    ]
+
+
+def get_local_index_stats() -> Dict[str, Any]:
+    return {
+        "local_index_ready": _ready,
+        "local_index_quantization": _quantization,
+        "local_index_bytes": memory_bytes(),
+        "local_index_rows": {n: len(ns.ids) for n, ns in _namespaces.items()},
+    }
@@ -1,10 +1,17 @@
 import os
-import uuid
+import asyncio
+import logging
 from supabase import create_client
 from openai import OpenAI
-from config.settings import SUPABASE_URL, SUPABASE_SERVICE_KEY, OPENAI_API_KEY
+from redis.asyncio import Redis
+from config.settings import SUPABASE_URL, SUPABASE_SERVICE_KEY, OPENAI_API_KEY, REDIS_URL
+from services.cache_service import init_redis_client
+from services.supabase_vector_service import embed_texts, embedding_columns, write_dimensions
+from services.chunking_service import iter_chunks
 import time
 
+logger = logging.getLogger("pinecone_ingestion")
+
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
 supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
@@ -15,22 +22,27 @@ def embed(text: str):
     print(f"OpenAI embeddings.create in {duration:.4f}s (model=text-embedding-3-small, chars={len(text or '')})")
     return res.data[0].embedding
 
-def chunk_and_upload(docs: list):
+async def chunk_and_upload(docs: list):
     rows = []
-    for doc in docs:
-        embedding = embed(doc['text'])
+    pieces = [(doc, chunk) for doc in docs for chunk in iter_chunks(doc["text"], doc.get("source") or "")]
+    embeddings = await embed_texts([chunk.text for _, chunk in pieces])
+    dims = await write_dimensions()
+    for (doc, chunk), embedding in zip(pieces, embeddings):
+        if embedding is None:
+            logger.warning("Skipping chunk without embedding: %s", chunk.text[:60])
+            continue
         rows.append({
-            "id": str(uuid.uuid4()),
+            "id": chunk.id,
             "namespace": doc.get("namespace", "sales"),
-            "text": doc["text"],
+            "text": chunk.text,
             "source": doc.get("source"),
             "category": doc.get("category"),
             "type": doc.get("type"),
-            "embedding": embedding
+            **embedding_columns(embedding, dims)
         })
     if rows:
         _s = time.perf_counter()
-        supabase.table("documents").upsert(rows).execute()
+        await asyncio.to_thread(lambda: supabase.table("documents").upsert(rows).execute())
         print(f"Supabase upsert {len(rows)} rows in {time.perf_counter()-_s:.4f}s")
 
 # Sample ingestion content
@@ -39,4 +51,15 @@ docs = [
     {"text": "BizRadar tracks over 2.5K+ contracts daily across 8 platforms.", "category": "BizRadar", "type": "stat", "intent_stage": "awareness"}
 ]
 
-chunk_and_upload(docs)
\ No newline at end of file
+async def main():
+    # an embedding migration in progress (Redis) decides which columns are written
+    redis = Redis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
+    if redis is not None:
+        init_redis_client(redis)
+    try:
+        await chunk_and_upload(docs)
+    finally:
+        if redis is not None:
+            await redis.close()
+
+asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+prompt_index service – registry + MinHash/LSH near-duplicate index for cached prompts.
+
+`find_similar_prompt` used to download the whole prompt list and run
+`difflib.SequenceMatcher` against every entry.  Here every cached prompt is
+shingled, MinHashed and bucketed into LSH bands kept as Redis sets, so a
+lookup reads a bounded sample of a few buckets and only runs the exact
+difflib ratio on the handful of prompts that collide with the query.
+
+The registry itself is a sorted set (member = cache key, score = expiry
+time) plus one hash per entry, all written by a single Lua script so the
+response, the registry and the LSH buckets change atomically and the
+registry never grows past MAX_PROMPT_ENTRIES (soonest to expire go first).
+That script touches keys it does not declare, so the index requires a
+single-node (non-cluster) Redis.
+Each entry's bucket list lives in BANDS_KEY, which has no TTL: when an
+entry is dropped its response and prompt hash may long have expired, but
+its bucket memberships are still known and removed in the same script.
+A cache hit reads through `fetch`, which slides the response, the prompt
+hash and the registry score forward by the entry's TTL in one step, so
+recently used prompts are the last to expire or be evicted.
+
+Structured cache keys carry a scope line before SCOPE_SEPARATOR (template
+version, context fingerprint, bucket); two such keys are only similar when
+their scopes are identical, and only the message part is fuzzy-matched.
+"""
+from __future__ import annotations
+
+import difflib
+import hashlib
+import logging
+import re
+import time
+import zlib
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+
+logger = logging.getLogger("prompt_index_service")
+
+# ── constants ─────────────────────────────────────────────────────────
+NUM_PERM           = 64       # MinHash permutations
+LSH_BANDS          = 16       # 16 bands x 4 rows ≈ 0.5 Jaccard threshold
+LSH_ROWS           = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE       = 3        # word n-grams
+MAX_BUCKET_SAMPLE  = 64       # members read per bucket (bounds lookup cost)
+MAX_CANDIDATES     = 8        # prompts verified with difflib per lookup
+MAX_PROMPT_ENTRIES = 5000     # registry bound, LRU-evicted past this
+
+REGISTRY_KEY       = "PROMPT_REGISTRY"  # zset(cache key -> expiry ts)
+BANDS_KEY          = "PROMPT_BANDS"     # hash(cache key -> comma-joined bucket keys), no TTL
+BUCKET_KEY_PREFIX  = "PROMPT_LSH"       # PROMPT_LSH:{band}:{digest} -> set(cache keys)
+ENTRY_KEY_PREFIX   = "PROMPT_ENTRY"     # PROMPT_ENTRY:{cache key}   -> hash(prompt, ttl)
+SCOPE_SEPARATOR    = "\x1e"              # scope (exact) / body (fuzzy) split
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH       = np.uint64((1 << 32) - 1)
+
+# Fixed seed → every worker / restart derives the same permutations.
+# a, b < 2^32 like the crc32 shingle hashes, so a·x + b stays below 2^64
+# and the uint64 arithmetic in `minhash_signature` never wraps.
+_rng   = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_WS_RE = re.compile(r"\s+")
+
+
+# ── MinHash helpers ───────────────────────────────────────────────────
+def _shingles(text: str) -> set[str]:
+    words = _WS_RE.sub(" ", text.lower()).strip().split(" ")
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Return the NUM_PERM-long MinHash signature of *text*."""
+    hv = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in _shingles(text)),
+        dtype=np.uint64,
+    )
+    # (a·x + b) mod p, truncated to 32 bits – one row per permutation
+    phv = ((np.outer(_PERM_A, hv) + _PERM_B[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+    return phv.min(axis=1)
+
+
+def band_keys(signature: np.ndarray) -> List[str]:
+    """Redis bucket keys for each LSH band of *signature*."""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+        keys.append(f"{BUCKET_KEY_PREFIX}:{band}:{digest}")
+    return keys
+
+
+def _entry_key(cache_key: str) -> str:
+    return f"{ENTRY_KEY_PREFIX}:{cache_key}"
+
+
+def _similarity(a: str, b: str, threshold: float) -> float:
+    """difflib ratio, short-circuited by its cheap upper bounds."""
+    if SCOPE_SEPARATOR in a or SCOPE_SEPARATOR in b:
+        scope_a, _, a = a.partition(SCOPE_SEPARATOR)
+        scope_b, _, b = b.partition(SCOPE_SEPARATOR)
+        if scope_a != scope_b:
+            return 0.0
+    matcher = difflib.SequenceMatcher(None, a, b)
+    if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+        return 0.0
+    return matcher.ratio()
+
+
+# ── Lua: atomic response + registry + bucket write, then LRU trim ─────
+# KEYS[1] response key   KEYS[2] entry hash   KEYS[3] registry zset
+# KEYS[4] bands hash     KEYS[5..] LSH bucket sets
+# ARGV: response, prompt, ttl, now, max entries, cache key, entry prefix
+# Single-node Redis only: dropping an evicted entry deletes its response,
+# entry hash and bucket memberships, whose keys are only known inside the
+# script and are not declared in KEYS – not safe on Redis Cluster.
+_REGISTER_LUA = """
+local ttl = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local max_entries = tonumber(ARGV[5])
+
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ttl)
+local buckets = {}
+for i = 5, #KEYS do
+    redis.call('SADD', KEYS[i], ARGV[6])
+    buckets[#buckets + 1] = KEYS[i]
+end
+redis.call('HSET', KEYS[2], 'prompt', ARGV[2], 'ttl', ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('HSET', KEYS[4], ARGV[6], table.concat(buckets, ','))
+redis.call('ZADD', KEYS[3], now + ttl, ARGV[6])
+
+local function drop(member)
+    local bands = redis.call('HGET', KEYS[4], member)
+    if bands then
+        for bucket in string.gmatch(bands, '[^,]+') do
+            redis.call('SREM', bucket, member)
+        end
+    end
+    redis.call('HDEL', KEYS[4], member)
+    redis.call('DEL', ARGV[7] .. ':' .. member, member)
+    redis.call('ZREM', KEYS[3], member)
+end
+
+-- every entry carries its own expiry as its score
+local dropped = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now)
+local overflow = redis.call('ZCARD', KEYS[3]) - #dropped - max_entries
+if overflow > 0 then
+    for _, member in ipairs(redis.call('ZRANGE', KEYS[3], #dropped, #dropped + overflow - 1)) do
+        dropped[#dropped + 1] = member
+    end
+end
+for _, member in ipairs(dropped) do
+    drop(member)
+end
+return dropped
+"""
+
+# ── Lua: read a response and slide its expiry (hit path) ─────────────
+# KEYS[1] response key   KEYS[2] entry hash   KEYS[3] registry zset
+# ARGV: now, cache key
+_FETCH_LUA = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return false
+end
+local ttl = tonumber(redis.call('HGET', KEYS[2], 'ttl'))
+if ttl then
+    redis.call('EXPIRE', KEYS[1], ttl)
+    redis.call('EXPIRE', KEYS[2], ttl)
+    redis.call('ZADD', KEYS[3], 'XX', tonumber(ARGV[1]) + ttl, ARGV[2])
+end
+return value
+"""
+
+_scripts: dict[tuple[int, str], AsyncScript] = {}
+
+
+def _script(redis: Redis, source: str) -> AsyncScript:
+    script = _scripts.get((id(redis), source))
+    if script is None:
+        script = _scripts[(id(redis), source)] = redis.register_script(source)
+    return script
+
+
+# ── Public API ────────────────────────────────────────────────────────
+async def register(redis: Redis, prompt: str, cache_key: str, response: str, ttl: int) -> List[str]:
+    """
+    Atomically store *response* under *cache_key* and index *prompt*.
+    Returns the cache keys dropped from the registry (expired or LRU-evicted).
+    """
+    dropped = await _script(redis, _REGISTER_LUA)(
+        keys=[cache_key, _entry_key(cache_key), REGISTRY_KEY, BANDS_KEY, *band_keys(minhash_signature(prompt))],
+        args=[response, prompt, ttl, int(time.time()), MAX_PROMPT_ENTRIES, cache_key, ENTRY_KEY_PREFIX],
+    )
+    if dropped:
+        logger.info("Prompt registry dropped %s expired/LRU entries", len(dropped))
+    return dropped
+
+
+async def fetch(redis: Redis, cache_key: str) -> Optional[str]:
+    """Return the response stored under *cache_key* and extend its TTL (None when absent)."""
+    return await _script(redis, _FETCH_LUA)(
+        keys=[cache_key, _entry_key(cache_key), REGISTRY_KEY],
+        args=[int(time.time()), cache_key],
+    )
+
+
+async def find_similar(redis: Redis, prompt: str, threshold: float) -> Optional[str]:
+    """Return the cache key of an indexed prompt with ratio ≥ *threshold*."""
+    pipe = redis.pipeline(transaction=False)
+    for bucket in band_keys(minhash_signature(prompt)):
+        pipe.srandmember(bucket, MAX_BUCKET_SAMPLE)
+    buckets = await pipe.execute()
+
+    collisions = Counter(k for members in buckets for k in (members or []))
+    if not collisions:
+        return None
+
+    candidates = [k for k, _ in collisions.most_common(MAX_CANDIDATES)]
+    pipe = redis.pipeline(transaction=False)
+    for key in candidates:
+        pipe.hget(_entry_key(key), "prompt")
+    texts = await pipe.execute()
+
+    for key, cached_prompt in zip(candidates, texts):
+        if cached_prompt is None:          # expired entry, bucket not yet
+            continue
+        similarity = _similarity(prompt, cached_prompt, threshold)
+        if similarity >= threshold:
+            logger.info(
+                "LSH match (similarity=%.2f, bands=%s/%s, candidates=%s)",
+                similarity, collisions[key], LSH_BANDS, len(candidates),
+            )
+            return key
+    return None
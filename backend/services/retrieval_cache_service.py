@@ -0,0 +1,183 @@
+"""
+retrieval_cache service – cache of `query_supabase_vector` results.
+
+The corpus only changes when ingestion runs (bootstrap, the daily
+`check_for_updates`, a manual refresh), so a repeated question can skip
+both the embedding call and the match RPC.  Keys hold the query
+fingerprint, namespaces, filters, top_k, weights / fallback and the
+*corpus version* – a Redis counter every ingestion path bumps – so a bump
+orphans all earlier entries at once instead of deleting them.
+
+Workers read the version through a short local TTL.  Every bump is also
+published on CORPUS_CHANNEL, with the ids it wrote and deleted when the
+writer knows them; `run_corpus_listener` applies bumps from other workers
+at once and hands them to the callbacks registered with
+`add_corpus_listener` (the local indexes patch those rows in, or reload
+when an event carries no ids).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from services import cache_service
+from services.cache_service import LocalTTLCache, normalize_message
+
+logger = logging.getLogger("retrieval_cache_service")
+
+# ── constants ─────────────────────────────────────────────────────────
+L1_MAX_ENTRIES     = 1024
+L1_TTL             = 600
+REDIS_TTL          = 86400
+VERSION_TTL        = 5            # seconds a worker trusts its copy of the version
+KEY_PREFIX         = "RETRIEVAL"
+CORPUS_VERSION_KEY = "CORPUS_VERSION"
+CORPUS_CHANNEL     = "CORPUS_EVENTS"   # {"src": worker id, "version": n, "changes": {...} | None}
+
+_l1 = LocalTTLCache(L1_MAX_ENTRIES, L1_TTL)
+_version: Dict[str, float] = {"value": 0, "read_at": 0.0}
+_listeners: List[Callable[[Dict[str, Any]], Any]] = []
+
+_stats: Dict[str, int] = {
+    "retrieval_l1_hits": 0,
+    "retrieval_redis_hits": 0,
+    "retrieval_misses": 0,
+    "corpus_version_bumps": 0,
+    "corpus_events_received": 0,
+}
+
+
+# ── Corpus version ────────────────────────────────────────────────────
+async def corpus_version() -> int:
+    """Current corpus version (locally cached for VERSION_TTL seconds)."""
+    redis = cache_service.redis_client
+    if redis is None or time.monotonic() - _version["read_at"] < VERSION_TTL:
+        return int(_version["value"])
+    try:
+        _version["value"] = int(await redis.get(CORPUS_VERSION_KEY) or 0)
+        _version["read_at"] = time.monotonic()
+    except Exception as e:
+        logger.warning(f"Corpus version read failed: {e}")
+    return int(_version["value"])
+
+
+async def bump_corpus_version(changes: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Mark the corpus as changed; every cached retrieval result becomes unreachable.
+    *changes* ({"upserted": {namespace: [ids]}, "removed": {…}}) travels with the
+    event so other workers can patch their indexes instead of reloading them.
+    """
+    _stats["corpus_version_bumps"] += 1
+    redis = cache_service.redis_client
+    if redis is None:
+        _version["value"] += 1
+        return int(_version["value"])
+    try:
+        _version["value"] = int(await redis.incr(CORPUS_VERSION_KEY))
+        _version["read_at"] = time.monotonic()
+        await redis.publish(CORPUS_CHANNEL, corpus_event(int(_version["value"]), changes))
+    except Exception as e:
+        logger.warning(f"Corpus version bump failed: {e}")
+        _version["value"] += 1
+    logger.info("Corpus version is now %s", int(_version["value"]))
+    return int(_version["value"])
+
+
+def corpus_event(version: int, changes: Optional[Dict[str, Any]] = None) -> str:
+    return json.dumps({"src": cache_service._WORKER_ID, "version": version, "changes": changes})
+
+
+def add_corpus_listener(callback: Callable[[Dict[str, Any]], Any]):
+    """Call *callback(event)* whenever another worker changes the corpus."""
+    _listeners.append(callback)
+
+
+async def run_corpus_listener():
+    """Long-running task: apply corpus version bumps published by other workers."""
+    redis = cache_service.redis_client
+    if redis is None:
+        raise RuntimeError("Redis client not initialized")
+
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CORPUS_CHANNEL)
+            logger.info("Listening for corpus changes on %s", CORPUS_CHANNEL)
+            async for message in pubsub.listen():
+                event = json.loads(message["data"])
+                if event.get("src") == cache_service._WORKER_ID:
+                    continue
+                _stats["corpus_events_received"] += 1
+                if int(event.get("version", 0)) > _version["value"]:
+                    _version["value"] = int(event["version"])
+                    _version["read_at"] = time.monotonic()
+                for callback in _listeners:
+                    try:
+                        callback(event)
+                    except Exception as e:
+                        logger.error(f"Corpus listener failed: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # a missed event costs at most VERSION_TTL of stale retrieval results
+            logger.error(f"Corpus listener failed, resubscribing: {e}")
+            _version["read_at"] = 0.0
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
+
+
+# ── Cache ─────────────────────────────────────────────────────────────
+async def make_key(query: str, **params: Any) -> str:
+    """Versioned key of *query* + the retrieval *params* (namespace, filters, top_k, …)."""
+    version = await corpus_version()
+    payload = json.dumps({"q": normalize_message(query), **params}, sort_keys=True, default=str)
+    return f"{KEY_PREFIX}:{version}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+async def get(key: str) -> Optional[List[Dict[str, Any]]]:
+    matches = _l1.get(key)
+    if matches is not None:
+        _stats["retrieval_l1_hits"] += 1
+        return [dict(m) for m in matches]
+
+    redis = cache_service.redis_client
+    if redis is not None:
+        try:
+            raw = await redis.get(key)
+        except Exception as e:
+            logger.warning(f"Retrieval cache read failed: {e}")
+            raw = None
+        if raw is not None:
+            _stats["retrieval_redis_hits"] += 1
+            matches = json.loads(raw)
+            _l1.set(key, matches)
+            return [dict(m) for m in matches]
+
+    _stats["retrieval_misses"] += 1
+    return None
+
+
+async def put(key: str, matches: List[Dict[str, Any]]):
+    _l1.set(key, [dict(m) for m in matches])
+    redis = cache_service.redis_client
+    if redis is None:
+        return
+    try:
+        await redis.set(key, json.dumps(matches, default=str), ex=REDIS_TTL)
+    except Exception as e:
+        logger.warning(f"Retrieval cache write failed: {e}")
+
+
+def get_retrieval_cache_stats() -> Dict[str, Any]:
+    hits = _stats["retrieval_l1_hits"] + _stats["retrieval_redis_hits"]
+    lookups = hits + _stats["retrieval_misses"]
+    return {
+        **_stats,
+        "corpus_version": int(_version["value"]),
+        "retrieval_hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
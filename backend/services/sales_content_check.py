@@ -4,14 +4,21 @@ import asyncio
 from services.supabase_vector_service import query_supabase_vector
 _SALES_HASH_FILE = ".sales_hash"
 
-async def sales_content_changed() -> bool:
+def _sales_content_hash() -> str:
     with open("knowledge_base/sales_content.py", "rb") as f:
-        current = md5(f.read()).hexdigest()
+        return md5(f.read()).hexdigest()
+
+async def sales_content_changed() -> bool:
+    """True when sales_content.py differs from the last ingested version."""
+    current = _sales_content_hash()
     if os.path.exists(_SALES_HASH_FILE):
         with open(_SALES_HASH_FILE) as f:
             if f.read().strip() == current:
                 return False
-    with open(_SALES_HASH_FILE, "w") as f:
-        f.write(current)
     return True
 
+def record_sales_content():
+    """Remember the current sales_content.py as ingested (call after a successful ingestion)."""
+    with open(_SALES_HASH_FILE, "w") as f:
+        f.write(_sales_content_hash())
+
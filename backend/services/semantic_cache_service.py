@@ -0,0 +1,238 @@
+"""
+semantic_cache service – reuse answers for paraphrased questions.
+
+The user question is embedded with the same `embed_text` call used for RAG
+and compared against previously answered questions kept in an in-process
+NumPy matrix of unit vectors (one matrix-vector product per lookup, the
+cache is a few thousand rows at most so brute force beats an ANN index).
+An answer is reused only when cosine similarity clears SIMILARITY_THRESHOLD
+*and* the scope – agent template version + fingerprint of the retrieved
+context – is identical, so paraphrases that retrieve different context
+never share answers.  Scopes also carry the content generation of
+cache_service: `mark_cache_stale` (site content changed) retires every
+semantic entry at once, they simply stop matching.
+
+Callers embed the question once (`embed_question`) and pass the vector to
+both `lookup` and `store`.
+
+Entries are persisted in Redis (hash + age index) so restarts and the
+other workers see them; new entries are announced on a pub/sub channel.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from services import cache_service
+from services.cache_service import normalize_message
+from services.supabase_vector_service import embed_text
+
+logger = logging.getLogger("semantic_cache_service")
+
+# ── constants ─────────────────────────────────────────────────────────
+SIMILARITY_THRESHOLD = 0.86                  # cosine, text-embedding-3-small
+MAX_ENTRIES          = 2000
+ENTRY_TTL            = cache_service.SWR_SOFT_TTL   # never outlive the exact cache's soft TTL
+
+ENTRIES_KEY = "SEMANTIC_CACHE"               # hash(id -> json entry)
+AGES_KEY    = "SEMANTIC_CACHE_AGES"          # zset(id -> created ts)
+CHANNEL     = "SEMANTIC_CACHE_ADD"
+
+_stats: Dict[str, int] = {"semantic_hits": 0, "semantic_misses": 0, "semantic_entries_added": 0}
+
+
+# ── in-process index ──────────────────────────────────────────────────
+class _ScopeIndex:
+    """Unit vectors + answers of one scope."""
+    __slots__ = ("ids", "vectors", "answers", "created")
+
+    def __init__(self, dim: int):
+        self.ids: List[str] = []
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.answers: List[Any] = []
+        self.created: List[float] = []
+
+
+_scopes: Dict[str, _ScopeIndex] = {}
+_order: "OrderedDict[str, str]" = OrderedDict()     # id -> scope, oldest first
+
+
+def _unit(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+def _entry_id(question: str, scope: str) -> str:
+    return hashlib.sha256(f"{scope}\n{normalize_message(question)}".encode("utf-8")).hexdigest()[:24]
+
+
+def _insert(entry_id: str, scope: str, vector: np.ndarray, answer: Any, created: float):
+    if entry_id in _order:          # refreshed answer replaces the old one
+        _remove(entry_id)
+    index = _scopes.get(scope)
+    if index is None:
+        index = _scopes[scope] = _ScopeIndex(vector.shape[0])
+    if index.vectors.shape[1] != vector.shape[0]:      # embedding dimension changed
+        return
+    index.ids.append(entry_id)
+    index.vectors = np.vstack([index.vectors, vector[None, :]])
+    index.answers.append(answer)
+    index.created.append(created)
+    _order[entry_id] = scope
+    while len(_order) > MAX_ENTRIES:
+        _remove(next(iter(_order)))
+
+
+def _remove(entry_id: str):
+    scope = _order.pop(entry_id, None)
+    index = _scopes.get(scope)
+    if index is None or entry_id not in index.ids:
+        return
+    row = index.ids.index(entry_id)
+    index.ids.pop(row)
+    index.answers.pop(row)
+    index.created.pop(row)
+    index.vectors = np.delete(index.vectors, row, axis=0)
+    if not index.ids:
+        del _scopes[scope]
+
+
+async def embed_question(question: str) -> np.ndarray:
+    """Unit query vector of *question*, to hand to both `lookup` and `store`."""
+    return _unit(await embed_text(question))
+
+
+def _versioned(scope: str) -> str:
+    return f"{scope}|gen={cache_service.content_generation()}"
+
+
+def _pack(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+
+def _unpack(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+# ── Public helpers ────────────────────────────────────────────────────
+def context_fingerprint(chunks: Iterable[str]) -> str:
+    """Order-insensitive digest of the retrieved context chunks."""
+    digests = sorted(hashlib.sha256(normalize_message(c).encode("utf-8")).hexdigest() for c in chunks if c)
+    return hashlib.sha256("".join(digests).encode("ascii")).hexdigest()[:16] if digests else ""
+
+
+async def lookup(question: str, scope: str, vector: Optional[np.ndarray] = None) -> Optional[Any]:
+    """Return a cached answer for a paraphrase of *question* within *scope* (current content only)."""
+    if not question:
+        return None
+    query = vector if vector is not None else await embed_question(question)
+    scope = _versioned(scope)
+    index = _scopes.get(scope)
+    if index is None:
+        _stats["semantic_misses"] += 1
+        return None
+    if query.shape[0] != index.vectors.shape[1]:
+        _stats["semantic_misses"] += 1
+        return None
+    scores = index.vectors @ query
+    best = int(np.argmax(scores))
+    if scores[best] >= SIMILARITY_THRESHOLD and time.time() - index.created[best] <= ENTRY_TTL:
+        _stats["semantic_hits"] += 1
+        logger.info("Semantic cache HIT (cosine=%.3f, scope=%s)", scores[best], scope)
+        return index.answers[best]
+
+    _stats["semantic_misses"] += 1
+    return None
+
+
+async def store(question: str, scope: str, answer: Any, vector: Optional[np.ndarray] = None):
+    """Index *answer* for *question* locally, persist it and tell the other workers."""
+    if not question or not answer:
+        return
+    if vector is None:
+        vector = await embed_question(question)
+    scope = _versioned(scope)
+    entry_id, created = _entry_id(question, scope), time.time()
+    _insert(entry_id, scope, vector, answer, created)
+    _stats["semantic_entries_added"] += 1
+
+    redis = cache_service.redis_client
+    if redis is None:
+        return
+    record = json.dumps({"q": question, "s": scope, "a": answer, "t": created, "v": _pack(vector)})
+    pipe = redis.pipeline(transaction=True)
+    pipe.hset(ENTRIES_KEY, entry_id, record)
+    pipe.zadd(AGES_KEY, {entry_id: created})
+    pipe.zrangebyscore(AGES_KEY, "-inf", created - ENTRY_TTL)
+    pipe.zcard(AGES_KEY)
+    _, _, expired, size = await pipe.execute()
+    overflow = max(0, size - len(expired) - MAX_ENTRIES)
+    if overflow:
+        expired += await redis.zrange(AGES_KEY, len(expired), len(expired) + overflow - 1)
+    if expired:
+        await redis.hdel(ENTRIES_KEY, *expired)
+        await redis.zrem(AGES_KEY, *expired)
+    await redis.publish(CHANNEL, json.dumps({"src": cache_service._WORKER_ID, "id": entry_id}))
+
+
+def _apply_record(entry_id: str, raw: Optional[str]):
+    if not raw:
+        return
+    rec = json.loads(raw)
+    if time.time() - rec["t"] <= ENTRY_TTL:
+        _insert(entry_id, rec["s"], _unpack(rec["v"]), rec["a"], rec["t"])
+
+
+async def load_semantic_cache():
+    """Fill the local index from Redis (startup)."""
+    redis = cache_service.redis_client
+    if redis is None:
+        raise RuntimeError("Redis client not initialized")
+    ids = await redis.zrange(AGES_KEY, -MAX_ENTRIES, -1)
+    if ids:
+        for entry_id, raw in zip(ids, await redis.hmget(ENTRIES_KEY, ids)):
+            _apply_record(entry_id, raw)
+    logger.info("Semantic cache loaded %s entries in %s scopes", len(_order), len(_scopes))
+
+
+async def run_semantic_cache_listener():
+    """Long-running task: pull entries other workers announce."""
+    redis = cache_service.redis_client
+    if redis is None:
+        raise RuntimeError("Redis client not initialized")
+
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CHANNEL)
+            await load_semantic_cache()
+            async for message in pubsub.listen():
+                payload = json.loads(message["data"])
+                if payload.get("src") != cache_service._WORKER_ID:
+                    _apply_record(payload["id"], await redis.hget(ENTRIES_KEY, payload["id"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Semantic cache listener failed, resubscribing: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
+
+
+def get_semantic_cache_stats() -> Dict[str, Any]:
+    lookups = _stats["semantic_hits"] + _stats["semantic_misses"]
+    return {
+        **_stats,
+        "semantic_entries": len(_order),
+        "semantic_scopes": len(_scopes),
+        "semantic_hit_rate": round(_stats["semantic_hits"] / lookups, 4) if lookups else 0.0,
+    }
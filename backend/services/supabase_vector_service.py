@@ -2,18 +2,41 @@
 supabase_vector service – backed by Supabase (pgvector).
 Keeps the same public API shape except `query_supabase_vector` name.
 """
-import os, asyncio, logging, hashlib
-from typing import List, Dict, Any, Optional
+import os, asyncio, logging, hashlib, time
+import numpy as np
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Set, Tuple, Union
 
-from tenacity import retry, wait_exponential, stop_after_attempt
-from openai import OpenAI
+from tenacity import retry, retry_if_not_exception_type, wait_exponential, stop_after_attempt
+from openai import OpenAI, BadRequestError
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
-from config.settings import SUPABASE_URL, SUPABASE_SERVICE_KEY, OPENAI_API_KEY
+from config.settings import SUPABASE_URL, SUPABASE_SERVICE_KEY, OPENAI_API_KEY, LOCAL_VECTOR_INDEX, HYBRID_SEARCH
+from services import cache_service
+from services import embedding_cache_service as embedding_cache
+from services import embedding_store
+from services import local_vector_index, bm25_index
+from services import retrieval_cache_service as retrieval_cache
+from services.chunking_service import Chunk
 
 # ── constants ─────────────────────────────────────────────────────────
 EMBED_MODEL  = "text-embedding-3-small"   # 1536-d
 EMBED_DIM    = 1536
 BATCH_SIZE   = 100
+PAGE_SIZE    = 1000                       # rows per keyset page when reading the table
+HYBRID_POOL  = 4                          # candidates per ranker = HYBRID_POOL * top_k
+STORE_WINDOW = 256                        # chunks embedded + upserted per step of store_documents
+INDEX_RELOAD_DEBOUNCE = 5                  # seconds; a burst of remote corpus changes costs one index pass
+CHANGE_EVENT_MAX_IDS  = 5000               # ids published per corpus event; more → receivers reload
+SYNC_FETCH_BATCH      = 200                # ids per `in.(…)` read when patching the indexes
+
+EMBED_BATCH_MAX_INPUTS = 256      # inputs per embeddings request (API limit 2048)
+EMBED_BATCH_MAX_TOKENS = 64_000   # estimated tokens per request (API limit 300k)
+EMBED_CONCURRENCY      = 4        # embeddings requests in flight
+
+ACTIVE_DIMENSIONS_KEY    = "EMBED_ACTIVE_DIMENSIONS"      # Redis; dimension queries are served from
+MIGRATION_DIMENSIONS_KEY = "EMBED_MIGRATION_DIMENSIONS"   # Redis set; reduced columns every write also fills
+DIMENSIONS_TTL           = 5                              # seconds a worker trusts its copy
 
 logger = logging.getLogger("supabase_vector_service")
 
@@ -24,7 +47,10 @@ openai_client = OpenAI(api_key=OPENAI_API_KEY)
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 async def embed_text(text: str) -> List[float]:
-    """Returns 1536-d embedding list."""
+    """Returns 1536-d embedding list (served from the embedding cache when possible)."""
+    cached = await embedding_cache.get(EMBED_MODEL, text)
+    if cached is not None:
+        return cached
     start = asyncio.get_event_loop().time()
     resp = await asyncio.to_thread(
         lambda: openai_client.embeddings.create(
@@ -34,7 +60,137 @@ async def embed_text(text: str) -> List[float]:
     )
     duration = asyncio.get_event_loop().time() - start
     logger.info("OpenAI embeddings.create in %.4fs (model=%s, chars=%s)", duration, EMBED_MODEL, len(text or ""))
-    return resp.data[0].embedding
+    vec = resp.data[0].embedding
+    await embedding_cache.put(EMBED_MODEL, text, vec)
+    return vec
+
+# ── Embedding dimensions ──────────────────────────────────────────────
+# text-embedding-3 vectors shorten by truncation + re-normalization (what the
+# API's `dimensions` parameter does), so full vectors are fetched and cached
+# once and every stored / queried size is derived from them.
+def reduce_dimensions(vec: List[float], dims: int) -> List[float]:
+    if dims >= len(vec):
+        return vec
+    v = np.asarray(vec[:dims], dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return (v / norm if norm else v).tolist()
+
+def embedding_column(dims: int) -> str:
+    return "embedding" if dims == EMBED_DIM else f"embedding_{dims}"
+
+def embedding_columns(vec: List[float], dims: Iterable[int]) -> Dict[str, List[float]]:
+    """Column values for a document row, one per dimension of *dims* (see `write_dimensions`)."""
+    return {embedding_column(d): reduce_dimensions(vec, d) for d in dims}
+
+_dimensions: Dict[str, Any] = {"active": EMBED_DIM, "migrating": (), "read_at": 0.0}
+
+async def _read_dimensions() -> Dict[str, Any]:
+    """Active and migrating dimensions, re-read from Redis every DIMENSIONS_TTL seconds."""
+    redis = cache_service.redis_client
+    if redis is None or time.monotonic() - _dimensions["read_at"] < DIMENSIONS_TTL:
+        return _dimensions
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.get(ACTIVE_DIMENSIONS_KEY)
+        pipe.smembers(MIGRATION_DIMENSIONS_KEY)
+        active, migrating = await pipe.execute()
+        _dimensions.update(
+            active=int(active or EMBED_DIM),
+            migrating=tuple(sorted(int(d) for d in migrating)),
+            read_at=time.monotonic(),
+        )
+    except Exception as e:
+        logger.warning(f"Embedding dimensions read failed: {e}")
+    return _dimensions
+
+async def active_dimensions() -> int:
+    """Dimension retrieval is served from; switched by `embedding_migration cutover`."""
+    return int((await _read_dimensions())["active"])
+
+async def write_dimensions() -> Tuple[int, ...]:
+    """Dimensions every written row fills: the full one, the active one and any being migrated to."""
+    dims = await _read_dimensions()
+    return tuple(sorted({EMBED_DIM, dims["active"], *dims["migrating"]}))
+
+def _rpc_name(function: str, dims: int) -> str:
+    return function if dims == EMBED_DIM else f"{function}_{dims}"
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def _pack_batches(texts: List[str]) -> List[List[int]]:
+    """Group indices of non-empty *texts* into batches bounded by count and token budget."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    budget = 0
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        cost = _estimate_tokens(text)
+        if current and (len(current) >= EMBED_BATCH_MAX_INPUTS or budget + cost > EMBED_BATCH_MAX_TOKENS):
+            batches.append(current)
+            current, budget = [], 0
+        current.append(i)
+        budget += cost
+    if current:
+        batches.append(current)
+    return batches
+
+# a 400 will not get better by retrying – it is split instead (see embed_texts)
+@retry(
+    wait=wait_exponential(min=1, max=20),
+    stop=stop_after_attempt(4),
+    retry=retry_if_not_exception_type(BadRequestError),
+    reraise=True,
+)
+def _embed_batch(inputs: List[str], model: str) -> List[List[float]]:
+    _s = time.perf_counter()
+    resp = openai_client.embeddings.create(input=inputs, model=model)
+    logger.info("OpenAI embeddings.create batch of %s in %.4fs (model=%s)", len(inputs), time.perf_counter() - _s, model)
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+async def embed_texts(texts: List[str], model: str = EMBED_MODEL) -> List[Optional[List[float]]]:
+    """
+    Embed many texts with packed, concurrent embeddings requests.
+
+    The result is aligned with *texts*.  Empty texts, and texts whose batch
+    still failed after retries, come back as ``None`` so callers can skip
+    them without losing the rest of the run.  A batch rejected by the API
+    (e.g. one oversized input) is split in halves until the bad input is
+    isolated.  Texts already in the on-disk embedding store are not sent;
+    new embeddings are added to it.
+    """
+    results: List[Optional[List[float]]] = await asyncio.to_thread(embedding_store.get_many, model, texts)
+    pending = [i for i, (t, v) in enumerate(zip(texts, results)) if t and v is None]
+    semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+
+    async def run(batch: List[int]):
+        error: Optional[Exception] = None
+        async with semaphore:
+            try:
+                vectors = await asyncio.to_thread(_embed_batch, [texts[i] for i in batch], model)
+            except Exception as e:
+                error = e
+        if error is None:
+            for i, vec in zip(batch, vectors):
+                results[i] = vec
+        elif isinstance(error, BadRequestError) and len(batch) > 1:
+            mid = len(batch) // 2
+            await asyncio.gather(run(batch[:mid]), run(batch[mid:]))
+        else:
+            logger.error("Embedding batch of %s failed: %s", len(batch), error)
+
+    start = time.perf_counter()
+    batches = [[pending[j] for j in b] for b in _pack_batches([texts[i] for i in pending])]
+    await asyncio.gather(*(run(b) for b in batches))
+    failed = sum(1 for t, v in zip(texts, results) if t and v is None)
+    if pending:
+        await asyncio.to_thread(embedding_store.put_many, model, [texts[i] for i in pending], [results[i] for i in pending])
+    logger.info(
+        "Embedded %s texts in %s batches in %.4fs (%s from the store, %s failed)",
+        len(pending) - failed, len(batches), time.perf_counter() - start, len(texts) - len(pending), failed,
+    )
+    return results
 
 # ── Retry wrappers for upsert / rpc ───────────────────────────────────
 @retry(wait=wait_exponential(), stop=stop_after_attempt(5))
@@ -46,52 +202,334 @@ def _upsert_batch(rows: List[Dict[str, Any]]):
     logger.info("Supabase upsert %s rows in %.4fs", len(rows), _d)
 
 @retry(wait=wait_exponential(), stop=stop_after_attempt(5))
-def _rpc_match(payload: Dict[str, Any]):
+def _rpc_match(payload: Dict[str, Any], function: str = "match_documents"):
     import time as _t
     _s = _t.perf_counter()
-    res = supabase.rpc("match_documents", payload).execute()
+    res = supabase.rpc(function, payload).execute()
     _d = _t.perf_counter() - _s
-    logger.info("Supabase rpc match_documents in %.4fs (top_k=%s, ns=%s)", _d, payload.get("match_count"), payload.get("namespace"))
+    logger.info("Supabase rpc %s in %.4fs (top_k=%s, ns=%s)", function, _d, payload.get("match_count"), payload.get("namespace"))
+    return res
+
+# PostgREST errors (e.g. migration not applied yet) are not retried – the caller falls back
+@retry(wait=wait_exponential(), stop=stop_after_attempt(5), retry=retry_if_not_exception_type(APIError))
+def _rpc_match_multi(payload: Dict[str, Any], function: str = "match_documents_multi"):
+    import time as _t
+    _s = _t.perf_counter()
+    res = supabase.rpc(function, payload).execute()
+    _d = _t.perf_counter() - _s
+    logger.info("Supabase rpc %s in %.4fs (top_k=%s, ns=%s)", function, _d, payload.get("match_count"), payload.get("namespaces"))
     return res
 
 # ── Public helpers ────────────────────────────────────────────────────
+def iter_document_pages(
+    columns: str = "id, namespace, text, source, category, type, embedding",
+    namespace: Optional[str] = None,
+    page_size: int = PAGE_SIZE
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the documents table page by page, keyset-paginated on id (blocking)."""
+    last_id: Optional[str] = None
+    while True:
+        q = supabase.table("documents").select(columns).order("id").limit(page_size)
+        if namespace:
+            q = q.eq("namespace", namespace)
+        if last_id is not None:
+            q = q.gt("id", last_id)
+        rows = q.execute().data or []
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+async def _index_columns() -> str:
+    """Columns the in-process indexes are built from (embedding of the active dimension as `embedding`)."""
+    columns = "id, namespace, text, source, category, type"
+    if LOCAL_VECTOR_INDEX:
+        dims = await active_dimensions()
+        columns += ", embedding" if dims == EMBED_DIM else f", embedding:{embedding_column(dims)}"
+    return columns
+
+async def load_retrieval_indexes():
+    """Fill the in-process vector (LOCAL_VECTOR_INDEX) and BM25 (HYBRID_SEARCH) indexes in one table pass."""
+    if not (LOCAL_VECTOR_INDEX or HYBRID_SEARCH):
+        return
+    columns = await _index_columns()
+    _s = time.perf_counter()
+    pages = await asyncio.to_thread(lambda: list(iter_document_pages(columns)))
+    if LOCAL_VECTOR_INDEX:
+        local_vector_index.load(pages)
+    if HYBRID_SEARCH:
+        bm25_index.load(pages)
+    logger.info("Retrieval indexes loaded in %.4fs", time.perf_counter() - _s)
+
+_sync_task: Optional[asyncio.Task] = None
+_sync_pending: Dict[str, Any] = {"reload": False, "upserted": {}, "removed": {}}
+
+def _fetch_rows(columns: str, ids: List[str]) -> List[Dict[str, Any]]:
+    """Current rows of *ids* (missing ones were deleted since) – blocking."""
+    rows: List[Dict[str, Any]] = []
+    for i in range(0, len(ids), SYNC_FETCH_BATCH):
+        rows += supabase.table("documents").select(columns).in_("id", ids[i:i + SYNC_FETCH_BATCH]).execute().data or []
+    return rows
+
+async def _apply_changes(upserted: Dict[str, Set[str]], removed: Dict[str, Set[str]]):
+    """Patch the in-process indexes with the rows another worker wrote or deleted."""
+    ids = [vid for ns_ids in upserted.values() for vid in ns_ids]
+    rows = await asyncio.to_thread(_fetch_rows, await _index_columns(), ids) if ids else []
+    found = {r["id"] for r in rows}
+    for namespace, ns_ids in upserted.items():
+        removed.setdefault(namespace, set()).update(ns_ids - found)
+    for namespace, ns_ids in removed.items():
+        if ns_ids:
+            local_vector_index.remove(namespace, ids=ns_ids)
+            bm25_index.remove(namespace, ids=ns_ids)
+    local_vector_index.upsert(rows)
+    bm25_index.upsert(rows)
+    await asyncio.to_thread(local_vector_index.flush)
+    logger.info("Retrieval indexes patched: %s rows written, %s removed", len(rows), sum(map(len, removed.values())))
+
+async def _sync_indexes(delay: float):
+    while _sync_pending["reload"] or _sync_pending["upserted"] or _sync_pending["removed"]:
+        await asyncio.sleep(delay)
+        pending = dict(_sync_pending)
+        _sync_pending.update(reload=False, upserted={}, removed={})   # changes from here on need another pass
+        try:
+            if pending["reload"]:
+                await load_retrieval_indexes()
+            else:
+                await _apply_changes(pending["upserted"], pending["removed"])
+        except Exception as e:
+            logger.error(f"Retrieval index sync failed: {e}")
+            if not pending["reload"]:
+                _sync_pending["reload"] = True      # rows may be half applied: rebuild
+
+def _schedule_index_sync(delay: float = 0.0, changes: Optional[Dict[str, Any]] = None):
+    """
+    Bring the local indexes up to date, e.g. after an ingestion by another
+    worker or a dimension cutover.  *changes* (ids per namespace, see
+    `_corpus_changes`) are patched in; without them the indexes reload.
+    Requests within *delay* seconds share one pass; one arriving during a
+    pass triggers another.
+    """
+    global _sync_task
+    if changes is None:
+        _sync_pending["reload"] = True
+    else:
+        for namespace, ids in (changes.get("upserted") or {}).items():
+            _sync_pending["upserted"].setdefault(namespace, set()).update(ids)
+            _sync_pending["removed"].get(namespace, set()).difference_update(ids)
+        for namespace, ids in (changes.get("removed") or {}).items():
+            _sync_pending["removed"].setdefault(namespace, set()).update(ids)
+            _sync_pending["upserted"].get(namespace, set()).difference_update(ids)
+    if _sync_task is None or _sync_task.done():
+        _sync_task = asyncio.create_task(_sync_indexes(delay))
+
+def _on_remote_corpus_change(event: Dict[str, Any]):
+    """Another worker wrote the corpus: its rows are not in our in-process indexes yet."""
+    if (LOCAL_VECTOR_INDEX and local_vector_index.is_ready()) or (HYBRID_SEARCH and bm25_index.is_ready()):
+        _schedule_index_sync(INDEX_RELOAD_DEBOUNCE, event.get("changes"))
+
+retrieval_cache.add_corpus_listener(_on_remote_corpus_change)
+
+def _corpus_changes(
+    rows: Sequence[Dict[str, Any]] = (),
+    removed: Optional[Dict[str, Iterable[str]]] = None
+) -> Optional[Dict[str, Dict[str, List[str]]]]:
+    """Ids per namespace published with a corpus bump; None (receivers reload) past CHANGE_EVENT_MAX_IDS."""
+    upserted: Dict[str, List[str]] = {}
+    for r in rows:
+        upserted.setdefault(r["namespace"], []).append(r["id"])
+    removed_ids = {namespace: list(ids) for namespace, ids in (removed or {}).items() if ids}
+    if len(rows) + sum(map(len, removed_ids.values())) > CHANGE_EVENT_MAX_IDS:
+        return None
+    return {"upserted": upserted, "removed": removed_ids}
+
+async def index_written_rows(rows: List[Dict[str, Any]], removed: Optional[Dict[str, Iterable[str]]] = None):
+    """Mirror rows just written to Supabase into the local indexes and bump the corpus version.
+    *removed* (ids per namespace, already dropped locally) is published with the bump."""
+    dims = await active_dimensions()
+    if dims != EMBED_DIM:
+        rows = [{**r, "embedding": reduce_dimensions(r["embedding"], dims)} for r in rows]
+    local_vector_index.upsert(rows)
+    bm25_index.upsert(rows)
+    await retrieval_cache.bump_corpus_version(_corpus_changes(rows, removed))
+
+def _delete_stale_rows(namespace: str, source_id: str, keep_ids: List[str]) -> List[str]:
+    """Delete rows of *source_id* in *namespace* whose id is not in *keep_ids*; returns their ids (blocking)."""
+    q = supabase.table("documents").delete().eq("namespace", namespace).eq("source", source_id)
+    if keep_ids:
+        q = q.not_.in_("id", keep_ids)
+    return [r["id"] for r in (q.execute().data or [])]
+
+async def _prune_source(namespace: str, source_id: str, keep_ids: List[str]) -> List[str]:
+    """`_delete_stale_rows` off the event loop, then drop the ids from the in-process indexes."""
+    stale = await asyncio.to_thread(_delete_stale_rows, namespace, source_id, keep_ids)
+    if stale:
+        local_vector_index.remove(namespace, ids=stale)
+        bm25_index.remove(namespace, ids=stale)
+    return stale
+
+def source_chunk_ids(namespace: str, source_id: str) -> Set[str]:
+    """Ids of the rows currently stored for *source_id* in *namespace* (blocking)."""
+    ids: Set[str] = set()
+    last_id: Optional[str] = None
+    while True:
+        q = (supabase.table("documents").select("id").eq("namespace", namespace)
+             .eq("source", source_id).order("id").limit(PAGE_SIZE))
+        if last_id is not None:
+            q = q.gt("id", last_id)
+        rows = q.execute().data or []
+        ids.update(r["id"] for r in rows)
+        if len(rows) < PAGE_SIZE:
+            return ids
+        last_id = rows[-1]["id"]
+
+@retry(wait=wait_exponential(), stop=stop_after_attempt(3), retry=retry_if_not_exception_type(APIError))
+def _rpc_replace_source(namespace: str, source_id: str, rows: List[Dict[str, Any]], keep_ids: List[str]) -> List[str]:
+    _s = time.perf_counter()
+    res = supabase.rpc("replace_source_chunks", {
+        "p_namespace": namespace, "p_source": source_id, "p_rows": rows, "p_keep_ids": keep_ids,
+    }).execute()
+    logger.info("Supabase replace_source_chunks %s rows in %.4fs", len(rows), time.perf_counter() - _s)
+    return list((res.data or {}).get("deleted") or [])
+
+def diff_source_chunks(chunks: Sequence[Chunk], namespace: str, source_id: str) -> Tuple[List[Chunk], Set[str]]:
+    """(chunks of *chunks* not stored yet, ids currently stored for the source) – blocking."""
+    existing = source_chunk_ids(namespace, source_id)
+    return [c for c in chunks if c.id not in existing], existing
+
+async def write_source_chunks(
+    namespace: str,
+    source_id: str,
+    fresh: Sequence[Chunk],
+    vectors: Sequence[List[float]],
+    keep_ids: Sequence[str],
+    existing: Set[str],
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None
+) -> Dict[str, int]:
+    """Write the embedded *fresh* chunks and delete rows not in *keep_ids*, in one transactional RPC."""
+    dims = await write_dimensions()
+    rows = [
+        {"id": c.id, "namespace": namespace, "text": c.text, "source": source_id,
+         "category": category, "type": doc_type, **embedding_columns(vec, dims)}
+        for c, vec in zip(fresh, vectors)
+    ]
+    keep_ids = list(keep_ids)
+    summary = {"embedded": len(rows), "kept": len(existing & set(keep_ids)), "deleted": 0}
+    if not rows and existing <= set(keep_ids):
+        return summary
+
+    try:
+        stale = await asyncio.to_thread(_rpc_replace_source, namespace, source_id, rows, keep_ids)
+        local_vector_index.remove(namespace, ids=stale)
+        bm25_index.remove(namespace, ids=stale)
+    except APIError as e:
+        logger.warning(f"replace_source_chunks RPC failed ({e}); upserting, then pruning")
+        for i in range(0, len(rows), BATCH_SIZE):
+            await asyncio.to_thread(_upsert_batch, rows[i:i + BATCH_SIZE])
+        stale = await _prune_source(namespace, source_id, keep_ids)     # also edits the in-process indexes
+    summary["deleted"] = len(stale)
+
+    await index_written_rows(rows, removed={namespace: stale})
+    return summary
+
+async def replace_source_chunks(
+    chunks: Sequence[Chunk],
+    namespace: str,
+    source_id: str,
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None
+) -> Optional[Dict[str, int]]:
+    """
+    Make the stored rows of *source_id* equal to *chunks*, touching only the diff.
+
+    Chunk ids are content hashes, so a chunk whose id is already stored is
+    unchanged and is neither re-embedded nor re-sent.  New chunks are
+    embedded and written, then stale rows deleted, in one transactional RPC
+    (db/migrations/003_replace_source_chunks.sql) – readers never see the
+    source half-written or empty.  Without the RPC it falls back to upsert,
+    then prune.  Returns the diff counts, or None (nothing written) if an
+    embedding failed.
+    """
+    fresh, existing = await asyncio.to_thread(diff_source_chunks, chunks, namespace, source_id)
+    vectors = await embed_texts([c.text for c in fresh]) if fresh else []
+    if any(v is None for v in vectors):
+        logger.error("Embedding failed for '%s'; keeping the stored rows", source_id)
+        return None
+    try:
+        return await write_source_chunks(
+            namespace, source_id, fresh, vectors, [c.id for c in chunks], existing, category, doc_type,
+        )
+    finally:
+        await asyncio.to_thread(local_vector_index.flush)
+
 async def store_documents(
-    chunks: List[str],
+    chunks: Iterable[Union[str, Chunk]],
     namespace: str,
     source_id: str,
     category: str,
-    doc_type: str = "benefit"
+    doc_type: str = "benefit",
+    prune: bool = False
 ):
-    """Batch-upsert text chunks with rich metadata to Supabase."""
-    batch: List[Dict[str, Any]] = []
-    for i, chunk in enumerate(chunks):
-        vec = await embed_text(chunk)
-        vid = f"{hashlib.md5((source_id + str(i)).encode()).hexdigest()}"
-        batch.append({
-            "id": vid,
-            "namespace": namespace,
-            "text": chunk,
-            "source": source_id,
-            "category": category,
-            "type": doc_type,
-            "embedding": vec,
-        })
-        if len(batch) >= BATCH_SIZE:
-            _upsert_batch(batch)
-            batch.clear()
-    if batch:
-        _upsert_batch(batch)
-    logger.info("Upserted %s rows in '%s' (Supabase)", len(chunks), namespace)
+    """
+    Batch-upsert text chunks with rich metadata to Supabase.
 
-async def query_supabase_vector(
-    query: str,
-    namespace: str = "",
-    filters: Optional[Dict[str, Any]] = None,
-    top_k: int = 5
-) -> List[Dict[str, Any]]:
-    """Returns list of matches with metadata from Supabase."""
-    vec = await embed_text(query)
+    *chunks* may be a generator (`chunking_service.iter_chunks`); it is
+    consumed STORE_WINDOW chunks at a time.  `Chunk`s keep their
+    content-derived id, plain strings get the position-based one.  With
+    *prune*, rows of *source_id* not written by this call are deleted
+    afterwards (skipped if any chunk failed to embed).
+    """
+    written: List[Dict[str, Any]] = []
+    total = 0
+    chunk_iter = iter(chunks)
+    dims = await write_dimensions()
+    while True:
+        window = list(islice(chunk_iter, STORE_WINDOW))
+        if not window:
+            break
+        texts = [c.text if isinstance(c, Chunk) else c for c in window]
+        vectors = await embed_texts(texts)
+        batch: List[Dict[str, Any]] = []
+        for i, (chunk, text, vec) in enumerate(zip(window, texts, vectors), start=total):
+            if vec is None:
+                continue
+            vid = chunk.id if isinstance(chunk, Chunk) else f"{hashlib.md5((source_id + str(i)).encode()).hexdigest()}"
+            batch.append({
+                "id": vid,
+                "namespace": namespace,
+                "text": text,
+                "source": source_id,
+                "category": category,
+                "type": doc_type,
+                **embedding_columns(vec, dims),
+            })
+            if len(batch) >= BATCH_SIZE:
+                await asyncio.to_thread(_upsert_batch, batch)
+                written += batch
+                batch = []
+        if batch:
+            await asyncio.to_thread(_upsert_batch, batch)
+            written += batch
+        total += len(window)
+
+    if written:
+        await index_written_rows(written)
+    stored = len(written)
+    if stored < total:
+        logger.warning("Skipped %s of %s chunks of '%s' without embedding", total - stored, total, source_id)
+    elif prune:
+        stale = await _prune_source(namespace, source_id, [r["id"] for r in written])
+        if stale:
+            logger.info("Pruned %s stale rows of '%s'", len(stale), source_id)
+            await retrieval_cache.bump_corpus_version(_corpus_changes(removed={namespace: stale}))
+    await asyncio.to_thread(local_vector_index.flush)
+    logger.info("Upserted %s rows in '%s' (Supabase)", stored, namespace)
 
+def _filter_values(filters: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """Reduce Pinecone-style filters to the (category, type) the RPCs accept."""
     filter_category: Optional[str] = None
     filter_type: Optional[str] = None
     if filters:
@@ -105,24 +543,133 @@ async def query_supabase_vector(
             filter_type = typ.get("$eq") or (typ.get("$in") or [None])[0]
         else:
             filter_type = typ
+    return filter_category, filter_type
 
-    res = _rpc_match({
-        "query_embedding": vec,
-        "match_count": top_k,
-        "namespace": namespace,
-        "filter_category": filter_category,
-        "filter_type": filter_type
-    })
-    rows = res.data or []
+def _to_matches(rows: List[Dict[str, Any]], namespace: Optional[str] = None) -> List[Dict[str, Any]]:
     return [
         {
             "text": r.get("text"),
             "source": r.get("source"),
             "category": r.get("category"),
             "type": r.get("type"),
+            "namespace": r.get("namespace") or namespace,
             "score": float(r.get("score", 0.0))
         }
         for r in rows
     ]
 
+def _dense_matches(
+    vec: List[float],
+    namespace: Union[str, Sequence[str]],
+    top_k: int,
+    filter_category: Optional[str],
+    filter_type: Optional[str],
+    weights: Optional[Sequence[float]],
+    fallback: bool,
+    dims: int = EMBED_DIM
+) -> List[Dict[str, Any]]:
+    namespaces = [namespace] if isinstance(namespace, str) else list(namespace)
+
+    if LOCAL_VECTOR_INDEX:
+        local = local_vector_index.search(vec, namespaces, top_k, filter_category, filter_type, weights, fallback)
+        if local is not None:
+            return local
+
+    if isinstance(namespace, str):
+        res = _rpc_match({
+            "query_embedding": vec,
+            "match_count": top_k,
+            "namespace": namespace,
+            "filter_category": filter_category,
+            "filter_type": filter_type
+        }, _rpc_name("match_documents", dims))
+        return _to_matches(res.data or [], namespace)
+
+    try:
+        res = _rpc_match_multi({
+            "query_embedding": vec,
+            "match_count": top_k,
+            "namespaces": namespaces,
+            "weights": list(weights) if weights else None,
+            "fallback": fallback,
+            "filter_category": filter_category,
+            "filter_type": filter_type
+        }, _rpc_name("match_documents_multi", dims))
+        return _to_matches(res.data or [])
+    except APIError as e:
+        logger.warning("%s failed (%s), querying namespaces one by one", _rpc_name("match_documents_multi", dims), e)
+
+    merged: List[Dict[str, Any]] = []
+    for i, ns in enumerate(namespaces):
+        res = _rpc_match({
+            "query_embedding": vec,
+            "match_count": top_k,
+            "namespace": ns,
+            "filter_category": filter_category,
+            "filter_type": filter_type
+        }, _rpc_name("match_documents", dims))
+        matches = _to_matches(res.data or [], ns)
+        weight = weights[i] if weights and i < len(weights) else 1.0
+        for m in matches:
+            m["score"] *= weight
+        if fallback and matches:
+            return matches
+        merged.extend(matches)
+    merged.sort(key=lambda m: m["score"], reverse=True)
+    return merged[:top_k]
+
+async def query_supabase_vector(
+    query: str,
+    namespace: Union[str, Sequence[str]] = "",
+    filters: Optional[Dict[str, Any]] = None,
+    top_k: int = 5,
+    weights: Optional[Sequence[float]] = None,
+    fallback: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Returns list of matches with metadata from Supabase.
+
+    *namespace* may be a list: all of them are searched with one embedding
+    and one `match_documents_multi` RPC.  Scores are multiplied by the
+    matching entry of *weights* (default 1.0) and merged; with *fallback*
+    only the first namespace, in list order, that has matches is returned.
+
+    With HYBRID_SEARCH the vector ranking is fused with the BM25 ranking
+    (reciprocal-rank fusion); `score` is then the fused score.
+
+    Results are cached per corpus version (see retrieval_cache_service).
+    """
+    cache_key = await retrieval_cache.make_key(
+        query, namespace=namespace, filters=filters, top_k=top_k, weights=weights, fallback=fallback
+    )
+    matches = await retrieval_cache.get(cache_key)
+    if matches is None:
+        matches = await _retrieve(query, namespace, filters, top_k, weights, fallback)
+        await retrieval_cache.put(cache_key, matches)
+    return matches
+
+async def _retrieve(
+    query: str,
+    namespace: Union[str, Sequence[str]],
+    filters: Optional[Dict[str, Any]],
+    top_k: int,
+    weights: Optional[Sequence[float]],
+    fallback: bool
+) -> List[Dict[str, Any]]:
+    dims = await active_dimensions()
+    vec = reduce_dimensions(await embed_text(query), dims)
+    filter_category, filter_type = _filter_values(filters)
+    if LOCAL_VECTOR_INDEX and local_vector_index.dimension() not in (None, dims):
+        _schedule_index_sync()          # served by the RPC until the reload lands
+
+    if not (HYBRID_SEARCH and bm25_index.is_ready()):
+        return _dense_matches(vec, namespace, top_k, filter_category, filter_type, weights, fallback, dims)
 
+    pool = top_k * HYBRID_POOL
+    dense = _dense_matches(vec, namespace, pool, filter_category, filter_type, weights, fallback, dims)
+    namespaces = [namespace] if isinstance(namespace, str) else list(namespace)
+    if fallback and dense:
+        # stay inside the namespace the vector fallback settled on
+        namespaces, fallback = [dense[0]["namespace"]], False
+    lexical = bm25_index.search(query, namespaces, pool, filter_category, filter_type, fallback)
+    return bm25_index.reciprocal_rank_fusion([dense, lexical], top_k)
@@ -0,0 +1,59 @@
+"""
+web_crawler – fetch many website pages with bounded concurrency.
+
+`check_for_updates` and `initialize_website_content` used to scrape
+`get_urls()` one page after the other.  `crawl` runs up to
+CRAWL_CONCURRENCY `fetch_page` calls at once (browser renders are further
+bounded by the browser pool) and yields pages as they finish.
+
+Given the validators stored with the content hashes in hashes.json, every
+request is conditional: an unchanged page answers 304 and comes back with
+`not_modified` set and no content – nothing is downloaded, rendered or
+hashed.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+from knowledge_base.website_content import Page, fetch_page
+
+logger = logging.getLogger("web_crawler")
+
+CRAWL_CONCURRENCY = 4
+
+
+async def crawl(
+    urls: Iterable[str],
+    validators: Optional[Dict[str, dict]] = None,
+    concurrency: int = CRAWL_CONCURRENCY,
+) -> AsyncIterator[Page]:
+    """Yield a `Page` per URL in completion order; a failed page has empty content."""
+    validators = validators or {}
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"not_modified": 0, "fetched": 0, "failed": 0}
+
+    async def fetch(url: str) -> Page:
+        async with semaphore:
+            try:
+                return await fetch_page(url, validators.get(url))
+            except Exception as e:
+                logger.error(f"Failed to crawl {url}: {e}")
+                return Page(url)
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(fetch(url)) for url in dict.fromkeys(urls)]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            page = await next_page
+            counts["not_modified" if page.not_modified else "fetched" if page.content else "failed"] += 1
+            yield page
+    finally:
+        for task in tasks:
+            task.cancel()
+    logger.info(
+        "Crawled %s pages in %.2fs: %s not modified, %s fetched, %s failed",
+        len(tasks), time.perf_counter() - start, counts["not_modified"], counts["fetched"], counts["failed"],
+    )
@@ -11,8 +11,7 @@ def _needs_context(turn: Turn) -> bool:            # very lightweight filter
 
 async def _handle(turn: Turn, convo: Conversation) -> Result:
     filters = {}
-    website = await query_supabase_vector(turn.text, namespace="website", filters=filters)
-    matches = website or await query_supabase_vector(turn.text, namespace="sales", filters=filters)
+    matches = await query_supabase_vector(turn.text, namespace=["website", "sales"], filters=filters, fallback=True)
 
     chunks  = [m["text"] for m in matches]
     meta    = {"rag_chunks": chunks[:6]}           # keep it small